@@ -8,7 +8,7 @@ from alembic import context
 from config.settings import get_settings
 from config.database import Base
 # Импорт всех модулей для миграции в бд
-from src.users.models import Role, User, Card, Wallet, WorkSchedule
+from src.users.models import Role, User, Card, Wallet, WorkSchedule, Transaction
 from src.media.models import Media
 
 # this is the Alembic Config object, which provides
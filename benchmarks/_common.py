@@ -0,0 +1,30 @@
+"""Общие функции замеров для скриптов benchmarks."""
+import asyncio
+import time
+
+from typing import Awaitable, Callable, Iterable
+
+
+def percentile(values: list, percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+async def run_concurrently(call: Callable[..., Awaitable], items: Iterable,
+                           concurrency: int) -> tuple[list, float]:
+    """
+    Вызывает call(item) для каждого item, не больше concurrency одновременно.
+    Возвращает (задержки вызовов в секундах, общее время в секундах).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(item):
+        async with semaphore:
+            started = time.perf_counter()
+            await call(item)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(item) for item in items))
+    return latencies, time.perf_counter() - started
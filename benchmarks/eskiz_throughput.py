@@ -0,0 +1,60 @@
+"""
+Пропускная способность отправки SMS через фейковый сервер Eskiz.
+
+Сравнивает прежнюю схему (новый ClientSession на каждый запрос) с общим EskizClient.
+Локальный сервер работает без TLS, поэтому реальный выигрыш от keep-alive
+(без повторного TLS-рукопожатия) на боевом API больше, чем здесь.
+
+Запуск из корня проекта:
+    python -m benchmarks.eskiz_throughput [requests] [concurrency] [latency_ms]
+"""
+import asyncio
+import logging
+import sys
+
+from aiohttp import ClientSession
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from benchmarks._common import run_concurrently
+from benchmarks.fake_eskiz import run_fake_eskiz
+from src.authorization.sms import EskizClient
+
+# Логи каждого SMS замеряли бы запись в консоль, а не HTTP
+logging.getLogger().setLevel(logging.WARNING)
+
+
+async def send_with_new_session(base_url: str, phone_number: str):
+    # Прежний send_sms: сессия и соединение создаются на каждый запрос
+    async with ClientSession() as session:
+        async with session.post(f"{base_url}/message/sms/send",
+                                json={"mobile_phone": phone_number, "message": "test", "from": "4546"},
+                                headers={"Authorization": "Bearer fake-token"}) as response:
+            return await response.json()
+
+
+async def measure(name: str, send, total: int, concurrency: int, stats: dict):
+    stats["connections"].clear()
+    _, elapsed = await run_concurrently(lambda i: send(f"90{i:07d}"), range(total), concurrency)
+    print(f"{name:<24} {total / elapsed:9.0f} sms/s  {elapsed * 1000:8.1f} ms  "
+          f"tcp connections: {len(stats['connections'])}")
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.0
+
+    async with run_fake_eskiz(latency=latency) as (base_url, stats):
+        print(f"requests={total} concurrency={concurrency} latency={latency * 1000:.0f} ms")
+        await measure("ClientSession per call", lambda phone: send_with_new_session(base_url, phone),
+                      total, concurrency, stats)
+
+        client = EskizClient(base_url, max_connections=concurrency)
+        token = await client.login("bench@example.com", "secret")
+        await measure("EskizClient", lambda phone: client.send_sms(phone, "test", token),
+                      total, concurrency, stats)
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""
+Проверка single-flight обновления токена Eskiz.
+
+CONCURRENCY корутин одновременно запрашивают токен у EskizTokenProvider
+при пустом кеше, затем после истечения токена. Фейковый сервер Eskiz считает логины:
+на процесс должен приходиться один логин на каждое обновление.
+Если Redis из REDIS_URL недоступен, проверяется только single-flight внутри процесса.
+
+Запуск из корня проекта:
+    python -m benchmarks.eskiz_token_herd [concurrency]
+"""
+import asyncio
+import logging
+import sys
+import time
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from benchmarks.fake_eskiz import run_fake_eskiz
+from config.database import close_redis_pool, get_redis_client
+from src.authorization.sms import EskizClient, EskizTokenProvider, ESKIZ_TOKEN_KEY
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+
+async def herd(provider: EskizTokenProvider, concurrency: int, stats: dict, label: str):
+    logins = stats["logins"]
+    started = time.perf_counter()
+    tokens = await asyncio.gather(*(provider.get_token() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    assert set(tokens) == {"fake-token"}
+    print(f"{label:<20} {concurrency} requests  {stats['logins'] - logins} login(s)  {elapsed * 1000:7.1f} ms")
+
+
+async def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    async with run_fake_eskiz(latency=0.05) as (base_url, stats):
+        client = EskizClient(base_url)
+        provider = EskizTokenProvider(client)
+        try:
+            await get_redis_client().delete(ESKIZ_TOKEN_KEY)
+        except Exception:
+            print("Redis недоступен, проверяется только single-flight в процессе")
+
+        await herd(provider, concurrency, stats, "cold cache")
+        await herd(provider, concurrency, stats, "warm cache")
+
+        # Токен истек: все ждут одно обновление
+        provider.expires_at = 0
+        try:
+            await get_redis_client().delete(ESKIZ_TOKEN_KEY)
+        except Exception:
+            pass
+        await herd(provider, concurrency, stats, "expired token")
+
+        await client.close()
+    try:
+        await close_redis_pool()
+    except Exception:
+        pass
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
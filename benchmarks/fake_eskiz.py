@@ -0,0 +1,63 @@
+"""
+Локальный фейковый сервер Eskiz для офлайн-замеров.
+
+Отвечает на /api/auth/login и /api/message/sms/send как настоящий API,
+с настраиваемой задержкой ответа. Считает принятые запросы и новые TCP-соединения.
+
+Отдельный запуск из корня проекта (ESKIZ_BASE_URL=http://127.0.0.1:8099/api):
+    python -m benchmarks.fake_eskiz [port] [latency_ms]
+"""
+import asyncio
+import sys
+
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+
+
+def create_app(latency: float = 0.0) -> web.Application:
+    app = web.Application()
+    app["stats"] = {"logins": 0, "sms": 0, "connections": set()}
+
+    def track(request: web.Request):
+        app["stats"]["connections"].add(request.transport.get_extra_info("peername"))
+
+    async def login(request: web.Request):
+        track(request)
+        app["stats"]["logins"] += 1
+        await asyncio.sleep(latency)
+        return web.json_response({"message": "token_generated", "data": {"token": "fake-token"}})
+
+    async def send(request: web.Request):
+        track(request)
+        if request.headers.get("Authorization") != "Bearer fake-token":
+            return web.json_response({"detail": "Unauthorized"}, status=401)
+        payload = await request.json()
+        app["stats"]["sms"] += 1
+        await asyncio.sleep(latency)
+        return web.json_response({"id": str(app["stats"]["sms"]), "message": "Waiting for SMS provider",
+                                  "status": "waiting", "mobile_phone": payload["mobile_phone"]})
+
+    app.router.add_post("/api/auth/login", login)
+    app.router.add_post("/api/message/sms/send", send)
+    return app
+
+
+@asynccontextmanager
+async def run_fake_eskiz(port: int = 0, latency: float = 0.0):
+    """Запускает сервер в текущем event loop, возвращает (base_url, stats)"""
+    app = create_app(latency)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/api", app["stats"]
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0),
+                host="127.0.0.1", port=int(sys.argv[1]) if len(sys.argv) > 1 else 8099)
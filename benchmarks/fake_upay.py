@@ -0,0 +1,104 @@
+"""
+Локальный фейковый SOAP-шлюз UPAY для офлайн-замеров.
+
+Отвечает на partnerRegisterCard, partnerConfirmCard, partnerCardList и partnerPayment
+ответами в формате настоящего шлюза, с настраиваемой задержкой.
+Считает принятые запросы и новые TCP-соединения.
+
+Отдельный запуск из корня проекта (UPAY_URL=http://127.0.0.1:8098/STAPI/STWS):
+    python -m benchmarks.fake_upay [port] [latency_ms]
+"""
+import asyncio
+import sys
+
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+
+ENVELOPE = """<?xml version="1.0" encoding="UTF-8"?>
+<S:Envelope xmlns:S="http://schemas.xmlsoap.org/soap/envelope/">
+    <S:Body>
+        <ns2:{method}Response xmlns:ns2="http://st.apus.com/">
+            <return>
+                <Result>
+                    <code>OK</code>
+                    <Description>Успешно</Description>
+                </Result>
+{fields}
+            </return>
+        </ns2:{method}Response>
+    </S:Body>
+</S:Envelope>"""
+
+CARD = """                    <CardList>
+                        <UzcardId>{uzcard_id}</UzcardId>
+                        <CardPhone>998901234567</CardPhone>
+                        <Pan>860049******{last}</Pan>
+                        <ExpireDate>2712</ExpireDate>
+                        <Balance>{balance}</Balance>
+                        <Status>0</Status>
+                    </CardList>"""
+
+
+def build_response(method: str, fields: str) -> str:
+    return ENVELOPE.format(method=method, fields=fields)
+
+
+def card_list_response(cards: int = 1) -> str:
+    items = "\n".join(CARD.format(uzcard_id=1000 + i, last=f"{i:04d}", balance=15000000 + i * 100)
+                      for i in range(cards))
+    return build_response("partnerCardList", f"                <CardList>\n{items}\n                </CardList>")
+
+
+# Ответы шлюза на каждый метод, используются и в замерах разбора ответов
+RESPONSES = {
+    "partnerRegisterCard": build_response(
+        "partnerRegisterCard", "                <ConfirmId>52781</ConfirmId>\n"
+                               "                <CardPhone>998901234567</CardPhone>"),
+    "partnerConfirmCard": build_response(
+        "partnerConfirmCard", "                <UzcardId>1000</UzcardId>\n"
+                              "                <CardPhone>998901234567</CardPhone>\n"
+                              "                <Balance>15000000</Balance>"),
+    "partnerCardList": card_list_response(),
+    "partnerPayment": build_response(
+        "partnerPayment", "                <TransactionId>884112907</TransactionId>\n"
+                          "                <Confirmed>true</Confirmed>"),
+}
+
+
+def create_app(latency: float = 0.0) -> web.Application:
+    app = web.Application()
+    app["stats"] = {"requests": 0, "connections": set()}
+
+    async def soap(request: web.Request):
+        app["stats"]["connections"].add(request.transport.get_extra_info("peername"))
+        body = await request.text()
+        method = next((name for name in RESPONSES if f"st:{name}>" in body), None)
+        if method is None:
+            return web.Response(status=500, text="Unknown SOAP method", content_type="text/xml")
+        app["stats"]["requests"] += 1
+        await asyncio.sleep(latency)
+        return web.Response(text=RESPONSES[method], content_type="text/xml")
+
+    app.router.add_post("/STAPI/STWS", soap)
+    return app
+
+
+@asynccontextmanager
+async def run_fake_upay(port: int = 0, latency: float = 0.0):
+    """Запускает сервер в текущем event loop, возвращает (url, stats)"""
+    app = create_app(latency)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/STAPI/STWS", app["stats"]
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0),
+                host="127.0.0.1", port=int(sys.argv[1]) if len(sys.argv) > 1 else 8098)
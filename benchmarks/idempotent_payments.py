@@ -0,0 +1,81 @@
+"""
+Повторы и дубликаты платежей через run_idempotent и фейковый шлюз UPAY.
+
+Отправляет duplicates одновременных запросов на каждый из keys ключей идемпотентности
+(клиент повторяет запрос после таймаута, пока первый еще выполняется),
+затем повторяет все запросы после завершения. Считает запросы, дошедшие до UPAY:
+без ключа идемпотентности каждый дубликат списал бы средства.
+
+Для повторов после завершения нужен Redis из REDIS_URL (ключи создаются с префиксом bench:),
+без него одновременные дубликаты объединяются только внутри процесса.
+Запуск из корня проекта:
+    python -m benchmarks.idempotent_payments [keys] [duplicates] [latency_ms]
+"""
+import asyncio
+import logging
+import statistics
+import sys
+import time
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from benchmarks.fake_upay import run_fake_upay
+from config.database import get_redis_client, close_redis_pool
+from src.payments.client import UpayClient
+from src.payments.envelopes import PAYMENT
+from src.payments.idempotency import idempotency_key, run_idempotent
+from src.payments.response_parser import parse_upay_response
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+SCOPE = "bench:payment"
+
+
+async def measure(name: str, requests: list) -> list:
+    latencies = []
+
+    async def one(request):
+        started = time.perf_counter()
+        result = await request()
+        latencies.append((time.perf_counter() - started) * 1000)
+        return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(request) for request in requests))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<24} {len(requests):6d} requests  {elapsed * 1000:8.1f} ms  "
+          f"p50 {statistics.median(latencies):7.2f} ms  max {max(latencies):7.2f} ms")
+    return results
+
+
+async def main():
+    keys = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    duplicates = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.05
+
+    async with run_fake_upay(latency=latency) as (url, stats):
+        client = UpayClient(url, max_connections=keys)
+
+        async def pay(i: int) -> dict:
+            response = await client.post(PAYMENT.build("partner", "token", "998901234567", "1000", "1245",
+                                                       f"account-{i}", 1500000))
+            return {"transaction_id": parse_upay_response(response.content).require("transaction_id")}
+
+        def request(i: int):
+            return lambda: run_idempotent(SCOPE, f"key-{i}", {"amount": 1500000}, lambda: pay(i))
+
+        print(f"keys={keys} duplicates={duplicates} latency={latency * 1000:.0f} ms")
+        await measure("concurrent duplicates", [request(i) for i in range(keys) for _ in range(duplicates)])
+        print(f"{'':<24} UPAY calls: {stats['requests']} (без идемпотентности {keys * duplicates})")
+        await measure("retries after completion", [request(i) for i in range(keys) for _ in range(duplicates)])
+        print(f"{'':<24} UPAY calls: {stats['requests']}")
+        await client.close()
+
+    try:
+        await get_redis_client().delete(*(idempotency_key(SCOPE, f"key-{i}") for i in range(keys)))
+    except Exception as e:
+        print(f"Redis недоступен: {e}")
+    await close_redis_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
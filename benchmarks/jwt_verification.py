@@ -0,0 +1,58 @@
+"""
+Микробенчмарк проверки JWT на один запрос.
+
+Сравнивает прежнюю схему (JWTBearer проверял токен, затем зависимость роли
+декодировала его второй раз) с текущей: одна проверка на запрос и LRU
+проверенных токенов для повторных запросов с тем же токеном.
+
+Запуск из корня проекта:
+    python -m benchmarks.jwt_verification
+"""
+import timeit
+import uuid
+
+import jwt
+
+from config.security import create_access_token, decode_access_token, settings, verified_tokens
+
+ITERATIONS = 20000
+
+
+def decode_without_cache(token: str) -> dict:
+    payload = jwt.decode(token, settings.JWT_SECRET, algorithms=settings.JWT_ALGORITHM)
+    payload["user_uuid"] = uuid.UUID(payload["user_uuid"])
+    return payload
+
+
+def old_request(token: str):
+    # JWTBearer.verify_jwt + decode_access_token в зависимости роли
+    decode_without_cache(token)
+    decode_without_cache(token)
+
+
+def single_pass_request(token: str):
+    verified_tokens.clear()
+    decode_access_token(token)
+
+
+def cached_request(token: str):
+    decode_access_token(token)
+
+
+def main():
+    token = create_access_token(data={"user_uuid": uuid.uuid4(), "role": "user"})
+
+    results = {}
+    for name, func in (("double decode (old)", old_request),
+                       ("single pass, cold cache", single_pass_request),
+                       ("single pass, warm cache", cached_request)):
+        seconds = min(timeit.repeat(lambda: func(token), number=ITERATIONS, repeat=5))
+        results[name] = seconds / ITERATIONS * 1_000_000
+
+    baseline = results["double decode (old)"]
+    for name, micros in results.items():
+        print(f"{name:<26} {micros:8.2f} us/request  x{baseline / micros:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Тест емкости хранилища OTP при тысячах одновременных регистраций.
+
+1. Считает, сколько ожидающих регистраций делили бы один ключ verification_code:{code}
+   в прежней схеме (4-значный код на всех пользователей).
+2. Параллельно сохраняет коды для PENDING номеров через save_verification_code,
+   затем параллельно проверяет их: часть неверным кодом, затем все верным.
+   Каждый номер должен получить ровно свой результат.
+
+Требуется запущенный Redis из REDIS_URL (номера создаются с префиксом bench:).
+Запуск из корня проекта:
+    python -m benchmarks.otp_capacity [pending]
+"""
+import asyncio
+import sys
+import time
+
+from collections import Counter
+
+from config.database import close_redis_pool
+from src.authorization import redis as otp
+from src.authorization.sms import generate_verification_code
+
+PREFIX = "bench:"
+
+
+async def timed(label: str, coroutines: list) -> list:
+    started = time.perf_counter()
+    results = await asyncio.gather(*coroutines)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {len(coroutines):6d} ops  {elapsed * 1000:8.1f} ms  {len(coroutines) / elapsed:9.0f} ops/s")
+    return results
+
+
+async def main():
+    pending = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    phones = [f"{PREFIX}{i}" for i in range(pending)]
+    codes = {phone: str(generate_verification_code()) for phone in phones}
+
+    shared = sum(count for count in Counter(codes.values()).values() if count > 1)
+    print(f"pending={pending}: в прежней схеме {shared} регистраций делили ключ кода с другими")
+
+    await timed("save (pipelined hash)", [otp.save_verification_code(phone, codes[phone]) for phone in phones])
+
+    wrong = await timed("verify wrong code", [otp.check_verification_code(phone, "wrong") for phone in phones[::2]])
+    assert all(result == ("invalid", otp.MAX_VERIFY_ATTEMPTS - 1) for result in wrong), Counter(wrong)
+
+    right = await timed("verify right code", [otp.check_verification_code(phone, codes[phone]) for phone in phones])
+    assert all(result == "ok" for result, _ in right), Counter(right)
+
+    again = await timed("verify consumed code", [otp.check_verification_code(phone, codes[phone]) for phone in phones])
+    assert all(result == "expired" for result, _ in again), Counter(again)
+
+    print("все номера получили свой результат")
+    await close_redis_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Нагрузочный тест проверки OTP на локальном Redis.
+
+Сравнивает прежнюю последовательность команд verify_code (GET кода, GET номера,
+INCR/EXPIRE попыток, SET блокировки или DEL) с одним вызовом Lua-скрипта
+из src.authorization.redis. Половина проверок - с неверным кодом.
+
+Требуется запущенный Redis из REDIS_URL (ключи создаются с префиксом bench:).
+Запуск из корня проекта:
+    python -m benchmarks.otp_verification [concurrency] [requests]
+"""
+import asyncio
+import statistics
+import sys
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from benchmarks._common import percentile, run_concurrently
+from config.database import get_redis_client, close_redis_pool
+from src.authorization import redis as otp
+
+PREFIX = "bench:"
+
+
+async def seed(count: int):
+    redis = get_redis_client()
+    async with redis.pipeline(transaction=False) as pipe:
+        for i in range(count):
+            phone = f"{PREFIX}{i}"
+            code = f"{PREFIX}{i:04d}"
+            # Прежняя схема ключей и хеш на номер для скрипта
+            pipe.set(f"verification_code:{code}", phone, ex=180)
+            pipe.set(f"phone_number:{phone}", code, ex=180)
+            pipe.delete(f"attempts:{phone}", otp.block_key(phone))
+            pipe.hset(otp.otp_key(phone), mapping={"code": code, "attempts": 0})
+            pipe.expire(otp.otp_key(phone), otp.OTP_TTL)
+        await pipe.execute()
+
+
+async def old_verify(phone: str, submitted: str):
+    # Прежний verify_code: до пяти последовательных команд
+    redis = get_redis_client()
+    phone = await redis.get(f"verification_code:{submitted}")
+    if not phone:
+        return "expired"
+    stored = await redis.get(f"phone_number:{phone}")
+    if stored != submitted:
+        attempts = await redis.incr(f"attempts:{phone}")
+        await redis.expire(f"attempts:{phone}", 300)
+        if attempts >= otp.MAX_VERIFY_ATTEMPTS:
+            await redis.set(f"block:{phone}", "blocked", ex=otp.BLOCK_TTL)
+            return "blocked"
+        return "invalid"
+    await redis.delete(f"{phone}_attempts")
+    return "ok"
+
+
+async def script_verify(phone: str, submitted: str):
+    result, _ = await otp.check_verification_code(phone, submitted)
+    return result
+
+
+async def run(verify, concurrency: int, total: int) -> tuple[list, float]:
+    await seed(total)
+    # Половина попыток с неверным кодом
+    return await run_concurrently(
+        lambda i: verify(f"{PREFIX}{i}", f"{PREFIX}{i:04d}" if i % 2 else f"{PREFIX}wrong"), range(total), concurrency)
+
+
+async def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    print(f"concurrency={concurrency} requests={total}")
+    for name, verify in (("sequential commands (old)", old_verify), ("lua script", script_verify)):
+        latencies, elapsed = await run(verify, concurrency, total)
+        print(f"{name:<26} p50 {statistics.median(latencies) * 1000:7.2f} ms"
+              f"  p99 {percentile(latencies, 99) * 1000:7.2f} ms  {total / elapsed:9.0f} req/s")
+
+    await close_redis_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
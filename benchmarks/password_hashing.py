@@ -0,0 +1,77 @@
+"""
+Бенчмарк параллельных входов с проверкой пароля bcrypt.
+
+Запускает CONCURRENCY одновременных "входов" и замеряет задержку каждого,
+а также задержку event loop: фоновая корутина каждые 10 мс проверяет,
+насколько позже запланированного она проснулась. Сравниваются синхронный
+bcrypt в обработчике (прежняя схема) и вынос в пул потоков src.users.passwords.
+
+Запуск из корня проекта:
+    python -m benchmarks.password_hashing [concurrency] [rounds]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from benchmarks._common import percentile
+from src.users import passwords
+
+TICK = 0.01
+
+
+async def measure_loop_lag(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def blocking_login(password: str, hashed: str) -> bool:
+    return passwords.verify_password_sync(password, hashed)
+
+
+async def offloaded_login(password: str, hashed: str) -> bool:
+    return await passwords.verify_password(password, hashed)
+
+
+async def run(login, concurrency: int, hashed: str) -> tuple[list, list]:
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_loop_lag(lags, stop))
+    await asyncio.sleep(TICK * 2)
+
+    # Все входы приходят одновременно, задержка считается от момента прихода
+    started = time.perf_counter()
+
+    async def timed_login():
+        assert await login("Secret123!", hashed)
+        latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(timed_login() for _ in range(concurrency)))
+    stop.set()
+    await ticker
+    return latencies, lags
+
+
+def report(name: str, latencies: list, lags: list):
+    print(f"{name:<22} login p50 {statistics.median(latencies) * 1000:8.1f} ms"
+          f"  p99 {percentile(latencies, 99) * 1000:8.1f} ms"
+          f"  loop lag p99 {percentile(lags, 99) * 1000:8.1f} ms  max {max(lags) * 1000:8.1f} ms")
+
+
+async def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else passwords.settings.BCRYPT_ROUNDS
+    hashed = passwords.hash_password_sync("Secret123!", rounds)
+
+    print(f"concurrency={concurrency} rounds={rounds} threads={passwords.settings.BCRYPT_THREADS}")
+    for name, login in (("sync bcrypt (old)", blocking_login), ("thread pool", offloaded_login)):
+        report(name, *await run(login, concurrency, hashed))
+
+    passwords.shutdown_password_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""
+Нагрузочный тест хранения состояния платежей на локальном Redis.
+
+Для каждого пользователя выполняет поток регистрация -> подтверждение -> оплата:
+прежние хелперы (ключ и round-trip на каждое поле, 12 запросов на поток)
+против PaymentSession (хеш на пользователя, 5 запросов на поток).
+Запросы к UPAY не выполняются, замеряется только Redis.
+
+Требуется запущенный Redis из REDIS_URL (ключи создаются с префиксом bench:).
+Запуск из корня проекта:
+    python -m benchmarks.payment_session [users] [concurrency]
+"""
+import asyncio
+import statistics
+import sys
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from benchmarks._common import percentile, run_concurrently
+from config.database import get_redis_client, close_redis_pool
+from src.payments.redis import PaymentSession, payment_key, pending_key
+
+PREFIX = "bench:"
+
+
+async def legacy_flow(user: str):
+    # Последовательность прежних save_*/get_* из src/payments/redis.py
+    redis = get_redis_client()
+    # card_registration
+    await redis.set(f"confirm_id:{user}", "52781")
+    await redis.set(f"card_number:{user}", "8600490412345678", ex=60)
+    await redis.set(f"expiry_date:{user}", "2712", ex=60)
+    # card_confirmation
+    confirm_id = await redis.get(f"confirm_id:{user}")
+    card_number = await redis.get(f"card_number:{user}")
+    expiry_date = await redis.get(f"expiry_date:{user}")
+    assert confirm_id and card_number and expiry_date
+    await redis.set(f"uzcard_id:{user}", "1000")
+    await redis.set(f"card_phone:{user}", "998901234567")
+    await redis.set(f"balance:{user}", "15000000")
+    # card_payment
+    uzcard_id = await redis.get(f"uzcard_id:{user}")
+    card_phone = await redis.get(f"card_phone:{user}")
+    assert uzcard_id and card_phone
+    await redis.set(f"transaction:{user}", "884112907")
+
+
+async def session_flow(user: str):
+    session = PaymentSession(user)
+    # card_registration
+    await session.start_registration("52781", "8600490412345678", "2712")
+    # card_confirmation
+    confirm_id, card_number, expiry_date = await session.get_registration()
+    assert confirm_id and card_number and expiry_date
+    await session.complete_registration("1000", "998901234567", "15000000")
+    # card_payment
+    card = await session.get_card()
+    assert card["uzcard_id"] and card["card_phone"]
+    await session.save_transaction("884112907")
+
+
+async def measure(name: str, flow, users: list, concurrency: int):
+    latencies, elapsed = await run_concurrently(flow, users, concurrency)
+    latencies = [latency * 1000 for latency in latencies]
+    print(f"{name:<16} {len(users) / elapsed:8.0f} flows/s  "
+          f"p50 {statistics.median(latencies):6.2f} ms  p99 {percentile(latencies, 99):6.2f} ms")
+
+
+async def cleanup(users: list):
+    redis = get_redis_client()
+    async with redis.pipeline(transaction=False) as pipe:
+        for user in users:
+            pipe.delete(*(f"{name}:{user}" for name in ("confirm_id", "card_number", "expiry_date", "uzcard_id",
+                                                         "card_phone", "balance", "transaction")))
+            pipe.delete(payment_key(user), pending_key(user))
+        await pipe.execute()
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    users = [f"{PREFIX}{i}" for i in range(count)]
+
+    print(f"users={count} concurrency={concurrency}")
+    await measure("per-field keys", legacy_flow, users, concurrency)
+    await measure("PaymentSession", session_flow, users, concurrency)
+    await cleanup(users)
+    await close_redis_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
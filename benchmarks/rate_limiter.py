@@ -0,0 +1,50 @@
+"""
+Накладные расходы распределенного ограничителя запросов на один запрос.
+
+Замеряет задержку SlidingWindowRateLimiter.hit (один EVALSHA на общем пуле)
+последовательно и при параллельной нагрузке, в сравнении с голым PING
+к тому же Redis - нижней границей любой проверки через сеть.
+
+Требуется запущенный Redis из REDIS_URL (ключи с префиксом bench-ratelimit:).
+Запуск из корня проекта:
+    python -m benchmarks.rate_limiter [requests] [concurrency]
+"""
+import asyncio
+import logging
+import statistics
+import sys
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from benchmarks._common import percentile, run_concurrently
+from config.database import close_redis_pool, get_redis_client
+from src.authorization.rate_limeter import SlidingWindowRateLimiter, parse_rate
+
+logging.getLogger().setLevel(logging.CRITICAL)
+
+
+async def measure(name: str, call, total: int, concurrency: int):
+    latencies, elapsed = await run_concurrently(call, range(total), concurrency)
+    print(f"{name:<34} p50 {statistics.median(latencies) * 1e6:8.0f} us  p99 {percentile(latencies, 99) * 1e6:8.0f} us"
+          f"  {total / elapsed:9.0f} ops/s")
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    redis = get_redis_client()
+    limiter = SlidingWindowRateLimiter(prefix="bench-ratelimit")
+    limit, window_ms = parse_rate("10/minute")
+
+    print(f"requests={total} concurrency={concurrency}")
+    for level in (1, concurrency):
+        await measure(f"PING, concurrency {level}", lambda i: redis.ping(), total, level)
+        # 1000 разных ключей (телефонов), часть запросов упирается в лимит
+        await measure(f"limiter.hit, concurrency {level}",
+                      lambda i: limiter.hit(f"sms_phone:{i % 1000}", limit, window_ms), total, level)
+
+    await close_redis_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
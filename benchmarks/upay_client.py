@@ -0,0 +1,74 @@
+"""
+Пропускная способность запросов к UPAY через фейковый SOAP-шлюз.
+
+Сравнивает прежнюю схему (новый AsyncClient на каждый запрос) с общим UpayClient.
+Локальный сервер работает без TLS, поэтому реальный выигрыш от keep-alive
+(без повторного TLS-рукопожатия) на боевом шлюзе больше, чем здесь.
+
+Запуск из корня проекта:
+    python -m benchmarks.upay_client [requests] [concurrency] [latency_ms]
+"""
+import asyncio
+import logging
+import sys
+
+from httpx import AsyncClient
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from benchmarks._common import run_concurrently
+from benchmarks.fake_upay import run_fake_upay
+from src.payments.client import HTTP2_AVAILABLE, UpayClient
+
+logging.getLogger().setLevel(logging.WARNING)
+
+REQUEST_BODY = """<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:st="http://st.apus.com/">
+    <soapenv:Header/>
+    <soapenv:Body>
+        <st:partnerCardList>
+            <partnerCardListRequest>
+                <StPimsApiPartnerKey>partner</StPimsApiPartnerKey>
+                <AccessToken>token</AccessToken>
+                <CardList>1000</CardList>
+                <Version>1</Version>
+                <Lang>ru</Lang>
+            </partnerCardListRequest>
+        </st:partnerCardList>
+    </soapenv:Body>
+</soapenv:Envelope>"""
+
+
+async def post_with_new_client(url: str):
+    # Прежние функции requests.py: клиент и соединение создаются на каждый запрос
+    async with AsyncClient() as client:
+        return await client.post(url, data=REQUEST_BODY, headers={'Content-Type': 'text/xml'})
+
+
+async def measure(name: str, post, total: int, concurrency: int, stats: dict):
+    stats["connections"].clear()
+
+    async def one(_):
+        response = await post()
+        assert response.status_code == 200, response.text
+
+    _, elapsed = await run_concurrently(one, range(total), concurrency)
+    print(f"{name:<24} {total / elapsed:9.0f} req/s  {elapsed * 1000:8.1f} ms  "
+          f"tcp connections: {len(stats['connections'])}")
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.0
+
+    async with run_fake_upay(latency=latency) as (url, stats):
+        print(f"requests={total} concurrency={concurrency} latency={latency * 1000:.0f} ms http2={HTTP2_AVAILABLE}")
+        await measure("AsyncClient per call", lambda: post_with_new_client(url), total, concurrency, stats)
+
+        client = UpayClient(url, max_connections=concurrency)
+        await measure("UpayClient", lambda: client.post(REQUEST_BODY, idempotent=True), total, concurrency, stats)
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+"""
+Сборка SOAP-запросов UPAY: прежние f-строки против заранее собранных шаблонов envelopes.
+
+Для каждой из четырех операций замеряет f-строку с кодированием в байты
+(httpx кодировал строку при каждом запросе) и EnvelopeTemplate.build.
+Перед замером проверяет, что оба варианта передают одинаковые значения полей.
+
+Запуск из корня проекта:
+    python -m benchmarks.upay_envelopes [iterations]
+"""
+import sys
+import time
+
+from xml.etree import ElementTree
+
+from src.payments.envelopes import REGISTER_CARD, CONFIRM_CARD, CARD_LIST, PAYMENT
+
+
+# Прежние тела запросов из src/payments/requests.py
+def legacy_register_card(partner_key, access_token, card_number, expiry_date):
+    request_body = f"""<?xml version="1.0" encoding="UTF-8"?>
+    <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
+                  xmlns:st="http://st.apus.com/"> 
+   <soapenv:Header/>
+   <soapenv:Body>
+      <st:partnerRegisterCard>
+        <partnerRegisterCardRequest>  
+            <StPimsApiPartnerKey>{partner_key}</StPimsApiPartnerKey>
+            <AccessToken>{access_token}</AccessToken>
+            <CardNumber>{card_number}</CardNumber>
+            <ExDate>{expiry_date}</ExDate>
+            <Version>1</Version>
+            <Lang>ru</Lang>
+            </partnerRegisterCardRequest>
+        </st:partnerRegisterCard>
+    </soapenv:Body>
+</soapenv:Envelope>"""
+    return request_body.encode()
+
+
+def legacy_confirm_card(partner_key, confirm_token, confirm_id, verify_code):
+    request_body = f"""<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:st="http://st.apus.com/">
+    <soapenv:Header/>
+    <soapenv:Body>
+        <st:partnerConfirmCard>
+            <partnerConfirmCardRequest>
+                <StPimsApiPartnerKey>{partner_key}</StPimsApiPartnerKey>
+                <AccessToken>{confirm_token}</AccessToken>
+                <ConfirmId>{confirm_id}</ConfirmId>
+                <VerifyCode>{verify_code}</VerifyCode>
+                <Version>1</Version>
+                <Lang>ru</Lang>
+            </partnerConfirmCardRequest>
+        </st:partnerConfirmCard>
+    </soapenv:Body>
+</soapenv:Envelope>
+    """
+    return request_body.encode()
+
+
+def legacy_card_list(partner_key, uzcard_token, uzcard_id):
+    request_body = f"""<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:st="http://st.apus.com/">
+    <soapenv:Header/>
+    <soapenv:Body>
+        <st:partnerCardList>
+            <partnerCardListRequest>
+                <StPimsApiPartnerKey>{partner_key}</StPimsApiPartnerKey>
+                <AccessToken>{uzcard_token}</AccessToken>
+                <CardList>{uzcard_id}</CardList>
+                <Version>1</Version>
+                <Lang>ru</Lang>
+            </partnerCardListRequest>
+        </st:partnerCardList>
+    </soapenv:Body>
+</soapenv:Envelope>
+    """
+    return request_body.encode()
+
+
+def legacy_payment(partner_key, payment_token, card_phone, uzcard_id, service_id, personal_account, amount_tiyin):
+    request_body = f"""<?xml version="1.0" encoding="UTF-8"?>
+    <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:st="http://st.apus.com/">
+    <soapenv:Header/>
+    <soapenv:Body>
+        <st:partnerPayment>
+            <partnerPaymentRequest>
+                <StPimsApiPartnerKey>{partner_key}</StPimsApiPartnerKey>
+                <AccessToken>{payment_token}</AccessToken>
+                <CardPhone>{card_phone}</CardPhone>
+                <UzcardId>{uzcard_id}</UzcardId>
+                <ServiceId>{service_id}</ServiceId>
+                <PaymentType></PaymentType>
+                <PersonalAccount>{personal_account}</PersonalAccount>
+                <AmountInTiyin>{amount_tiyin}</AmountInTiyin>
+                <RegionId></RegionId>
+                <SubRegionId></SubRegionId>
+                <Version>1</Version>
+                <Lang>ru</Lang>
+            </partnerPaymentRequest>
+        </st:partnerPayment>
+    </soapenv:Body>
+</soapenv:Envelope>
+    """
+    return request_body.encode()
+
+
+CASES = [
+    ("partnerRegisterCard", legacy_register_card, REGISTER_CARD,
+     ("partner-key", "0f3c9a7d1e2b", "8600490412345678", "2712")),
+    ("partnerConfirmCard", legacy_confirm_card, CONFIRM_CARD,
+     ("partner-key", "0f3c9a7d1e2b", "52781", 123456)),
+    ("partnerCardList", legacy_card_list, CARD_LIST,
+     ("partner-key", "0f3c9a7d1e2b", "1000")),
+    ("partnerPayment", legacy_payment, PAYMENT,
+     ("partner-key", "0f3c9a7d1e2b", "998901234567", "1000", "1245", "9d6f1c1e-6a4b-4c1c-9d52-0f3e4a6f7b21",
+      1500000)),
+]
+
+
+def request_fields(body: bytes) -> dict:
+    request = ElementTree.fromstring(body).find(".//{http://schemas.xmlsoap.org/soap/envelope/}Body")[0][0]
+    return {child.tag: (child.text or "").strip() for child in request}
+
+
+def measure(name: str, build, values: tuple, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        build(*values)
+    elapsed = time.perf_counter() - started
+    per_call = elapsed / iterations * 1_000_000_000
+    print(f"{name:<32} {per_call:8.0f} ns/request")
+    return per_call
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f"iterations={iterations}")
+    for operation, legacy, template, values in CASES:
+        assert request_fields(legacy(*values)) == request_fields(template.build(*values)), operation
+        before = measure(f"{operation}: f-string", legacy, values, iterations)
+        after = measure(f"{operation}: template", template.build, values, iterations)
+        print(f"{'':<32} x{before / after:.1f}, {len(legacy(*values))} -> {len(template.build(*values))} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Разбор ответов UPAY: прежняя схема против parse_upay_response.
+
+Прежние эндпоинты разбирали один и тот же ответ несколько раз:
+подтверждение карты - ElementTree для проверки ошибки и еще три fromstring в parse_*,
+список карт - ElementTree для ошибки и xmltodict для ответа.
+Ответы берутся из фейкового шлюза benchmarks.fake_upay.
+
+Запуск из корня проекта:
+    python -m benchmarks.upay_parsing [iterations] [cards]
+"""
+import sys
+import time
+
+from xml.etree import ElementTree
+
+import xmltodict
+
+from benchmarks.fake_upay import RESPONSES, card_list_response
+from src.payments.response_parser import parse_upay_response
+
+NAMESPACES = {"s": "http://schemas.xmlsoap.org/soap/envelope/", "ns2": "http://st.apus.com/"}
+
+
+def find_text(xml_response: bytes, path: str) -> str | None:
+    # Каждая прежняя parse_* функция заново разбирала весь ответ
+    element = ElementTree.fromstring(xml_response).find(path, namespaces=NAMESPACES)
+    return element.text if element is not None else None
+
+
+def legacy_confirm(xml_response: bytes) -> tuple:
+    prefix = ".//s:Body/ns2:partnerConfirmCardResponse/return/"
+    root = ElementTree.fromstring(xml_response)
+    code = root.find(prefix + "Result/code", namespaces=NAMESPACES)
+    assert code is None or code.text == "OK"
+    return (find_text(xml_response, prefix + "UzcardId"),
+            find_text(xml_response, prefix + "CardPhone"),
+            find_text(xml_response, prefix + "Balance"))
+
+
+def new_confirm(xml_response: bytes) -> tuple:
+    result = parse_upay_response(xml_response)
+    assert result.ok
+    return result.require("uzcard_id"), result.require("card_phone"), result.require("balance")
+
+
+def legacy_card_list(xml_response: bytes) -> dict:
+    root = ElementTree.fromstring(xml_response)
+    code = root.find(".//s:Body/ns2:partnerCardListResponse/return/Result/code", namespaces=NAMESPACES)
+    assert code is None or code.text == "OK"
+    data = xmltodict.parse(xml_response)
+    return data.get("S:Envelope", {}).get("S:Body", {}).get("ns2:partnerCardListResponse", {}).get("return", {})
+
+
+def new_card_list(xml_response: bytes) -> dict:
+    result = parse_upay_response(xml_response)
+    assert result.ok
+    return result.as_dict()
+
+
+def measure(name: str, parse, payload: bytes, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        parse(payload)
+    elapsed = time.perf_counter() - started
+    per_call = elapsed / iterations * 1_000_000
+    print(f"{name:<32} {per_call:8.1f} us/response  {iterations / elapsed:9.0f} responses/s")
+    return per_call
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cards = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    confirm = RESPONSES["partnerConfirmCard"].encode()
+    card_list = card_list_response(cards).encode()
+    assert legacy_confirm(confirm) == new_confirm(confirm)
+    assert legacy_card_list(card_list) == new_card_list(card_list)
+
+    print(f"iterations={iterations} cards={cards}")
+    before = measure("confirm: 4x fromstring", legacy_confirm, confirm, iterations)
+    after = measure("confirm: parse_upay_response", new_confirm, confirm, iterations)
+    print(f"{'':<32} x{before / after:.1f}")
+    before = measure("card list: ElementTree+xmltodict", legacy_card_list, card_list, iterations)
+    after = measure("card list: parse_upay_response", new_card_list, card_list, iterations)
+    print(f"{'':<32} x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
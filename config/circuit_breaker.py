@@ -0,0 +1,181 @@
+import asyncio
+import time
+
+from typing import Any, Awaitable, Callable
+
+from config.settings import get_settings
+from logs.logger import logger
+
+settings = get_settings()
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Состояние всех предохранителей и изоляторов процесса для /metrics/providers
+circuit_breakers: dict[str, "CircuitBreaker"] = {}
+bulkheads: dict[str, "Bulkhead"] = {}
+
+
+class ProviderUnavailableError(Exception):
+    """Запрос к внешнему провайдеру отклонен без обращения к нему"""
+
+    def __init__(self, provider: str, reason: str, retry_after: float):
+        super().__init__(f"{provider}: {reason}")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(ProviderUnavailableError):
+    pass
+
+
+class BulkheadFullError(ProviderUnavailableError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для вызовов внешнего провайдера.
+    После failure_threshold ошибок подряд размыкается и recovery_timeout секунд
+    сразу отклоняет вызовы, затем пропускает half_open_max_calls пробных вызовов:
+    успех замыкает цепь, ошибка снова размыкает.
+    Ошибкой считается исключение или результат, для которого is_failure вернул True.
+    """
+
+    def __init__(self, name: str,
+                 failure_threshold: int = None,
+                 recovery_timeout: float = None,
+                 half_open_max_calls: int = None,
+                 is_failure: Callable[[Any], bool] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.CIRCUIT_FAILURE_THRESHOLD
+        self.recovery_timeout = recovery_timeout or settings.CIRCUIT_RECOVERY_TIMEOUT
+        self.half_open_max_calls = half_open_max_calls or settings.CIRCUIT_HALF_OPEN_MAX_CALLS
+        self.is_failure = is_failure or (lambda result: False)
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+        circuit_breakers[name] = self
+
+    def current_state(self) -> str:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+            self.state = HALF_OPEN
+            self.half_open_calls = 0
+            logger.info("Предохранитель %s: пробные запросы", self.name)
+        return self.state
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.recovery_timeout - time.monotonic())
+
+    def before_call(self):
+        state = self.current_state()
+        if state == OPEN or (state == HALF_OPEN and self.half_open_calls >= self.half_open_max_calls):
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(self.name, "circuit is open", self.retry_after() or 1.0)
+        if state == HALF_OPEN:
+            self.half_open_calls += 1
+        self.stats["calls"] += 1
+
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            logger.info("Предохранитель %s замкнут, провайдер отвечает", self.name)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.stats["opened"] += 1
+                logger.error("Предохранитель %s разомкнут после %s ошибок подряд",
+                             self.name, self.consecutive_failures)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        # Вызов не дал ответа о провайдере (отмена, нет места в изоляторе): пробный слот освобождается
+        if self.state == HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    async def call(self, func: Callable[..., Awaitable], *args, **kwargs):
+        self.before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except (asyncio.CancelledError, ProviderUnavailableError):
+            self.release_probe()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        if self.is_failure(result):
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+
+    def get_stats(self) -> dict:
+        return {
+            "state": self.current_state(),
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after": round(self.retry_after(), 1) if self.state == OPEN else 0,
+            **self.stats,
+        }
+
+
+class Bulkhead:
+    """
+    Изолятор: не больше max_concurrent одновременных запросов к провайдеру.
+    Запрос ждет свободного места не дольше max_wait секунд, затем отклоняется,
+    чтобы медленный провайдер не занимал все соединения и воркеры.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_wait: float = None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait = settings.BULKHEAD_MAX_WAIT if max_wait is None else max_wait
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        bulkheads[name] = self
+
+    async def __aenter__(self):
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(self.max_wait):
+                await self.semaphore.acquire()
+        except TimeoutError:
+            self.rejected += 1
+            logger.error("Изолятор %s: нет свободного места за %s сек", self.name, self.max_wait)
+            raise BulkheadFullError(self.name, "too many concurrent requests", self.max_wait)
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.active -= 1
+        self.semaphore.release()
+
+    def get_stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+
+def get_provider_stats() -> dict:
+    return {
+        name: {
+            "circuit": breaker.get_stats(),
+            "bulkhead": bulkheads[name].get_stats() if name in bulkheads else None,
+        }
+        for name, breaker in circuit_breakers.items()
+    }
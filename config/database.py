@@ -1,35 +1,254 @@
+import asyncio
+import itertools
+import os
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
 import redis.asyncio as redis
 
+from fastapi import Request
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
-from config.settings import get_settings
+from config.settings import get_settings, DB_ENGINE_PROFILES
+from logs.logger import logger
 
-ASYNC_SQLALCHEMY_DATABASE_URL = get_settings().DB_URL
-REDIS_URL = get_settings().REDIS_URL
+settings = get_settings()
 
-engine = create_async_engine(
-    ASYNC_SQLALCHEMY_DATABASE_URL,
-    echo=True
-)
+ASYNC_SQLALCHEMY_DATABASE_URL = settings.DB_URL
+REDIS_URL = settings.REDIS_URL
+# Ожидание сообщения pub/sub за один вызов, меньше REDIS_SOCKET_TIMEOUT:
+# пустой результат - нормальная тишина в канале, а не обрыв соединения
+PUBSUB_POLL_TIMEOUT = 1.0
+PUBSUB_RECONNECT_DELAY = 5
+
+
+def get_engine_options() -> dict:
+    """
+    Параметры create_async_engine для текущего окружения.
+    Значения из профиля ENVIRONMENT переопределяются явно заданными переменными DB_*.
+    """
+    if settings.ENVIRONMENT not in DB_ENGINE_PROFILES:
+        raise ValueError(f"Unknown ENVIRONMENT: {settings.ENVIRONMENT}")
+
+    profile = DB_ENGINE_PROFILES[settings.ENVIRONMENT]
+    overrides = {
+        "echo": settings.DB_ECHO,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "statement_timeout": settings.DB_STATEMENT_TIMEOUT,
+        "command_timeout": settings.DB_COMMAND_TIMEOUT,
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+    options = {**profile, **{key: value for key, value in overrides.items() if value is not None}}
+
+    return {
+        "echo": options["echo"],
+        "pool_size": options["pool_size"],
+        "max_overflow": options["max_overflow"],
+        "pool_timeout": options["pool_timeout"],
+        "pool_recycle": options["pool_recycle"],
+        "pool_pre_ping": options["pool_pre_ping"],
+        "connect_args": {
+            # Кеш подготовленных выражений на соединение (диалект asyncpg SQLAlchemy)
+            "prepared_statement_cache_size": options["statement_cache_size"],
+            "command_timeout": options["command_timeout"],
+            "server_settings": {"statement_timeout": str(options["statement_timeout"])},
+        },
+    }
+
+
+engine_options = get_engine_options()
+engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **engine_options)
 
 AsyncSessionLocal = sessionmaker(expire_on_commit=False, autoflush=False, bind=engine, class_=AsyncSession)
 
+# Реплики для чтения используют те же параметры пула, что и основная БД
+replica_engines = [create_async_engine(url.strip(), **engine_options)
+                   for url in (settings.DB_REPLICA_URLS or "").split(",") if url.strip()]
+replica_sessions = itertools.cycle(
+    [sessionmaker(expire_on_commit=False, autoflush=False, bind=replica, class_=AsyncSession)
+     for replica in replica_engines]
+)
+
 Base = declarative_base()
 
+# Общий пул соединений Redis на процесс. Создается в lifespan приложения,
+# все модули получают клиента через get_redis_client() или зависимость get_redis.
+redis_pool: redis.BlockingConnectionPool | None = None
+redis_client: redis.Redis | None = None
+
+
+@event.listens_for(Session, "after_flush")
+def mark_session_written(session, flush_context):
+    session.info["has_writes"] = True
+
+
+def sticky_key(user_uuid: str) -> str:
+    return f"db:sticky:{user_uuid}"
 
-async def get_db() -> AsyncSession:
+
+def get_request_principal_uuid(request: Request) -> str | None:
+    # Payload кладет в request.state JWTBearer; get_db читает его после обработчика, когда зависимости уже разрешены
+    payload = getattr(request.state, "token_payload", None)
+    return payload.get("user_uuid") if payload else None
+
+
+async def get_db(request: Request) -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
 
+        user_uuid = get_request_principal_uuid(request)
+        if replica_engines and user_uuid and session.info.get("has_writes"):
+            # Пока реплика догоняет основную БД, чтения этого пользователя идут в основную БД
+            try:
+                await get_redis_client().set(sticky_key(user_uuid), 1, ex=settings.DB_STICKY_SECONDS)
+            except Exception as e:
+                logger.error("Не удалось закрепить чтение за основной БД для %s: %s", user_uuid, e)
+
+
+async def is_sticky_to_primary(user_uuid: str | None) -> bool:
+    if user_uuid is None:
+        return False
+    try:
+        return bool(await get_redis_client().exists(sticky_key(user_uuid)))
+    except Exception as e:
+        # Без Redis нельзя гарантировать чтение своих записей, поэтому читаем с основной БД
+        logger.error("Не удалось проверить закрепление за основной БД для %s: %s", user_uuid, e)
+        return True
+
+
+@asynccontextmanager
+async def read_session(user_uuid: str | None) -> AsyncIterator[AsyncSession]:
+    """
+    Сессия для чтения. Чтение идет с реплики (round-robin),
+    кроме случаев, когда реплики не настроены или пользователь недавно писал в основную БД.
+    Зависимость get_db_read (config.security) передает сюда uuid из проверенного токена.
+    """
+    if not replica_engines or await is_sticky_to_primary(user_uuid):
+        session_factory = AsyncSessionLocal
+    else:
+        session_factory = next(replica_sessions)
+
+    async with session_factory() as session:
+        yield session
+
+def create_redis_pool() -> redis.BlockingConnectionPool:
+    # BlockingConnectionPool при исчерпании лимита ждет освобождения соединения,
+    # а не открывает новые, поэтому нагрузка на сервер Redis ограничена max_connections
+    return redis.BlockingConnectionPool.from_url(
+        url=REDIS_URL,
+        encoding="utf-8",
+        # password=REDIS_PASSWORD,
+        decode_responses=True,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+    )
+
+
+def get_redis_client() -> redis.Redis:
+    """
+    Возвращает клиент Redis, работающий поверх общего пула.
+    Соединение берется из пула на время команды и возвращается обратно,
+    поэтому закрывать клиента после использования не нужно.
+    """
+    global redis_pool, redis_client
+    if redis_client is None:
+        if redis_pool is None:
+            redis_pool = create_redis_pool()
+        redis_client = redis.Redis(connection_pool=redis_pool)
+    return redis_client
+
+
+async def get_redis() -> redis.Redis:
+    """Зависимость FastAPI для получения клиента Redis."""
+    return get_redis_client()
+
+
+async def init_redis_pool():
+    client = get_redis_client()
+    try:
+        await client.ping()
+        logger.success("Пул соединений Redis инициализирован (max_connections=%s)", settings.REDIS_MAX_CONNECTIONS)
+    except Exception as e:
+        logger.error("Redis недоступен при инициализации пула: %s", e)
+
+
+async def close_redis_pool():
+    global redis_pool, redis_client
+    if redis_client is not None:
+        await redis_client.aclose()
+        redis_client = None
+    if redis_pool is not None:
+        await redis_pool.disconnect()
+        redis_pool = None
+    logger.info("Пул соединений Redis закрыт")
+
+
+async def listen_channel(channel: str, on_message: Callable[[str], Awaitable], on_reconnect: Callable[[], Awaitable]):
+    """
+    Фоновая подписка на канал Redis: вызывает on_message для каждого сообщения.
+    Переподключается при обрыве, после переподписки вызывает on_reconnect,
+    так как пока подписки не было, сообщения могли быть пропущены.
+    """
+    reconnect = False
+    while True:
+        pubsub = get_redis_client().pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            if reconnect:
+                await on_reconnect()
+                reconnect = False
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=PUBSUB_POLL_TIMEOUT)
+                if message is not None and message["type"] == "message":
+                    await on_message(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Подписка на канал %s прервана: %s", channel, e)
+            reconnect = True
+            await asyncio.sleep(PUBSUB_RECONNECT_DELAY)
+        finally:
+            await pubsub.aclose()
+
+
+def get_redis_pool_stats() -> dict:
+    """Метрики пула соединений Redis текущего процесса."""
+    if redis_pool is None:
+        return {"initialized": False}
 
-async def get_redis_connection():
-    return await redis.from_url(url=REDIS_URL,
-                                encoding="utf-8",
-                                # password=REDIS_PASSWORD,
-                                decode_responses=True)
+    in_use = len(redis_pool._in_use_connections)
+    idle = len(redis_pool._available_connections)
+    return {
+        "initialized": True,
+        "max_connections": redis_pool.max_connections,
+        "created_connections": in_use + idle,
+        "in_use_connections": in_use,
+        "idle_connections": idle,
+    }
 
 
-async def close_redis_connection(redis_connection):
-    if redis_connection:
-        await redis_connection.aclose()
+def get_db_pool_stats() -> dict:
+    """Метрики пула соединений БД текущего процесса."""
+    pool = engine.pool
+    # Воркеры uvicorn не делят пул, поэтому верхняя граница соединений с Postgres растет с их числом
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    return {
+        "environment": settings.ENVIRONMENT,
+        "pool_size": pool.size(),
+        "max_overflow": engine_options["max_overflow"],
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "workers": workers,
+        "max_connections_all_workers": workers * (pool.size() + engine_options["max_overflow"]),
+    }
@@ -1,7 +1,12 @@
+import hashlib
+import time
 import uuid
 import jwt
 
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from typing import Optional
 
 from fastapi import Header, Request, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -10,7 +15,7 @@ from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from config.database import get_db
+from config.database import get_db, read_session
 from logs.logger import logger
 
 from config.settings import get_settings
@@ -19,43 +24,90 @@ from src.users.models import User
 settings = get_settings()
 
 
+class VerifiedTokenCache:
+    """
+    Ограниченный LRU-кеш уже проверенных access-токенов.
+    Ключ - SHA-256 от токена, запись живет не дольше claim exp,
+    поэтому повторная проверка подписи не продлевает жизнь токена.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[bytes, dict] = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        payload = self._entries.get(key)
+        if payload is None:
+            return None
+
+        if payload["exp"] <= time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return payload
+
+    def set(self, token: str, payload: dict):
+        if self.max_size <= 0 or "exp" not in payload:
+            return
+
+        key = self._key(token)
+        self._entries[key] = payload
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+verified_tokens = VerifiedTokenCache(settings.JWT_CACHE_SIZE)
+
+
 class JWTBearer(HTTPBearer):
     def __init__(self, auto_Error: bool = True):
         super(JWTBearer, self).__init__(auto_error=auto_Error,
                                         scheme_name="JWT Authorization",
                                         description="Enter the token in the format: Bearer your_access_token")
 
-    async def __call__(self, request: Request):
+    async def __call__(self, request: Request) -> dict:
+        """
+        Проверяет токен один раз за запрос и возвращает его payload.
+        Payload также сохраняется в request.state.token_payload,
+        чтобы остальные зависимости не декодировали токен повторно.
+        """
+        payload = getattr(request.state, "token_payload", None)
+        if payload is not None:
+            return payload
+
         credentials: HTTPAuthorizationCredentials = await super(JWTBearer, self).__call__(request)
         if credentials:
             if not credentials.scheme == "Bearer":
                 raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid authentication scheme.")
 
-            token = self.verify_jwt(credentials.credentials)
+            # Невалидный токен -> 400, истекший -> 410
+            payload = decode_access_token(credentials.credentials)
+            request.state.token_payload = payload
+            return payload
+        else:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired token")
 
-            if not token["is_valid"]:
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token")
 
-            if token["is_expired"]:
-                raise HTTPException(status_code=status.HTTP_410_GONE, detail="Token expired")
+jwt_bearer = JWTBearer()
 
-            return credentials.credentials
-        else:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired token")
 
-    def verify_jwt(self, token: str) -> bool:
-        """
-        Метод проверки JWT-токена.
-        Возвращает словарь с информацией о валидности
-        и истечении срока действия токена.
-        """
-        try:
-            decode_access_token(token)
-            return {"is_valid": True, "is_expired": False}
-        except jwt.ExpiredSignatureError:
-            return {"is_valid": False, "is_expired": True}
-        except jwt.PyJWTError:
-            return {"is_valid": False, "is_expired": False}
+async def get_db_read(payload: dict = Depends(jwt_bearer)) -> AsyncSession:
+    """
+    Сессия для GET-обработчиков: реплика или основная БД, если пользователь из токена недавно писал.
+    Токен проверяется явной зависимостью, поэтому выбор не зависит от порядка параметров обработчика.
+    """
+    async with read_session(payload.get("user_uuid")) as session:
+        yield session
 
 
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)):
@@ -89,6 +141,10 @@ def create_refresh_token(data: dict, expires_delta: timedelta = timedelta(days=s
 
 
 def decode_access_token(token: str):
+    payload = verified_tokens.get(token)
+    if payload is not None:
+        return payload
+
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=settings.JWT_ALGORITHM)
         user_uuid = payload.get("user_uuid")
@@ -98,6 +154,7 @@ def decode_access_token(token: str):
 
         # Преобразуем user_uuid в UUID сразу здесь, чтобы избежать дублирования кода
         payload["user_uuid"] = uuid.UUID(user_uuid)
+        verified_tokens.set(token, payload)
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=status.HTTP_410_GONE, detail="Token expired")
@@ -105,88 +162,73 @@ def decode_access_token(token: str):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token")
 
 
-async def get_current_user(token: str = Depends(JWTBearer()),
-                           db: AsyncSession = Depends(get_db)):
-    payload = decode_access_token(token)
-
-    user_uuid = payload.get("user_uuid")
-    role = payload.get("role")
+@dataclass
+class Principal:
+    """
+    Аутентифицированный пользователь, собранный из проверенных claims JWT.
+    uuid и role берутся из токена без запроса в базу данных,
+    ORM-объект User загружается лениво только через get_user().
+    """
+    uuid: uuid.UUID
+    role: Optional[str]
+    db: AsyncSession = field(repr=False)
+    _user: Optional[User] = field(default=None, init=False, repr=False)
 
-    user = await db.scalar(select(User).options(selectinload(User.roles)).where(User.uuid == user_uuid))
+    @property
+    def is_superuser(self) -> bool:
+        return self.role == "superuser"
 
-    if user is None:
-        logger.error(f"Пользователь с {user_uuid} не найден")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-
-    # Проверка, является ли пользователь суперпользователем
-    if role == "superuser":
-        return user
-
-    return user
+    async def get_user(self) -> Optional[User]:
+        if self._user is None:
+            self._user = await self.db.scalar(
+                select(User)
+                .options(selectinload(User.roles))
+                .where(User.uuid == self.uuid)
+            )
+        return self._user
 
 
-async def is_superuser(token: str = Depends(JWTBearer()),
-                       db: AsyncSession = Depends(get_db)):
-    payload = decode_access_token(token)
+async def get_current_principal(payload: dict = Depends(jwt_bearer),
+                                db: AsyncSession = Depends(get_db)) -> Principal:
+    return Principal(uuid=payload.get("user_uuid"), role=payload.get("role"), db=db)
 
-    user_uuid = payload.get("user_uuid")
-    role = payload.get("role")
 
-    user = await db.scalar(
-        select(User)
-        .options(selectinload(User.roles))
-        .where(User.uuid == user_uuid)
-    )
-
-    if role != "superuser":
+async def is_superuser_principal(principal: Principal = Depends(get_current_principal)) -> Principal:
+    if not principal.is_superuser:
         logger.error("Доступ запрещен: У вас недостаточно прав")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Access denied: You don't have enough privileges")
+    return principal
+
+
+async def get_current_user(principal: Principal = Depends(get_current_principal)):
+    user = await principal.get_user()
+
+    if user is None:
+        logger.error(f"Пользователь с {principal.uuid} не найден")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
 
 
-async def is_courier(token: str = Depends(JWTBearer()),
-                     db: AsyncSession = Depends(get_db)):
-    payload = decode_access_token(token)
+async def is_superuser(principal: Principal = Depends(is_superuser_principal)):
+    return await principal.get_user()
 
-    user_uuid = payload.get("user_uuid")
-    role = payload.get("role")
 
-    user = await db.scalar(
-        select(User)
-        .options(selectinload(User.roles))
-        .where(User.uuid == user_uuid)
-    )
+async def is_courier(principal: Principal = Depends(get_current_principal)):
+    user = await principal.get_user()
 
     if user is None:
-        logger.error(f"Курьер с UUID: {user_uuid} не найден")
+        logger.error(f"Курьер с UUID: {principal.uuid} не найден")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Courier not found")
-
-    # Проверка, является ли пользователь суперпользователем
-    if role == "superuser":
-        return user
     return user
 
 
-async def is_restaurant_owner(token: str = Depends(JWTBearer()),
-                              db: AsyncSession = Depends(get_db)):
-    payload = decode_access_token(token)
-    user_uuid = payload.get("user_uuid")
-    role = payload.get("role")
-
-    user = await db.scalar(
-        select(User)
-        .options(selectinload(User.roles))
-        .where(User.uuid == user_uuid)
-    )
+async def is_restaurant_owner(principal: Principal = Depends(get_current_principal)):
+    user = await principal.get_user()
 
     if user is None:
-        logger.error(f"Владелец ресторана с UUID: {user_uuid} не найден")
+        logger.error(f"Владелец ресторана с UUID: {principal.uuid} не найден")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Owner of restaurant not found")
-
-    # Проверка, является ли пользователь суперпользователем
-    if role == "superuser":
-        return user
     return user
 
 
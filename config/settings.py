@@ -18,11 +18,32 @@ class Settings(BaseSettings):
     DB_NAME: str = os.getenv("DB_NAME")
     DB_URL: str = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+    # Пул соединений БД. Незаданные значения берутся из профиля окружения (DB_ENGINE_PROFILES)
+    ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
+    DB_ECHO: bool | None = os.getenv("DB_ECHO")
+    DB_POOL_SIZE: int | None = os.getenv("DB_POOL_SIZE")
+    DB_MAX_OVERFLOW: int | None = os.getenv("DB_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT: int | None = os.getenv("DB_POOL_TIMEOUT")  # ожидание свободного соединения, сек
+    DB_POOL_RECYCLE: int | None = os.getenv("DB_POOL_RECYCLE")  # пересоздание соединения, сек
+    DB_POOL_PRE_PING: bool | None = os.getenv("DB_POOL_PRE_PING")
+    DB_STATEMENT_TIMEOUT: int | None = os.getenv("DB_STATEMENT_TIMEOUT")  # statement_timeout Postgres, мс (0 - без лимита)
+    DB_COMMAND_TIMEOUT: int | None = os.getenv("DB_COMMAND_TIMEOUT")  # таймаут запроса на стороне asyncpg, сек
+    DB_STATEMENT_CACHE_SIZE: int | None = os.getenv("DB_STATEMENT_CACHE_SIZE")  # 0 при работе через pgbouncer
+
+    # Реплики для чтения, через запятую в формате DB_URL. Пусто - все запросы идут в основную БД
+    DB_REPLICA_URLS: str | None = os.getenv("DB_REPLICA_URLS")
+    DB_STICKY_SECONDS: int = os.getenv("DB_STICKY_SECONDS", 5)  # чтение с основной БД после записи, сек
+
     # JWT
     JWT_SECRET: str = os.getenv("JWT_SECRET")
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
     REFRESH_TOKEN_EXPIRE_DAYS: int = os.getenv("REFRESH_TOKEN_EXPIRE_DAYS")
+    JWT_CACHE_SIZE: int = os.getenv("JWT_CACHE_SIZE", 4096)  # размер LRU проверенных токенов
+
+    # Пароли
+    BCRYPT_ROUNDS: int = os.getenv("BCRYPT_ROUNDS", 12)  # при изменении хеши обновляются при входе
+    BCRYPT_THREADS: int = os.getenv("BCRYPT_THREADS", 4)  # потоки для bcrypt на воркер
 
     # Redis
     REDIS_HOST: str = os.getenv("REDIS_HOST")
@@ -30,21 +51,106 @@ class Settings(BaseSettings):
     REDIS_DB: str = os.getenv("REDIS_DB")
     REDIS_PASSWORD: str = os.getenv("REDIS_PASSWORD")
     REDIS_URL: str = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
+    REDIS_MAX_CONNECTIONS: int = os.getenv("REDIS_MAX_CONNECTIONS", 50)
+    REDIS_POOL_TIMEOUT: int = os.getenv("REDIS_POOL_TIMEOUT", 5)  # ожидание свободного соединения, сек
+    REDIS_SOCKET_TIMEOUT: int = os.getenv("REDIS_SOCKET_TIMEOUT", 5)
+    REDIS_HEALTH_CHECK_INTERVAL: int = os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30)
+    PROFILE_CACHE_TTL: int = os.getenv("PROFILE_CACHE_TTL", 300)  # время жизни кеша профилей, сек
 
     # Eskiz
     ESKIZ_EMAIL: str = os.getenv("ESKIZ_EMAIL")
     ESKIZ_PASSWORD: str = os.getenv("ESKIZ_PASSWORD")
+    ESKIZ_BASE_URL: str = os.getenv("ESKIZ_BASE_URL", "https://notify.eskiz.uz/api")
+    ESKIZ_MAX_CONNECTIONS: int = os.getenv("ESKIZ_MAX_CONNECTIONS", 10)  # соединений и одновременных запросов
+    ESKIZ_TIMEOUT: int = os.getenv("ESKIZ_TIMEOUT", 10)  # общий таймаут запроса, сек
+    ESKIZ_CONNECT_TIMEOUT: int = os.getenv("ESKIZ_CONNECT_TIMEOUT", 3)
+    ESKIZ_TOKEN_TTL: int = os.getenv("ESKIZ_TOKEN_TTL", 3600)  # сколько хранить токен, сек
+    ESKIZ_TOKEN_REFRESH_MARGIN: int = os.getenv("ESKIZ_TOKEN_REFRESH_MARGIN", 300)  # обновление до истечения, сек
+
+    # Очередь SMS
+    SMS_WORKER_ENABLED: bool = os.getenv("SMS_WORKER_ENABLED", True)  # воркер в процессе приложения
+    SMS_BATCH_SIZE: int = os.getenv("SMS_BATCH_SIZE", 50)
+    SMS_CONCURRENCY: int = os.getenv("SMS_CONCURRENCY", 5)  # одновременных запросов в Eskiz на воркер
+    SMS_RATE_PER_SECOND: int = os.getenv("SMS_RATE_PER_SECOND", 20)
+    SMS_MAX_RETRIES: int = os.getenv("SMS_MAX_RETRIES", 3)
+    SMS_RATE_LIMIT_PER_PHONE: str = os.getenv("SMS_RATE_LIMIT_PER_PHONE", "2/minute")
+    SMS_RATE_LIMIT_PER_IP: str = os.getenv("SMS_RATE_LIMIT_PER_IP", "10/minute")
+    # Прокси перед приложением, дописывающие X-Forwarded-For (0 - заголовок не учитывается)
+    TRUSTED_PROXIES: int = os.getenv("TRUSTED_PROXIES", 1)
 
     # U-pay
     SERVICE_ID: str = os.getenv('SERVICE_ID')
     LOGIN: str = os.getenv('LOGIN')
     PASSWORD: str = os.getenv('PASSWORD')
     STPimsApiPartnerKey: str = os.getenv('STPimsApiPartnerKey')
+    UPAY_URL: str = os.getenv("UPAY_URL", "https://api.upay.uz/STAPI/STWS?wsdl")
+    UPAY_MAX_CONNECTIONS: int = os.getenv("UPAY_MAX_CONNECTIONS", 20)  # соединений и одновременных запросов
+    UPAY_CONNECT_TIMEOUT: int = os.getenv("UPAY_CONNECT_TIMEOUT", 5)
+    UPAY_READ_TIMEOUT: int = os.getenv("UPAY_READ_TIMEOUT", 30)  # ожидание ответа шлюза, сек
+    UPAY_MAX_RETRIES: int = os.getenv("UPAY_MAX_RETRIES", 2)  # повторы только для идемпотентных запросов
+    PAYMENT_PENDING_TTL: int = os.getenv("PAYMENT_PENDING_TTL", 300)  # данные незавершенной регистрации карты, сек
+    IDEMPOTENCY_LOCK_TTL: int = os.getenv("IDEMPOTENCY_LOCK_TTL", 60)  # больше таймаута запроса к UPAY, сек
+    IDEMPOTENCY_RESULT_TTL: int = os.getenv("IDEMPOTENCY_RESULT_TTL", 86400)  # хранение ответа для повторов, сек
+    IDEMPOTENCY_WAIT_TIMEOUT: int = os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 35)  # ожидание дубликатом результата, сек
+    BALANCE_REFRESH_ENABLED: bool = os.getenv("BALANCE_REFRESH_ENABLED", True)  # воркер в процессе приложения
+    BALANCE_REFRESH_INTERVAL: int = os.getenv("BALANCE_REFRESH_INTERVAL", 300)  # период обновления балансов, сек
+    BALANCE_REFRESH_BATCH: int = os.getenv("BALANCE_REFRESH_BATCH", 100)
+    BALANCE_REFRESH_CONCURRENCY: int = os.getenv("BALANCE_REFRESH_CONCURRENCY", 5)  # одновременных запросов в UPAY
+    CARD_ACTIVE_WINDOW: int = os.getenv("CARD_ACTIVE_WINDOW", 604800)  # обновлять карты открытые за 7 дней, сек
+    CARD_CACHE_MAX_AGE: int = os.getenv("CARD_CACHE_MAX_AGE", 3600)  # старше - get_cards идет в UPAY, сек
+    # Ключи HMAC отпечатков карт "версия:ключ" через запятую, первый - текущий.
+    # Старые ключи оставляются в списке, пока в таблице cards есть карты с их отпечатками
+    CARD_HASH_KEYS: str | None = os.getenv("CARD_HASH_KEYS")
+
+    # Внешние провайдеры (UPAY, Eskiz): предохранитель и изолятор
+    CIRCUIT_FAILURE_THRESHOLD: int = os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5)  # ошибок подряд до размыкания
+    CIRCUIT_RECOVERY_TIMEOUT: int = os.getenv("CIRCUIT_RECOVERY_TIMEOUT", 30)  # сек до пробного запроса
+    CIRCUIT_HALF_OPEN_MAX_CALLS: int = os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", 1)
+    BULKHEAD_MAX_WAIT: float = os.getenv("BULKHEAD_MAX_WAIT", 1)  # ожидание свободного места, сек
 
     # others
     API_KEY: str = os.getenv("API_KEY")
 
 
+# Профили пула соединений БД по окружениям.
+# Суммарно воркеры uvicorn могут открыть WEB_CONCURRENCY * (pool_size + max_overflow) соединений,
+# это число должно оставаться меньше max_connections Postgres с запасом для миграций и админки.
+DB_ENGINE_PROFILES = {
+    "development": {
+        "echo": True,
+        "pool_size": 5,
+        "max_overflow": 5,
+        "pool_timeout": 30,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+        "statement_timeout": 0,
+        "command_timeout": 60,
+        "statement_cache_size": 100,
+    },
+    "test": {
+        "echo": False,
+        "pool_size": 2,
+        "max_overflow": 0,
+        "pool_timeout": 10,
+        "pool_recycle": 1800,
+        "pool_pre_ping": False,
+        "statement_timeout": 10000,
+        "command_timeout": 15,
+        "statement_cache_size": 100,
+    },
+    "production": {
+        "echo": False,
+        "pool_size": 10,
+        "max_overflow": 5,
+        "pool_timeout": 10,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+        "statement_timeout": 15000,
+        "command_timeout": 30,
+        "statement_cache_size": 500,
+    },
+}
+
 ALLOWED_IMAGE_TYPES = {"image/jpg", "image/jpeg", "image/png", "image/webp"}
 UPLOAD_DIR = "static/uploads/"
 
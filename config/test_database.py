@@ -0,0 +1,124 @@
+import uuid
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from config.database import get_db, read_session, sticky_key
+from config.security import get_db_read
+from config.settings import get_settings
+
+settings = get_settings()
+
+USER_UUID = uuid.UUID("efdb6be5-1d62-4925-9f32-b0705b6eb9a3")
+
+
+def mock_session_factory() -> MagicMock:
+    """Фабрика сессий, как AsyncSessionLocal: factory() возвращает async context manager с сессией"""
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.info = {}
+    factory = MagicMock()
+    factory.return_value.__aenter__.return_value = mock_session
+    return factory
+
+
+# Фикстура: основная БД, одна реплика и мокированный Redis
+@pytest.fixture
+def databases():
+    primary, replica = mock_session_factory(), mock_session_factory()
+    redis = MagicMock()
+    redis.exists = AsyncMock(return_value=0)
+    redis.set = AsyncMock()
+    with patch("config.database.AsyncSessionLocal", primary), \
+            patch("config.database.replica_engines", [object()]), \
+            patch("config.database.replica_sessions", iter([replica] * 10)), \
+            patch("config.database.get_redis_client", return_value=redis):
+        yield primary, replica, redis
+
+
+async def read_with(user_uuid) -> MagicMock:
+    """Возвращает сессию, которую выдал read_session"""
+    async with read_session(user_uuid) as session:
+        return session
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica(databases):
+    primary, replica, redis = databases
+
+    assert await read_with(USER_UUID) is replica.return_value.__aenter__.return_value
+    redis.exists.assert_awaited_once_with(sticky_key(USER_UUID))
+
+
+# Пользователь недавно писал: его чтения идут в основную БД, пока реплика не догонит
+@pytest.mark.asyncio
+async def test_sticky_user_reads_from_primary(databases):
+    primary, replica, redis = databases
+    redis.exists.return_value = 1
+
+    assert await read_with(USER_UUID) is primary.return_value.__aenter__.return_value
+    replica.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_redis_error_reads_from_primary(databases):
+    primary, replica, redis = databases
+    redis.exists.side_effect = ConnectionError("Redis is down")
+
+    assert await read_with(USER_UUID) is primary.return_value.__aenter__.return_value
+
+
+@pytest.mark.asyncio
+async def test_without_replicas_reads_from_primary(databases):
+    primary, replica, redis = databases
+
+    with patch("config.database.replica_engines", []):
+        assert await read_with(USER_UUID) is primary.return_value.__aenter__.return_value
+    redis.exists.assert_not_called()
+
+
+# Выбор базы зависит только от uuid из проверенного токена
+@pytest.mark.asyncio
+async def test_get_db_read_routes_by_token_user(databases):
+    primary, replica, redis = databases
+    redis.exists.return_value = 1
+
+    session = await get_db_read({"user_uuid": USER_UUID}).__anext__()
+
+    assert session is primary.return_value.__aenter__.return_value
+    redis.exists.assert_awaited_once_with(sticky_key(USER_UUID))
+
+
+async def run_get_db(token_payload: dict | None, has_writes: bool):
+    """Проходит зависимость get_db целиком, включая код после yield"""
+    request = Request({"type": "http", "headers": []})
+    if token_payload is not None:
+        request.state.token_payload = token_payload
+    dependency = get_db(request)
+    session = await dependency.__anext__()
+    if has_writes:
+        session.info["has_writes"] = True
+    with pytest.raises(StopAsyncIteration):
+        await dependency.__anext__()
+
+
+@pytest.mark.asyncio
+async def test_write_pins_user_to_primary(databases):
+    primary, replica, redis = databases
+
+    await run_get_db({"user_uuid": USER_UUID}, has_writes=True)
+
+    redis.set.assert_awaited_once_with(sticky_key(USER_UUID), 1, ex=settings.DB_STICKY_SECONDS)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("token_payload, has_writes", [({"user_uuid": USER_UUID}, False), (None, True)])
+async def test_no_pin_without_writes_or_user(databases, token_payload, has_writes):
+    primary, replica, redis = databases
+
+    await run_get_db(token_payload, has_writes)
+
+    redis.set.assert_not_called()
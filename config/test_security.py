@@ -0,0 +1,146 @@
+import time
+import uuid
+
+from datetime import timedelta
+from unittest.mock import AsyncMock, patch
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from config.security import (Principal, VerifiedTokenCache, create_access_token, decode_access_token,
+                             get_current_principal, get_current_user, is_superuser_principal, jwt_bearer,
+                             verified_tokens)
+from src.users.models import User
+
+USER_UUID = uuid.UUID("efdb6be5-1d62-4925-9f32-b0705b6eb9a3")
+
+
+@pytest.fixture(autouse=True)
+def clear_verified_tokens():
+    """Кеш проверенных токенов общий для процесса, тесты не должны видеть записи друг друга"""
+    verified_tokens.clear()
+    yield
+    verified_tokens.clear()
+
+
+# Фикстура для мокированной сессии базы данных
+@pytest.fixture
+def mock_db_session():
+    """Сессия, в которой scalar() находит пользователя USER_UUID"""
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.scalar.return_value = User(uuid=USER_UUID, phone_number="909170775")
+    return mock_session
+
+
+# Principal собирается из claims токена без запроса в базу данных
+@pytest.mark.asyncio
+async def test_principal_is_built_from_claims(mock_db_session):
+    principal = await get_current_principal({"user_uuid": USER_UUID, "role": "courier"}, mock_db_session)
+
+    assert (principal.uuid, principal.role, principal.is_superuser) == (USER_UUID, "courier", False)
+    mock_db_session.scalar.assert_not_called()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("role", ["courier", "user", None])
+async def test_only_superuser_role_is_allowed(mock_db_session, role):
+    principal = Principal(uuid=USER_UUID, role=role, db=mock_db_session)
+
+    with pytest.raises(HTTPException) as error:
+        await is_superuser_principal(principal)
+
+    assert error.value.status_code == 403
+    mock_db_session.scalar.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_superuser_is_allowed_without_user_lookup(mock_db_session):
+    principal = Principal(uuid=USER_UUID, role="superuser", db=mock_db_session)
+
+    assert await is_superuser_principal(principal) is principal
+    mock_db_session.scalar.assert_not_called()
+
+
+# ORM-объект загружается лениво и только один раз за запрос
+@pytest.mark.asyncio
+async def test_get_user_is_loaded_once(mock_db_session):
+    principal = Principal(uuid=USER_UUID, role="user", db=mock_db_session)
+
+    first = await principal.get_user()
+    second = await principal.get_user()
+
+    assert first is second and first.uuid == USER_UUID
+    mock_db_session.scalar.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_deleted_user_is_not_found(mock_db_session):
+    mock_db_session.scalar.return_value = None
+    principal = Principal(uuid=USER_UUID, role="user", db=mock_db_session)
+
+    with pytest.raises(HTTPException) as error:
+        await get_current_user(principal)
+
+    assert error.value.status_code == 404
+
+
+def test_cached_token_expires_with_exp_claim():
+    cache = VerifiedTokenCache(max_size=10)
+    cache.set("token", {"exp": time.time() + 60})
+
+    assert cache.get("token") is not None
+    with patch("config.security.time.time", return_value=time.time() + 61):
+        assert cache.get("token") is None
+    # Истекшая запись удаляется, а не только пропускается
+    assert cache.get("token") is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = VerifiedTokenCache(max_size=2)
+    exp = time.time() + 60
+    cache.set("first", {"exp": exp})
+    cache.set("second", {"exp": exp})
+    cache.get("first")
+    cache.set("third", {"exp": exp})
+
+    assert cache.get("second") is None
+    assert cache.get("first") is not None and cache.get("third") is not None
+
+
+def test_token_signature_is_verified_once():
+    token = create_access_token({"user_uuid": USER_UUID, "role": "user"})
+
+    with patch("config.security.jwt.decode", wraps=jwt.decode) as decode:
+        first = decode_access_token(token)
+        second = decode_access_token(token)
+
+    assert first is second and first["user_uuid"] == USER_UUID
+    decode.assert_called_once()
+
+
+# Кеш не продлевает жизнь токена: после exp токен снова проверяется и отклоняется
+def test_expired_token_is_not_served_from_cache():
+    token = create_access_token({"user_uuid": USER_UUID}, expires_delta=timedelta(seconds=-1))
+    verified_tokens.set(token, {"user_uuid": USER_UUID, "exp": time.time() - 1})
+
+    with pytest.raises(HTTPException) as error:
+        decode_access_token(token)
+
+    assert error.value.status_code == 410
+
+
+@pytest.mark.asyncio
+async def test_bearer_decodes_token_once_per_request():
+    token = create_access_token({"user_uuid": USER_UUID, "role": "user"})
+    request = Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+    with patch("config.security.decode_access_token", wraps=decode_access_token) as decode:
+        first = await jwt_bearer(request)
+        second = await jwt_bearer(request)
+
+    assert first is second is request.state.token_payload
+    decode.assert_called_once_with(token)
@@ -7,6 +7,7 @@ from src.users.routers import router_users
 from src.payments.routers import router_payment
 from src.couriers.routers import router_couriers
 from src.restaurant_owners.routers import router_restaurant_owner
+from src.monitoring.routers import router_monitoring
 
 routes = APIRouter()
 
@@ -30,3 +31,6 @@ routes.include_router(router_restaurant_owner)
 
 # Регистрация роутера для языков
 routes.include_router(router_translation)
+
+# Регистрация роутера для метрик
+routes.include_router(router_monitoring)
@@ -1,9 +1,20 @@
 from fastapi import Request
 
+from config.settings import get_settings
+
+settings = get_settings()
+
 
 def get_client_ip(request: Request):
-    if "x-forwarded-for" in request.headers:
-        ip = request.headers["x-forwarded-for"]
-    else:
-        ip = request.client.host
+    """
+    Адрес клиента с учетом TRUSTED_PROXIES доверенных прокси перед приложением.
+    Каждый прокси дописывает в конец X-Forwarded-For адрес, с которого к нему пришли,
+    начало заголовка задает сам клиент, поэтому берется N-й адрес с конца.
+    """
+    ip = request.client.host if request.client else None
+    trusted = settings.TRUSTED_PROXIES
+    if trusted and "x-forwarded-for" in request.headers:
+        forwarded = [address.strip() for address in request.headers["x-forwarded-for"].split(",")]
+        if len(forwarded) >= trusted:
+            ip = forwarded[-trusted]
     return ip
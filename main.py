@@ -1,16 +1,62 @@
-from fastapi_pagination import add_pagination
-from slowapi import _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
+import asyncio
+
+from contextlib import asynccontextmanager, suppress
 
+from fastapi_pagination import add_pagination
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.staticfiles import StaticFiles
 
 from endpoints.routes import routes
 from logs.filter import contextual_filter
+from logs.logger import logger
 from logs.utils import get_client_ip
-from src.authorization.rate_limeter import limiter
-from config.database import get_redis_connection
+from config.database import init_redis_pool, close_redis_pool
+from config.settings import get_settings
+from src.users.passwords import shutdown_password_executor
+from src.users.roles import role_registry
+from src.authorization.outbox import SmsOutboxWorker
+from src.authorization.sms import eskiz_client
+from src.payments.balances import balance_refresher
+from src.payments.card_registry import card_registry
+from src.payments.client import upay_client
+from src.payments.utils import card_hash_keys
+
+settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Без ключей отпечатков карт регистрация карт невозможна: приложение не стартует
+    card_hash_keys()
+    await init_redis_pool()
+    await eskiz_client.start()
+    await upay_client.start()
+    try:
+        await role_registry.load()
+    except Exception as e:
+        # Справочник будет загружен при первом обращении
+        logger.error("Не удалось загрузить справочник ролей при старте: %s", e)
+    try:
+        await card_registry.load()
+    except Exception as e:
+        # Черный список будет загружен при первой проверке, дубликаты проверяются по таблице
+        logger.error("Не удалось загрузить реестр карт при старте: %s", e)
+    background_tasks = [asyncio.create_task(role_registry.listen()), asyncio.create_task(card_registry.listen())]
+    if settings.SMS_WORKER_ENABLED:
+        background_tasks.append(asyncio.create_task(SmsOutboxWorker().run()))
+    if settings.BALANCE_REFRESH_ENABLED:
+        background_tasks.append(asyncio.create_task(balance_refresher.run()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await eskiz_client.close()
+    await upay_client.close()
+    await close_redis_pool()
+    shutdown_password_executor()
+
 
 app = FastAPI(
     title="Weel Users Microservice",
@@ -18,18 +64,13 @@ app = FastAPI(
     version="0.0.1",
     docs_url='/',
     redoc_url=None,
+    lifespan=lifespan,
     # openapi_url=None
 )
 
 # Регистрация эндпоинтов
 app.include_router(routes, prefix="/api/v1")
 
-# Добавляем состояние лимитера к приложению
-app.state.limiter = limiter
-
-# Добавляем обработчик исключений для RateLimitExceeded
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
 # Добавление СORS
 app.add_middleware(
     CORSMiddleware,
@@ -42,11 +83,6 @@ app.add_middleware(
 add_pagination(app)
 
 
-@app.on_event("startup")
-async def startup_event():
-    await get_redis_connection()
-
-
 @app.middleware("http")
 async def log_ip(request: Request, call_next):
     ip = get_client_ip(request)
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import socket
+
+from config.circuit_breaker import OPEN
+from config.database import get_redis_client
+from config.settings import get_settings
+from logs.logger import logger
+from .sms import send_sms, eskiz_client, eskiz_tokens
+
+settings = get_settings()
+
+# Очередь исходящих SMS на Redis Stream. Эндпоинты только добавляют сообщение,
+# отправкой в Eskiz занимается воркер: он забирает сообщения пачками через группу потребителей,
+# ограничивает параллельность и частоту отправки и повторяет неудачные отправки.
+SMS_STREAM = "sms:outbox"
+SMS_DEAD_LETTER_STREAM = "sms:outbox:dead"
+SMS_GROUP = "sms-senders"
+SMS_STREAM_MAXLEN = 100000
+# Сообщения упавшего воркера забираются другим воркером после этого простоя
+SMS_CLAIM_IDLE_MS = 60000
+
+
+async def enqueue_sms(phone_number: str, message: str) -> str:
+    redis = get_redis_client()
+    message_id = await redis.xadd(SMS_STREAM, {"phone_number": phone_number, "message": message},
+                                  maxlen=SMS_STREAM_MAXLEN, approximate=True)
+    logger.info(f"SMS для {phone_number} поставлено в очередь: {message_id}")
+    return message_id
+
+
+class SmsOutboxWorker:
+    def __init__(self):
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.semaphore = asyncio.Semaphore(settings.SMS_CONCURRENCY)
+        # Интервал между отправками воркера, чтобы не превышать лимит Eskiz
+        self.min_interval = 1 / settings.SMS_RATE_PER_SECOND
+        self.rate_lock = asyncio.Lock()
+        self.last_sent_at = 0.0
+
+    async def ensure_group(self):
+        redis = get_redis_client()
+        try:
+            await redis.xgroup_create(SMS_STREAM, SMS_GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def wait_rate_limit(self):
+        loop = asyncio.get_running_loop()
+        async with self.rate_lock:
+            delay = self.last_sent_at + self.min_interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.last_sent_at = loop.time()
+
+    async def send(self, fields: dict) -> bool:
+        for attempt in range(1, settings.SMS_MAX_RETRIES + 1):
+            async with self.semaphore:
+                await self.wait_rate_limit()
+                try:
+                    token = await eskiz_tokens.get_token()
+                    response = await send_sms(fields["phone_number"], fields["message"], token)
+                    if not response.get("error"):
+                        return True
+                    if response.get("status") == 401:
+                        # Токен отозван раньше срока, следующая попытка получит новый
+                        await eskiz_tokens.invalidate()
+                    logger.error(f"Eskiz отклонил SMS для {fields['phone_number']}: {response.get('details')}")
+                except Exception as e:
+                    logger.error(f"Ошибка при отправке SMS для {fields['phone_number']}: {e}")
+            if attempt < settings.SMS_MAX_RETRIES:
+                # Экспоненциальная задержка между повторами: 1, 2, 4 ... сек
+                await asyncio.sleep(2 ** (attempt - 1))
+        return False
+
+    async def process(self, message_id: str, fields: dict):
+        redis = get_redis_client()
+        if not await self.send(fields):
+            logger.error(f"SMS {message_id} для {fields.get('phone_number')} не отправлено, перенесено в {SMS_DEAD_LETTER_STREAM}")
+            await redis.xadd(SMS_DEAD_LETTER_STREAM, fields, maxlen=SMS_STREAM_MAXLEN, approximate=True)
+        await redis.xack(SMS_STREAM, SMS_GROUP, message_id)
+        await redis.xdel(SMS_STREAM, message_id)
+
+    async def wait_for_provider(self):
+        # Пока предохранитель Eskiz разомкнут, сообщения остаются в стриме, а не уходят в dead letter
+        breaker = eskiz_client.breaker
+        while breaker.current_state() == OPEN:
+            logger.error(f"Eskiz недоступен, воркер очереди SMS ждет {breaker.retry_after():.0f} сек")
+            await asyncio.sleep(max(breaker.retry_after(), 1))
+
+    async def read_batch(self) -> list:
+        redis = get_redis_client()
+        # Сначала забираем зависшие сообщения остановившихся воркеров
+        claimed = (await redis.xautoclaim(SMS_STREAM, SMS_GROUP, self.consumer,
+                                          min_idle_time=SMS_CLAIM_IDLE_MS, count=settings.SMS_BATCH_SIZE))[1]
+        # Redis 6.2 возвращает удаленные из стрима сообщения без полей
+        claimed = [(message_id, fields) for message_id, fields in claimed if fields]
+        if claimed:
+            return claimed
+
+        response = await redis.xreadgroup(SMS_GROUP, self.consumer, {SMS_STREAM: ">"},
+                                          count=settings.SMS_BATCH_SIZE, block=2000)
+        return response[0][1] if response else []
+
+    async def run(self):
+        logger.info(f"Воркер очереди SMS {self.consumer} запущен")
+        while True:
+            try:
+                await self.ensure_group()
+                while True:
+                    await self.wait_for_provider()
+                    batch = await self.read_batch()
+                    await asyncio.gather(*(self.process(message_id, fields) for message_id, fields in batch))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка воркера очереди SMS: {e}")
+                await asyncio.sleep(5)
+
+
+async def get_sms_outbox_stats() -> dict:
+    redis = get_redis_client()
+    pending = await redis.xpending(SMS_STREAM, SMS_GROUP)
+    return {
+        "queued": await redis.xlen(SMS_STREAM),
+        "pending": pending["pending"],
+        "dead_letters": await redis.xlen(SMS_DEAD_LETTER_STREAM),
+    }
+
+
+if __name__ == "__main__":
+    # Отдельный процесс воркера: python -m src.authorization.outbox
+    asyncio.run(SmsOutboxWorker().run())
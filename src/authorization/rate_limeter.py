@@ -1,5 +1,92 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+import uuid
 
-# Создаем ограничитель скорости и Limiter, используя IP-адрес в качестве ключа.
-limiter = Limiter(key_func=get_remote_address)
+from typing import Callable
+
+from fastapi import Depends, Form, HTTPException, Request, status
+
+from config.database import get_redis_client
+from logs.logger import logger
+from logs.utils import get_client_ip
+from src.authorization.utils import check_phone
+
+RATE_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Скользящее окно (sliding window log) на сортированном множестве:
+# удаляем отметки старше окна, и если их меньше лимита - добавляем текущую.
+# Время берется у Redis, поэтому окно одинаковое для всех воркеров.
+# Возвращает {разрешено (1/0), оставшиеся запросы, через сколько мс повторить}
+SLIDING_WINDOW_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now_ms - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count < limit then
+    redis.call('ZADD', KEYS[1], now_ms, now_ms .. ':' .. ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return {1, limit - count - 1, 0}
+end
+
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {0, 0, tonumber(oldest[2]) + window - now_ms}
+"""
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """'2/minute' -> (2, 60000 мс)"""
+    limit, period = rate.split("/")
+    return int(limit), RATE_PERIODS[period.strip()] * 1000
+
+
+class SlidingWindowRateLimiter:
+    """
+    Распределенный ограничитель частоты запросов на общем пуле Redis.
+    Один вызов Lua-скрипта на проверку, лимит общий для всех воркеров.
+    """
+
+    def __init__(self, prefix: str = "ratelimit"):
+        self.prefix = prefix
+        self.script = None
+
+    async def hit(self, key: str, limit: int, window_ms: int) -> tuple[bool, int, int]:
+        """Учитывает запрос, возвращает (разрешено, осталось запросов, повторить через мс)"""
+        redis = get_redis_client()
+        if self.script is None:
+            self.script = redis.register_script(SLIDING_WINDOW_SCRIPT)
+        allowed, remaining, retry_after_ms = await self.script(
+            keys=[f"{self.prefix}:{key}"], args=[window_ms, limit, uuid.uuid4().hex], client=redis)
+        return bool(allowed), remaining, retry_after_ms
+
+    def limit(self, rate: str, key_func: Callable, scope: str) -> Callable:
+        """Зависимость FastAPI, отвечающая 429 при превышении лимита rate для ключа key_func"""
+        limit, window_ms = parse_rate(rate)
+
+        async def dependency(key: str = Depends(key_func)):
+            try:
+                allowed, _, retry_after_ms = await self.hit(f"{scope}:{key}", limit, window_ms)
+            except Exception as e:
+                # Без Redis лимит не проверить, запрос пропускается
+                logger.error("Ошибка ограничителя запросов %s: %s", scope, e)
+                return
+            if not allowed:
+                logger.error("Превышен лимит %s для %s: %s", rate, scope, key)
+                raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                    detail="Too many requests",
+                                    headers={"Retry-After": str(max(1, -(-retry_after_ms // 1000)))})
+
+        return dependency
+
+
+def client_ip_key(request: Request) -> str:
+    return get_client_ip(request)
+
+
+async def phone_number_key(phone_number: str = Form(...)) -> str:
+    # Та же нормализация, что и в sign_up: разные записи одного номера делят один лимит,
+    # а номер в неверном формате отклоняется с 400 до обращения к Redis
+    return await check_phone(phone_number)
+
+
+limiter = SlidingWindowRateLimiter()
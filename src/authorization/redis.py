@@ -1,95 +1,89 @@
-from config.database import get_redis_connection, close_redis_connection
+from config.database import get_redis_client
 from logs.logger import logger
 
+OTP_TTL = 180  # Код действует 3 минуты
+MAX_VERIFY_ATTEMPTS = 4
+BLOCK_TTL = 300  # Блокировка на 5 минут
+
+
+def otp_key(phone_number: str) -> str:
+    # Хеш {code, attempts} на номер: код из 4 цифр не уникален среди ожидающих регистраций,
+    # поэтому ключом служит только номер телефона
+    return f"otp:{phone_number}"
+
+
+def block_key(phone_number: str) -> str:
+    return f"block:{phone_number}"
+
+
+# Проверка кода, учет попыток, блокировка и очистка состояния за один round-trip.
+# Скрипт выполняется в Redis атомарно, поэтому параллельные проверки одного номера
+# не могут обойти лимит попыток.
+# Возвращает {статус, оставшиеся попытки}:
+# expired - код не найден, blocked - номер заблокирован, invalid - неверный код, ok - код подтвержден
+VERIFY_CODE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return {'blocked', 0}
+end
+
+local code = redis.call('HGET', KEYS[1], 'code')
+if not code then
+    return {'expired', 0}
+end
+
+if code ~= ARGV[1] then
+    local attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+    local remaining = tonumber(ARGV[2]) - attempts
+    if remaining > 0 then
+        return {'invalid', remaining}
+    end
+    redis.call('DEL', KEYS[1])
+    redis.call('SET', KEYS[2], 'blocked', 'EX', tonumber(ARGV[3]))
+    return {'blocked', 0}
+end
+
+redis.call('DEL', KEYS[1])
+return {'ok', 0}
+"""
+
+verify_code_script = None
+
 
 async def save_verification_code(phone_number: str, code: str):
-    redis = None
     try:
-        redis = await get_redis_connection()
-        await redis.set(f"verification_code:{code}", phone_number, ex=180)
-        await redis.set(f"phone_number:{phone_number}", code, ex=180)
+        redis = get_redis_client()
+        # Код и счетчик попыток записываются одним MULTI/EXEC, новый код сбрасывает попытки
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(otp_key(phone_number), mapping={"code": code, "attempts": 0})
+            pipe.expire(otp_key(phone_number), OTP_TTL)
+            await pipe.execute()
         logger.success(f"Код подтверждения успешно сохранен для {phone_number}")
     except Exception as e:
         logger.error(f"Произошла ошибка при сохранений кода подтверждения: {e}")
-    finally:
-        await close_redis_connection(redis)
-
-
-async def get_phone_number(code: str):
-    redis = None
-    try:
-        redis = await get_redis_connection()
-        phone_number = await redis.get(f"verification_code:{code}")
-        if phone_number:
-            logger.info(f"Номер телефона, полученный по коду {code}.")
-        else:
-            logger.error(f"Не найден номер телефона для кода {code}.")
-        return phone_number
-    finally:
-        await close_redis_connection(redis)
-
-
-async def get_verification_code(phone_number: str):
-    redis = None
-    try:
-        redis = await get_redis_connection()
-        code = await redis.get(f"phone_number:{phone_number}")
-        if code:
-            logger.info(f"Код подтверждения получен для {phone_number}.")
-        else:
-            logger.error(f"Не найден код подтверждения для {phone_number}.")
-        return code
-    finally:
-        await close_redis_connection(redis)
-
-
-async def increment_attempt(phone_number: str):
-    redis = None
-    try:
-        redis = await get_redis_connection()
-        attempts_key = f"attempts:{phone_number}"
-        attempts = await redis.incr(attempts_key)
-        await redis.expire(attempts_key, 300)  # Счетчик сбрасывается через 5 минут
-        logger.info(f"Количество попыток для {phone_number}. Текущая попытка: {attempts}.")
-        return attempts
-    finally:
-        await close_redis_connection(redis)
-
-
-async def block_user(phone_number: str):
-    redis = None
-    try:
-        redis = await get_redis_connection()
-        block_key = f"block:{phone_number}"
-        await redis.set(block_key, "blocked", ex=300)  # Блокировка на 5 минут
-        logger.info(f"Пользователь: {phone_number} был заблокирован на 5 минут")
-    finally:
-        await close_redis_connection(redis)
 
 
 # Проверка заблокирован ли пользователь
 async def is_user_blocked(phone_number: str):
-    redis = None
-    try:
-        redis = await get_redis_connection()
-        block_key = f"block:{phone_number}"
-        blocked = await redis.exists(block_key)
-        if blocked:
-            logger.info(f"Пользователь: {phone_number} временно заблокирован.")
-        else:
-            logger.info(f"Пользователь: {phone_number} не заблокирован.")
-        return blocked
-    finally:
-        await close_redis_connection(redis)
-
-
-# Сброс попыток
-async def reset_attempts(phone_number: str):
-    redis = None
-    try:
-        redis = await get_redis_connection()
-        key = f"{phone_number}_attempts"
-        await redis.delete(key)
-        logger.info(f"Счетчик попыток для {phone_number} был сброшен")
-    finally:
-        await close_redis_connection(redis)
+    redis = get_redis_client()
+    blocked = await redis.exists(block_key(phone_number))
+    if blocked:
+        logger.info(f"Пользователь: {phone_number} временно заблокирован.")
+    else:
+        logger.info(f"Пользователь: {phone_number} не заблокирован.")
+    return blocked
+
+
+async def check_verification_code(phone_number: str, code: str) -> tuple[str, int]:
+    """Проверяет код подтверждения номера, возвращает (статус, оставшиеся попытки)"""
+    global verify_code_script
+    redis = get_redis_client()
+    if verify_code_script is None:
+        # Script сам вызывает EVALSHA и загружает скрипт при NOSCRIPT
+        verify_code_script = redis.register_script(VERIFY_CODE_SCRIPT)
+
+    result, remaining = await verify_code_script(
+        keys=[otp_key(phone_number), block_key(phone_number)],
+        args=[code, MAX_VERIFY_ATTEMPTS, BLOCK_TTL],
+        client=redis)
+    logger.info(f"Результат проверки кода для {phone_number}: {result}")
+    return result, remaining
@@ -1,8 +1,6 @@
 import jwt
 
-from fastapi import APIRouter, HTTPException, Depends, Request, status, Form
-
-from slowapi.errors import RateLimitExceeded
+from fastapi import APIRouter, HTTPException, Depends, status, Form
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -11,10 +9,12 @@ from config.settings import get_settings
 from config.security import create_access_token, create_refresh_token
 from config.database import get_db
 from logs.logger import logger
-from src.users.models import User, Role
-from .redis import get_verification_code, save_verification_code, increment_attempt, reset_attempts, block_user, \
-    get_phone_number
-from .sms import send_sms, get_eskiz_token, generate_verification_code
+from src.users.models import User
+from src.users.roles import role_registry
+from .redis import save_verification_code, check_verification_code
+from .outbox import enqueue_sms
+from .rate_limeter import limiter, client_ip_key, phone_number_key
+from .sms import generate_verification_code
 from .utils import check_phone
 
 router_auth = APIRouter(
@@ -25,73 +25,63 @@ router_auth = APIRouter(
 settings = get_settings()
 
 
-# TODO: integrate celery with sending sms
-@router_auth.post("/sign_up", status_code=status.HTTP_200_OK)
-async def sign_up(request: Request,
-                  phone_number: str = Form(...),
+@router_auth.post("/sign_up", status_code=status.HTTP_200_OK,
+                  dependencies=[Depends(limiter.limit(settings.SMS_RATE_LIMIT_PER_IP, client_ip_key, "sms_ip")),
+                                Depends(limiter.limit(settings.SMS_RATE_LIMIT_PER_PHONE, phone_number_key, "sms_phone"))])
+async def sign_up(phone_number: str = Form(...),
                   db: AsyncSession = Depends(get_db)):
     logger.info("Попытка регистрации с телефон номером: %s", phone_number)
-    try:
-        valid_phone_number = await check_phone(phone_number)
+    valid_phone_number = await check_phone(phone_number)
 
-        existing_user = await db.scalar(
-            select(User)
-            .where(User.phone_number == valid_phone_number)
-        )
+    existing_user = await db.scalar(
+        select(User)
+        .where(User.phone_number == valid_phone_number)
+    )
 
-        if existing_user:
-            logger.error("Пользователь с телефон номер: %s уже существует", valid_phone_number)
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                                detail="User with this phone number already exist")
+    if existing_user:
+        logger.error("Пользователь с телефон номер: %s уже существует", valid_phone_number)
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="User with this phone number already exist")
 
-        verification_code = generate_verification_code()
-        await save_verification_code(valid_phone_number, verification_code)
+    verification_code = generate_verification_code()
+    await save_verification_code(valid_phone_number, verification_code)
 
-        token = await get_eskiz_token(settings.ESKIZ_EMAIL, settings.ESKIZ_PASSWORD)
-        response = await send_sms(request, valid_phone_number,
-                                  f"Код верификации для входа в приложение WEEL: {verification_code}",
-                                  token)
-        if response.get("error"):
-            logger.error("Ошибка при отправке SMS на телефон номер: %s", valid_phone_number)
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                detail=f"Ошибка при отправке SMS на номер: {valid_phone_number}")
+    # Отправку в Eskiz выполняет воркер очереди SMS
+    try:
+        await enqueue_sms(valid_phone_number, f"Код верификации для входа в приложение WEEL: {verification_code}")
+    except Exception as e:
+        logger.error("Не удалось поставить SMS в очередь для телефон номера: %s, %s", valid_phone_number, e)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=f"Ошибка при отправке SMS на номер: {valid_phone_number}")
 
-        logger.success("СМС код успешно отправлен на телефон номер: %s", valid_phone_number)
-        return {"detail": f"СМС код успешно отправлен на телефон номер: {valid_phone_number}"}
-    except RateLimitExceeded:
-        logger.error("Слишком много запросов")
-        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many requests")
+    logger.success("СМС код поставлен в очередь на телефон номер: %s", valid_phone_number)
+    return {"detail": f"СМС код успешно отправлен на телефон номер: {valid_phone_number}"}
 
 
 @router_auth.post("/sign_up/verify", status_code=status.HTTP_201_CREATED)
-async def verify_code(code: str = Form(...),
+async def verify_code(phone_number: str = Form(...),
+                      code: str = Form(...),
                       db: AsyncSession = Depends(get_db)):
-    phone_number = await get_phone_number(code)
+    phone_number = await check_phone(phone_number)
+    result, remaining_attempts = await check_verification_code(phone_number, code)
 
-    if not phone_number:
+    if result == "expired":
         logger.error("Код верификации недействителен или истёк")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Код верификации истёк")
 
-    logger.info("Проверка кода верификации для телефон номера: %s", phone_number)
-
-    redis_code = await get_verification_code(phone_number)
-    if redis_code is None or redis_code != code:
-        attempts = await increment_attempt(phone_number)
-        remaining_attempts = 4 - attempts
-        if remaining_attempts > 0:
-            logger.error("Неверный код, попыток осталось: %s", remaining_attempts)
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                detail=f"Неверный код, у вас осталось {remaining_attempts} {'попытка' if remaining_attempts == 1 else 'попытки'}")
-        else:
-            await block_user(phone_number)
-            logger.error("Пользователь заблокирован из-за многократных неудачных попыток")
-            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                                detail="Вы были временно заблокированы. Пожалуйста, попробуйте еще раз позже.")
-    else:
-        # Сброс попыток после успешной верификации
-        await reset_attempts(phone_number)
-
-    role = await db.scalar(select(Role).where(Role.title == "user"))
+    if result == "invalid":
+        logger.error("Неверный код, попыток осталось: %s", remaining_attempts)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Неверный код, у вас осталось {remaining_attempts} {'попытка' if remaining_attempts == 1 else 'попытки'}")
+
+    if result == "blocked":
+        logger.error("Пользователь заблокирован из-за многократных неудачных попыток")
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                            detail="Вы были временно заблокированы. Пожалуйста, попробуйте еще раз позже.")
+
+    logger.info("Код верификации подтвержден для телефон номера: %s", phone_number)
+
+    role = await role_registry.get("user")
     if role is None:
         logger.error("Роль: user не найдена")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Role not found")
@@ -115,8 +105,7 @@ async def verify_code(code: str = Form(...),
 
 
 @router_auth.post("/users/token/refresh", status_code=status.HTTP_201_CREATED)
-async def refresh_token(refresh_token: str = Form(...),
-                        db: AsyncSession = Depends(get_db)):
+async def refresh_token(refresh_token: str = Form(...)):
     logger.info("Попытка создания refresh token")
     try:
         payload = jwt.decode(refresh_token, settings.JWT_SECRET, algorithms=settings.JWT_ALGORITHM)
@@ -131,7 +120,10 @@ async def refresh_token(refresh_token: str = Form(...),
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Token invalid")
 
-    role = await db.scalar(select(Role).where(Role.title == "user"))
+    role = await role_registry.get("user")
+    if role is None:
+        logger.error("Роль: user не найдена")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Role not found")
     access_token = create_access_token(data={"user_uuid": user_uuid, "role": role.title})
 
     logger.success("Токен успешно обновлён для пользователя с UUID: %s", user_uuid)
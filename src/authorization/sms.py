@@ -1,74 +1,226 @@
-from fastapi import Request, HTTPException, status
+import asyncio
+import time
+
+from fastapi import HTTPException, status
 
 from random import randint
-from aiohttp import ClientSession
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
 
-from config.database import close_redis_connection
+from config.circuit_breaker import Bulkhead, CircuitBreaker
+from config.database import get_redis_client
+from config.settings import get_settings
 from logs.logger import logger
-from src.authorization.rate_limeter import limiter
-from src.authorization.redis import get_redis_connection
+
+settings = get_settings()
+
+
+class EskizClient:
+    """
+    HTTP-клиент Eskiz с общим пулом keep-alive соединений.
+    Сессия создается один раз на процесс (в lifespan или при первом запросе),
+    поэтому TLS-рукопожатие и DNS-запрос не повторяются для каждого SMS.
+    При сбоях Eskiz предохранитель отклоняет запросы сразу (CircuitOpenError).
+    """
+
+    def __init__(self, base_url: str = None, max_connections: int = None):
+        self.base_url = (base_url or settings.ESKIZ_BASE_URL).rstrip("/")
+        self.max_connections = max_connections or settings.ESKIZ_MAX_CONNECTIONS
+        self.session: ClientSession | None = None
+        # Ограничение одновременных запросов к Eskiz на процесс
+        self.bulkhead = Bulkhead("eskiz", self.max_connections)
+        self.breaker = CircuitBreaker("eskiz", is_failure=lambda result: result[0] >= 500)
+
+    async def start(self):
+        if self.session is None or self.session.closed:
+            connector = TCPConnector(limit=self.max_connections,
+                                     ttl_dns_cache=300,
+                                     keepalive_timeout=30)
+            timeout = ClientTimeout(total=settings.ESKIZ_TIMEOUT, connect=settings.ESKIZ_CONNECT_TIMEOUT)
+            self.session = ClientSession(connector=connector, timeout=timeout)
+            logger.info("HTTP-клиент Eskiz запущен: %s", self.base_url)
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+            logger.info("HTTP-клиент Eskiz остановлен")
+        self.session = None
+
+    async def request(self, path: str, **kwargs) -> tuple[int, dict]:
+        async with self.bulkhead:
+            async with self.session.post(f"{self.base_url}{path}", **kwargs) as response:
+                return response.status, await response.json(content_type=None)
+
+    async def post(self, path: str, **kwargs) -> tuple[int, dict]:
+        await self.start()
+        return await self.breaker.call(self.request, path, **kwargs)
+
+    async def login(self, email: str, password: str) -> str:
+        response_status, response_data = await self.post("/auth/login", data={"email": email, "password": password})
+        if response_status == 200 and "data" in response_data:
+            return response_data["data"]["token"]
+
+        logger.error("Не удалось пройти аутентификацию в API Eskiz")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Не удалось пройти аутентификацию в API Eskiz")
+
+    async def send_sms(self, phone_number: str, message: str, token: str) -> dict:
+        headers = {"Authorization": f"Bearer {token}"}
+        payload = {
+            "mobile_phone": phone_number,
+            "message": message,
+            "from": "4546"
+        }
+        response_status, response_data = await self.post("/message/sms/send", json=payload, headers=headers)
+        if response_status == 200:
+            logger.info(f"SMS успешно был отправлен на {phone_number}")
+            return response_data
+
+        error_details = response_data.get("detail", "Failed to send SMS")
+        logger.error(f"Ошибка при отправке смс: {error_details}")
+        return {
+            "error": True,
+            "status": response_status,
+            "details": error_details
+        }
+
+
+eskiz_client = EskizClient()
+
+ESKIZ_TOKEN_KEY = "eskiz_token"
+ESKIZ_TOKEN_LOCK_KEY = "eskiz_token:lock"
+ESKIZ_LOCK_TIMEOUT = 15  # больше таймаута запроса логина
 
 
 def generate_verification_code():
     code = randint(1000, 9999)
-    logger.success(f"Код для подтверждения сгенерирован успешно")
+    logger.success("Код для подтверждения сгенерирован успешно")
     return code
 
 
-async def get_eskiz_token(email: str, password: str):
-    redis = await get_redis_connection()
-    token = await redis.get("eskiz_token")
-    if token:
-        logger.info("Найдите токен Eskiz в Redis")
+class EskizTokenProvider:
+    """
+    Токен Eskiz с кешем в памяти процесса и общим кешем в Redis.
+    Обновление single-flight: внутри процесса одно обновление на всех ожидающих,
+    между воркерами - блокировка в Redis, логинится ровно один воркер.
+    За ESKIZ_TOKEN_REFRESH_MARGIN до истечения токен обновляется в фоне,
+    а запросы продолжают использовать текущий.
+    """
+
+    def __init__(self, client: EskizClient):
+        self.client = client
+        self.token: str | None = None
+        self.expires_at = 0.0
+        self.refresh_task: asyncio.Task | None = None
+
+    def is_valid(self, margin: float = 0) -> bool:
+        return self.token is not None and time.time() < self.expires_at - margin
+
+    async def get_token(self) -> str:
+        if self.is_valid(settings.ESKIZ_TOKEN_REFRESH_MARGIN):
+            return self.token
+
+        refresh = self.start_refresh()
+        if self.is_valid():
+            # Токен скоро истечет, но еще действует: обновление идет в фоне
+            return self.token
+        return await asyncio.shield(refresh)
+
+    def start_refresh(self) -> asyncio.Task:
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self.refresh())
+            self.refresh_task.add_done_callback(self.log_refresh_failure)
+        return self.refresh_task
+
+    @staticmethod
+    def log_refresh_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Не удалось обновить токен Eskiz: {task.exception()}")
+
+    async def invalidate(self):
+        """Сбрасывает токен, отклоненный Eskiz"""
+        self.token, self.expires_at = None, 0.0
+        try:
+            await get_redis_client().delete(ESKIZ_TOKEN_KEY)
+        except Exception as e:
+            logger.error(f"Не удалось удалить токен Eskiz из Redis: {e}")
+
+    def remember(self, token: str, ttl: float) -> str:
+        self.token, self.expires_at = token, time.time() + ttl
         return token
 
-    url = "https://notify.eskiz.uz/api/auth/login"
-    payload = {
-        "email": email,
-        "password": password
-    }
-    try:
-        async with ClientSession() as session:
-            async with session.post(url, data=payload) as response:
-                response_data = await response.json()
-                if response.status == 200 and "data" in response_data:
-                    token = response_data["data"]["token"]
-                    await redis.set("eskiz_token", token, ex=3600)
-                    logger.info("Новый токен Eskiz получен и сохранён в Redis")
-                else:
-                    logger.error("Не удалось пройти аутентификацию в API Eskiz")
-                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                        detail="Не удалось пройти аутентификацию в API Eskiz")
-    finally:
-        await close_redis_connection(redis)
-    return token
-
-
-@limiter.limit("2/minute")
-async def send_sms(request: Request, phone_number: str, message: str, token: str):
-    url = "https://notify.eskiz.uz/api/message/sms/send"
-
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "mobile_phone": phone_number,
-        "message": message,
-        "from": "4546"
-    }
-
-    async with ClientSession() as session:
-        async with session.post(url, json=payload, headers=headers) as response:
-            response_data = await response.json()
-            if response.status == 200:
-                logger.info(f"SMS успешно был отправлен на {phone_number}")
-                return response_data
-
-            else:
-                error_details = response_data.get("detail", "Failed to send SMS")
-                logger.error(f"Ошибка при отправке смс: {error_details}")
-                return {
-                    "error": True,
-                    "details": error_details
-                }
+    async def read_shared(self) -> str | None:
+        redis = get_redis_client()
+        async with redis.pipeline(transaction=False) as pipe:
+            token, ttl = await pipe.get(ESKIZ_TOKEN_KEY).ttl(ESKIZ_TOKEN_KEY).execute()
+        if token and ttl > settings.ESKIZ_TOKEN_REFRESH_MARGIN:
+            return self.remember(token, ttl)
+        return None
+
+    async def login(self) -> str:
+        token = await self.client.login(settings.ESKIZ_EMAIL, settings.ESKIZ_PASSWORD)
+        logger.info("Новый токен Eskiz получен")
+        return self.remember(token, settings.ESKIZ_TOKEN_TTL)
+
+    async def refresh(self) -> str:
+        try:
+            token = await self.read_shared()
+            if token:
+                return token
+
+            redis = get_redis_client()
+            lock = redis.lock(ESKIZ_TOKEN_LOCK_KEY, timeout=ESKIZ_LOCK_TIMEOUT, blocking=False)
+            acquired = await lock.acquire()
+        except Exception as e:
+            # Redis недоступен: логинимся без общего кеша
+            logger.error(f"Ошибка при обновлении токена Eskiz через Redis: {e}")
+            return await self.login()
+
+        if acquired:
+            return await self.login_shared(redis, lock)
+
+        # Токен обновляет другой воркер: ждем его результат
+        deadline = time.time() + ESKIZ_LOCK_TIMEOUT
+        while time.time() < deadline:
+            await asyncio.sleep(0.1)
+            try:
+                token = await self.read_shared()
+            except Exception as e:
+                logger.error(f"Ошибка при получении токена Eskiz из Redis: {e}")
+                break
+            if token:
+                return token
+        else:
+            logger.error("Не дождались обновления токена Eskiz другим воркером")
+        return await self.login()
+
+    async def login_shared(self, redis, lock) -> str:
+        """Логин под блокировкой: ошибка самого логина пробрасывается и не вызывает повторный логин"""
+        try:
+            try:
+                # Токен мог обновиться, пока блокировку держал другой воркер
+                token = await self.read_shared()
+            except Exception as e:
+                logger.error(f"Ошибка при получении токена Eskiz из Redis: {e}")
+                token = None
+            if token:
+                return token
+
+            token = await self.login()
+            try:
+                await redis.set(ESKIZ_TOKEN_KEY, token, ex=settings.ESKIZ_TOKEN_TTL)
+                logger.info("Токен Eskiz сохранён в Redis")
+            except Exception as e:
+                logger.error(f"Не удалось сохранить токен Eskiz в Redis: {e}")
+            return token
+        finally:
+            try:
+                await lock.release()
+            except Exception as e:
+                logger.error(f"Не удалось снять блокировку обновления токена Eskiz: {e}")
+
+
+eskiz_tokens = EskizTokenProvider(eskiz_client)
+
+
+async def send_sms(phone_number: str, message: str, token: str):
+    return await eskiz_client.send_sms(phone_number, message, token)
@@ -0,0 +1,113 @@
+import asyncio
+import uuid
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import pytest_asyncio
+import redis.asyncio as redis
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from config.database import create_redis_pool
+from src.authorization.redis import (BLOCK_TTL, MAX_VERIFY_ATTEMPTS, OTP_TTL, block_key, check_verification_code,
+                                     otp_key, save_verification_code)
+
+
+# Фикстура для клиента Redis из настроек приложения
+@pytest_asyncio.fixture
+async def redis_client():
+    """
+    Скрипт проверки кода выполняется внутри Redis, поэтому его логику нельзя проверить моком:
+    тесты идут на Redis из настроек (REDIS_HOST/REDIS_PORT) и пропускаются, если он недоступен.
+    Клиент создается на каждый тест, так как у каждого теста свой event loop.
+    """
+    pool = create_redis_pool()
+    client = redis.Redis(connection_pool=pool)
+    try:
+        await client.ping()
+    except Exception as e:
+        await pool.disconnect()
+        pytest.skip(f"Redis недоступен: {e}")
+    with patch("src.authorization.redis.get_redis_client", return_value=client), \
+            patch("src.authorization.redis.verify_code_script", None):
+        yield client
+    await pool.disconnect()
+
+
+# Фикстура для номера телефона, ключи которого удаляются после теста
+@pytest_asyncio.fixture
+async def phone_number(redis_client):
+    phone_number = f"test-{uuid.uuid4().hex}"
+    yield phone_number
+    await redis_client.delete(otp_key(phone_number), block_key(phone_number))
+
+
+@pytest.mark.asyncio
+async def test_valid_code_is_accepted_once(redis_client, phone_number):
+    await save_verification_code(phone_number, "1234")
+
+    assert await check_verification_code(phone_number, "1234") == ("ok", 0)
+    # Подтвержденный код удаляется и не может быть использован повторно
+    assert await check_verification_code(phone_number, "1234") == ("expired", 0)
+
+
+@pytest.mark.asyncio
+async def test_missing_code_is_expired(redis_client, phone_number):
+    assert await check_verification_code(phone_number, "1234") == ("expired", 0)
+
+
+@pytest.mark.asyncio
+async def test_wrong_codes_block_the_number(redis_client, phone_number):
+    await save_verification_code(phone_number, "1234")
+
+    results = [await check_verification_code(phone_number, "0000") for _ in range(MAX_VERIFY_ATTEMPTS)]
+
+    assert results == [("invalid", remaining) for remaining in range(MAX_VERIFY_ATTEMPTS - 1, 0, -1)] + [("blocked", 0)]
+    assert not await redis_client.exists(otp_key(phone_number))
+    assert 0 < await redis_client.ttl(block_key(phone_number)) <= BLOCK_TTL
+    # Во время блокировки не принимается даже новый верный код
+    await save_verification_code(phone_number, "5678")
+    assert await check_verification_code(phone_number, "5678") == ("blocked", 0)
+
+
+# Параллельные проверки одного номера не могут получить больше попыток, чем MAX_VERIFY_ATTEMPTS
+@pytest.mark.asyncio
+async def test_concurrent_guesses_share_the_attempt_limit(redis_client, phone_number):
+    await save_verification_code(phone_number, "1234")
+
+    results = await asyncio.gather(*(check_verification_code(phone_number, f"{guess:04}")
+                                     for guess in range(MAX_VERIFY_ATTEMPTS * 3)))
+
+    statuses = [status for status, remaining in results]
+    assert statuses.count("invalid") == MAX_VERIFY_ATTEMPTS - 1
+    assert statuses.count("blocked") == len(results) - MAX_VERIFY_ATTEMPTS + 1
+
+
+# Код и счетчик попыток пишутся в один хеш одной транзакцией MULTI/EXEC
+@pytest.mark.asyncio
+async def test_code_is_saved_in_one_transaction():
+    redis_client = MagicMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    redis_client.pipeline.return_value.__aenter__.return_value = pipe
+
+    with patch("src.authorization.redis.get_redis_client", return_value=redis_client):
+        await save_verification_code("909170775", "1234")
+
+    redis_client.pipeline.assert_called_once_with(transaction=True)
+    pipe.hset.assert_called_once_with(otp_key("909170775"), mapping={"code": "1234", "attempts": 0})
+    pipe.expire.assert_called_once_with(otp_key("909170775"), OTP_TTL)
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_new_code_resets_attempts(redis_client, phone_number):
+    await save_verification_code(phone_number, "1234")
+    await check_verification_code(phone_number, "0000")
+    await check_verification_code(phone_number, "0000")
+
+    await save_verification_code(phone_number, "5678")
+
+    assert await redis_client.hgetall(otp_key(phone_number)) == {"code": "5678", "attempts": "0"}
+    assert 0 < await redis_client.ttl(otp_key(phone_number)) <= OTP_TTL
+    assert await check_verification_code(phone_number, "0000") == ("invalid", MAX_VERIFY_ATTEMPTS - 1)
@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from config.settings import get_settings
+from src.authorization.sms import ESKIZ_TOKEN_KEY, EskizTokenProvider
+
+settings = get_settings()
+
+
+# Фикстура для мокированного клиента Redis
+@pytest.fixture
+def mock_redis():
+    """
+    Redis без общего токена: pipeline().get().ttl().execute() возвращает (None, -2),
+    блокировка обновления свободна.
+    """
+    redis = MagicMock()
+    pipe = MagicMock()
+    pipe.get.return_value.ttl.return_value.execute = AsyncMock(return_value=[None, -2])
+    redis.pipeline.return_value.__aenter__.return_value = pipe
+    redis.lock.return_value.acquire = AsyncMock(return_value=True)
+    redis.lock.return_value.release = AsyncMock()
+    redis.set = AsyncMock()
+    with patch("src.authorization.sms.get_redis_client", return_value=redis):
+        yield redis
+
+
+# Фикстура для мокированного шлюза Eskiz
+@pytest.fixture
+def mock_client():
+    """Клиент Eskiz, логин которого занимает 10 мс и возвращает новый токен"""
+    async def login(email, password):
+        await asyncio.sleep(0.01)
+        return "new-token"
+
+    client = MagicMock()
+    client.login = AsyncMock(side_effect=login)
+    return client
+
+
+def shared_token(redis: MagicMock, token: str | None, ttl: int):
+    redis.pipeline.return_value.__aenter__.return_value.get.return_value.ttl.return_value.execute.return_value = \
+        [token, ttl]
+
+
+# Одновременные запросы без токена дожидаются одного логина
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_login(mock_redis, mock_client):
+    provider = EskizTokenProvider(mock_client)
+
+    tokens = await asyncio.gather(*(provider.get_token() for _ in range(20)))
+
+    assert tokens == ["new-token"] * 20
+    mock_client.login.assert_awaited_once()
+    mock_redis.set.assert_awaited_once_with(ESKIZ_TOKEN_KEY, "new-token", ex=settings.ESKIZ_TOKEN_TTL)
+    mock_redis.lock.return_value.release.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_valid_token_is_served_from_memory(mock_redis, mock_client):
+    provider = EskizTokenProvider(mock_client)
+    provider.remember("cached-token", settings.ESKIZ_TOKEN_TTL)
+
+    assert await provider.get_token() == "cached-token"
+    mock_redis.pipeline.assert_not_called()
+    mock_client.login.assert_not_called()
+
+
+# Токен другого воркера из Redis используется без логина
+@pytest.mark.asyncio
+async def test_shared_token_is_reused(mock_redis, mock_client):
+    shared_token(mock_redis, "shared-token", settings.ESKIZ_TOKEN_TTL)
+    provider = EskizTokenProvider(mock_client)
+
+    assert await provider.get_token() == "shared-token"
+    mock_client.login.assert_not_called()
+    mock_redis.lock.assert_not_called()
+
+
+# Токен скоро истечет: запрос получает текущий токен, обновление идет в фоне
+@pytest.mark.asyncio
+async def test_token_near_expiry_is_refreshed_in_background(mock_redis, mock_client):
+    provider = EskizTokenProvider(mock_client)
+    provider.remember("old-token", settings.ESKIZ_TOKEN_REFRESH_MARGIN / 2)
+
+    assert await provider.get_token() == "old-token"
+    assert await provider.refresh_task == "new-token"
+    assert provider.token == "new-token" and provider.expires_at > time.time() + settings.ESKIZ_TOKEN_REFRESH_MARGIN
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_falls_back_to_login(mock_redis, mock_client):
+    mock_redis.pipeline.side_effect = ConnectionError("Redis is down")
+    provider = EskizTokenProvider(mock_client)
+
+    assert await provider.get_token() == "new-token"
+    mock_client.login.assert_awaited_once()
+
+
+# Ошибка логина под блокировкой не приводит к повторному логину, блокировка снимается
+@pytest.mark.asyncio
+async def test_login_failure_releases_lock(mock_redis, mock_client):
+    mock_client.login.side_effect = HTTPException(status_code=400, detail="Не удалось пройти аутентификацию")
+    provider = EskizTokenProvider(mock_client)
+
+    with pytest.raises(HTTPException):
+        await provider.get_token()
+
+    mock_client.login.assert_awaited_once()
+    mock_redis.lock.return_value.release.assert_awaited_once()
+    assert provider.token is None
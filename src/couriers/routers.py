@@ -1,17 +1,19 @@
 import os
 import jwt
 
+from typing import Union
 from uuid import UUID
 
 from fastapi import APIRouter, Form, Depends, HTTPException, Response, status, File, UploadFile
-from fastapi_pagination import Page, paginate
-from sqlalchemy import asc, or_
+from fastapi_pagination import Page
+from sqlalchemy import or_
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from config.settings import get_settings, UPLOAD_DIR
-from config.security import create_access_token, create_refresh_token, is_superuser, is_courier
+from config.security import create_access_token, create_refresh_token, Principal, get_current_principal, \
+    is_superuser_principal, get_db_read
 from config.database import get_db
 from logs.logger import logger
 from src.superusers.utils import validate_password, validate_username
@@ -19,7 +21,10 @@ from src.authorization.utils import check_phone
 from src.couriers.schemas import CourierSchemas, CourierDetailSchemas, CourierUpdate
 from src.media.models import Media
 from src.media.utils import save_image
-from src.users.models import User, Role
+from src.users.models import User
+from src.users.pagination import CursorPage, PaginationParams, paginate_users
+from src.users.redis import get_cached_profile, cache_profile, invalidate_profile
+from src.users.roles import role_registry
 
 settings = get_settings()
 
@@ -35,11 +40,11 @@ async def sign_up(username: str = Form(...),
                   full_name: str = Form(...),
                   phone_number: str = Form(...),
                   image: UploadFile = File(...),
-                  current_user: User = Depends(is_superuser),
+                  current_user: Principal = Depends(is_superuser_principal),
                   db: AsyncSession = Depends(get_db)):
     logger.info("Попытка создания курьера с именем пользователя: %s", username)
 
-    role = await db.scalar(select(Role).where(Role.title == "courier"))
+    role = await role_registry.get("courier")
 
     if role is None:
         logger.error("Роль: courier не найдена")
@@ -87,7 +92,7 @@ async def sign_up(username: str = Form(...),
         phone_number=await check_phone(phone_number),
         image_id=new_media.id,
         role_id=role.id)
-    new_courier.set_password(validate_password(password))
+    await new_courier.set_password(validate_password(password))
 
     db.add(new_courier)
     await db.commit()
@@ -109,10 +114,16 @@ async def sign_in(username: str = Form(...),
         .where(User.roles.has(title="courier"), User.username == username)
     )
 
-    if courier is None or not courier.verify_password(password):
+    if courier is None or not await courier.verify_password(password):
         logger.error("Не верное имя пользователя или пароль")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect username or password")
 
+    if courier.password_needs_rehash():
+        # cost factor изменился, пароль известен только в момент входа
+        await courier.set_password(password)
+        await db.commit()
+        logger.info("Хеш пароля курьера %s обновлен", username)
+
     access_token = create_access_token(
         data={"user_uuid": courier.uuid, "role": courier.roles.title})
     refresh_token = create_refresh_token(
@@ -128,8 +139,7 @@ async def sign_in(username: str = Form(...),
 
 
 @router_couriers.post("/auth/couriers/token/refresh", status_code=status.HTTP_201_CREATED)
-async def refresh_token(refresh_token: str = Form(...),
-                        db: AsyncSession = Depends(get_db)):
+async def refresh_token(refresh_token: str = Form(...)):
     logger.info("Попытка создания refresh token")
 
     try:
@@ -147,7 +157,10 @@ async def refresh_token(refresh_token: str = Form(...),
     except Exception:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Token invalid")
 
-    role = await db.scalar(select(Role).where(Role.title == "courier"))
+    role = await role_registry.get("courier")
+    if role is None:
+        logger.error("Роль: courier не найдена")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Role not found")
 
     access_token = create_access_token(data={"user_uuid": user_uuid, "role": role.title})
     logger.success("Токен успешно обновлён для курьера с UUID: %s", user_uuid)
@@ -155,38 +168,44 @@ async def refresh_token(refresh_token: str = Form(...),
 
 
 # TODO: сделать поиск по имя пользователя
-@router_couriers.get("/couriers/", response_model=Page[CourierSchemas],
+@router_couriers.get("/couriers/",
+                     response_model=Union[Page[CourierSchemas], CursorPage[CourierSchemas]],
                      status_code=status.HTTP_200_OK)
 async def get_couriers(
-        current_user: User = Depends(is_superuser),
-        db: AsyncSession = Depends(get_db)):
+        pagination: PaginationParams = Depends(),
+        current_user: Principal = Depends(is_superuser_principal),
+        db: AsyncSession = Depends(get_db_read)):
     logger.info("Попытка получения всех курьеров")
 
-    stmt = await db.scalars(
+    query = (
         select(User)
         .options(selectinload(User.media),
                  selectinload(User.roles))
         .where(User.roles.has(title="courier"))
-        .order_by(asc(User.uuid))
     )
-    couriers = stmt.all()
+    couriers = await paginate_users(db, query, pagination, CourierSchemas)
 
     logger.success("Все курьеры получены успешно")
-    return paginate(couriers)
+    return couriers
 
 
 @router_couriers.get("/couriers/{user_uuid}", response_model=CourierDetailSchemas,
                      status_code=status.HTTP_200_OK)
 async def get_courier_by_uuid(user_uuid: UUID,
-                              current_user: User = Depends(is_courier),
-                              db: AsyncSession = Depends(get_db)):
+                              current_user: Principal = Depends(get_current_principal),
+                              db: AsyncSession = Depends(get_db_read)):
     logger.info("Попытка получение курьера с UUID: %s", user_uuid)
 
-    if current_user != "superuser" and current_user.uuid != user_uuid:
+    if not current_user.is_superuser and current_user.uuid != user_uuid:
         logger.error("Доступ запрещен: У вас недостаточно прав")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Access denied: You don't have enough privileges")
 
+    cached_courier = await get_cached_profile("courier", user_uuid, CourierDetailSchemas)
+    if cached_courier is not None:
+        logger.success("Курьер с UUID: %s получен из кеша", user_uuid)
+        return cached_courier
+
     courier = await db.scalar(
         select(User)
         .options(
@@ -198,19 +217,22 @@ async def get_courier_by_uuid(user_uuid: UUID,
         logger.error("Курьер c UUID: %s не найден", user_uuid)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Courier not found")
 
+    courier_detail = CourierDetailSchemas.from_orm(courier)
+    await cache_profile("courier", user_uuid, courier_detail)
+
     logger.success("Курьер с UUID: %s получен успешно", user_uuid)
-    return CourierDetailSchemas.from_orm(courier)
+    return courier_detail
 
 
 @router_couriers.put("/couriers/{user_uuid}", response_model=CourierSchemas,
                      status_code=status.HTTP_200_OK)
 async def update_courier(user_uuid: UUID,
                          objects: CourierUpdate,
-                         current_user: User = Depends(is_courier),
+                         current_user: Principal = Depends(get_current_principal),
                          db: AsyncSession = Depends(get_db)):
     logger.info("Попытка обновить курьера с UUID: %s", user_uuid)
 
-    if current_user != "superuser" and current_user.uuid != user_uuid:
+    if not current_user.is_superuser and current_user.uuid != user_uuid:
         logger.error("Доступ запрещен: У вас недостаточно прав")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Access denied: You don't have enough privileges")
@@ -247,6 +269,7 @@ async def update_courier(user_uuid: UUID,
     db.add(courier)
     await db.commit()
     await db.refresh(courier)
+    await invalidate_profile(user_uuid)
 
     logger.success("Курьер c UUID: %s успешно обновлен", user_uuid)
     return CourierSchemas.from_orm(courier)
@@ -254,11 +277,11 @@ async def update_courier(user_uuid: UUID,
 
 @router_couriers.delete("/couriers/{user_uuid}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_courier(user_uuid: UUID,
-                         current_user: User = Depends(is_superuser),
+                         current_user: Principal = Depends(is_superuser_principal),
                          db: AsyncSession = Depends(get_db)):
     logger.info("Попытка удаления курьера с UUID: %s", user_uuid)
 
-    if current_user != "superuser" and current_user.uuid != user_uuid:
+    if not current_user.is_superuser and current_user.uuid != user_uuid:
         logger.error("Доступ запрещен: У вас недостаточно прав")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Access denied: You don't have enough privileges")
@@ -289,6 +312,7 @@ async def delete_courier(user_uuid: UUID,
 
         await db.delete(courier)
         await db.commit()
+        await invalidate_profile(user_uuid)
         logger.success("Курьер c UUID: успешно удален", user_uuid)
     except Exception as e:
         logger.error("Ошибка: %s при удалении курьера с UUID: %s", user_uuid, str(e))
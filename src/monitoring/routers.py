@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from config.circuit_breaker import get_provider_stats
+from config.database import get_redis_pool_stats, get_db_pool_stats
+from config.security import Principal, is_superuser_principal
+from logs.logger import logger
+from src.authorization.outbox import get_sms_outbox_stats
+from src.payments.balances import balance_refresher
+from src.users.redis import get_profile_cache_stats
+
+router_monitoring = APIRouter(
+    prefix="/metrics",
+    tags=["monitoring"],
+)
+
+
+@router_monitoring.get("/db", status_code=status.HTTP_200_OK)
+async def get_db_metrics(current_user: Principal = Depends(is_superuser_principal)):
+    logger.info("Попытка получения метрик пула БД")
+    return {"pool": get_db_pool_stats()}
+
+
+@router_monitoring.get("/redis", status_code=status.HTTP_200_OK)
+async def get_redis_metrics(current_user: Principal = Depends(is_superuser_principal)):
+    logger.info("Попытка получения метрик пула Redis")
+    return {"pool": get_redis_pool_stats()}
+
+
+@router_monitoring.get("/cache", status_code=status.HTTP_200_OK)
+async def get_cache_metrics(current_user: Principal = Depends(is_superuser_principal)):
+    logger.info("Попытка получения метрик кеша профилей и балансов карт")
+    return {"profiles": get_profile_cache_stats(), "card_balances": balance_refresher.stats}
+
+
+@router_monitoring.get("/sms", status_code=status.HTTP_200_OK)
+async def get_sms_metrics(current_user: Principal = Depends(is_superuser_principal)):
+    logger.info("Попытка получения метрик очереди SMS")
+    try:
+        return {"outbox": await get_sms_outbox_stats()}
+    except Exception as e:
+        logger.error("Не удалось получить метрики очереди SMS: %s", e)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="SMS outbox unavailable")
+
+
+@router_monitoring.get("/providers", status_code=status.HTTP_200_OK)
+async def get_provider_metrics(current_user: Principal = Depends(is_superuser_principal)):
+    logger.info("Попытка получения состояния внешних провайдеров")
+    return {"providers": get_provider_stats()}
@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+from config.database import get_redis_client
+from config.settings import get_settings
+from logs.logger import logger
+from src.payments.redis import ACTIVE_CARDS_KEY, PaymentSession
+from src.payments.requests import get_all_cards
+from src.payments.response_parser import parse_upay_response
+
+settings = get_settings()
+
+BALANCE_REFRESH_LOCK_KEY = "payment:balances:lock"
+
+
+async def fetch_cards(uzcard_id: str) -> tuple[dict, str | None]:
+    """Запрашивает список карт в UPAY, возвращает (список карт, баланс первой карты)"""
+    response = await get_all_cards(settings.STPimsApiPartnerKey, uzcard_id, settings.LOGIN, settings.PASSWORD)
+    result = parse_upay_response(response.content)
+    if not result.ok:
+        raise ValueError(result.description)
+    return result.as_dict(), result.balance
+
+
+class BalanceRefresher:
+    """
+    Фоновое обновление кеша списков карт и балансов пользователей, открывавших карты
+    за последние CARD_ACTIVE_WINDOW секунд. Раз в BALANCE_REFRESH_INTERVAL пачками
+    по BALANCE_REFRESH_BATCH запрашивает UPAY (не больше BALANCE_REFRESH_CONCURRENCY запросов сразу),
+    карты, обновленные в текущем периоде, пропускаются.
+    Цикл выполняет один воркер: остальные не получают блокировку в Redis.
+    """
+
+    def __init__(self, batch_size: int = None, concurrency: int = None):
+        self.batch_size = batch_size or settings.BALANCE_REFRESH_BATCH
+        self.semaphore = asyncio.Semaphore(concurrency or settings.BALANCE_REFRESH_CONCURRENCY)
+        self.stats = {"cycles": 0, "refreshed": 0, "failed": 0, "skipped": 0, "last_cycle_seconds": 0.0}
+
+    async def active_users(self) -> list[str]:
+        redis = get_redis_client()
+        active_since = time.time() - settings.CARD_ACTIVE_WINDOW
+        await redis.zremrangebyscore(ACTIVE_CARDS_KEY, "-inf", active_since)
+        return await redis.zrangebyscore(ACTIVE_CARDS_KEY, active_since, "+inf")
+
+    async def refresh_one(self, user_uuid: str, uzcard_id: str):
+        async with self.semaphore:
+            cards, balance = await fetch_cards(uzcard_id)
+        return user_uuid, cards, balance
+
+    async def refresh_batch(self, user_uuids: list[str]):
+        states = await PaymentSession.get_many(user_uuids, ("uzcard_id", "refreshed_at"))
+        fresh_since = time.time() - settings.BALANCE_REFRESH_INTERVAL
+        due = [(user_uuid, state["uzcard_id"]) for user_uuid, state in zip(user_uuids, states)
+               if state["uzcard_id"] and float(state["refreshed_at"] or 0) < fresh_since]
+        self.stats["skipped"] += len(user_uuids) - len(due)
+
+        results = await asyncio.gather(*(self.refresh_one(user_uuid, uzcard_id) for user_uuid, uzcard_id in due),
+                                       return_exceptions=True)
+        refreshed = [result for result in results if not isinstance(result, BaseException)]
+        for (user_uuid, _), result in zip(due, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Не удалось обновить баланс карты пользователя {user_uuid}: {result}")
+        if refreshed:
+            await PaymentSession.save_cards_many(refreshed)
+        self.stats["refreshed"] += len(refreshed)
+        self.stats["failed"] += len(due) - len(refreshed)
+
+    async def refresh_all(self):
+        started = time.monotonic()
+        user_uuids = await self.active_users()
+        for start in range(0, len(user_uuids), self.batch_size):
+            await self.refresh_batch(user_uuids[start:start + self.batch_size])
+        self.stats["cycles"] += 1
+        self.stats["last_cycle_seconds"] = round(time.monotonic() - started, 2)
+        logger.info(f"Балансы карт обновлены: {self.stats}")
+
+    async def run(self):
+        logger.info("Воркер обновления балансов карт запущен")
+        while True:
+            try:
+                redis = get_redis_client()
+                # Блокировка живет весь период: цикл выполняет один воркер, даже если остальные проснутся позже
+                lock = redis.lock(BALANCE_REFRESH_LOCK_KEY, timeout=settings.BALANCE_REFRESH_INTERVAL, blocking=False)
+                if await lock.acquire():
+                    await self.refresh_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка воркера обновления балансов карт: {e}")
+            await asyncio.sleep(settings.BALANCE_REFRESH_INTERVAL)
+
+
+balance_refresher = BalanceRefresher()
+
+
+if __name__ == "__main__":
+    # Отдельный процесс воркера: python -m src.payments.balances
+    asyncio.run(balance_refresher.run())
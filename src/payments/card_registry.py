@@ -0,0 +1,128 @@
+import asyncio
+import uuid
+
+from sqlalchemy.future import select
+
+from config.database import AsyncSessionLocal, get_redis_client, listen_channel
+from logs.logger import logger
+from src.users.models import Card
+
+# Отпечатки всех привязанных карт (проверка дубликатов) и канал изменений черного списка
+CARD_FINGERPRINTS_KEY = "cards:fingerprints"
+# Член множества, который добавляется после полной загрузки: множество без него (сброс Redis,
+# вытеснение, прерванная загрузка, SADD в пустой ключ) считается незагруженным
+LOADED_MARKER = "__loaded__"
+BLACKLIST_CHANNEL = "cards:blacklist:changed"
+LOAD_BATCH_SIZE = 1000
+
+
+class CardRegistry:
+    """
+    Проверки карты при регистрации без запроса к таблице cards.
+
+    Черный список (отпечатки заблокированных карт) хранится в памяти процесса:
+    загружается при старте и перечитывается после add/remove_blacklist_card,
+    остальные воркеры узнают об изменении через Redis pub/sub.
+    Отпечатки всех карт лежат в Redis-множестве cards:fingerprints, которое
+    заполняется из таблицы при старте, если оно не загружено, и обновляется при добавлении и удалении карт.
+    Отсутствие отпечатка в загруженном множестве проверку завершает, совпадение подтверждается
+    запросом по уникальному индексу (дубликаты редки, а устаревший член множества не должен блокировать карту).
+    Если Redis недоступен или множество не загружено, проверка идет по таблице, а загрузка запускается в фоне.
+    """
+
+    def __init__(self):
+        self._blacklist: frozenset[str] = frozenset()
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self._load_task: asyncio.Task | None = None
+        # Идентификатор воркера, чтобы не перечитывать список по собственному сообщению
+        self.instance_id = uuid.uuid4().hex
+
+    async def load_blacklist(self):
+        async with self._lock:
+            async with AsyncSessionLocal() as session:
+                fingerprints = await session.scalars(select(Card.card_number_hashed).where(Card.is_blacklisted))
+                # Множество подменяется целиком, читатели никогда не видят частично заполненный список
+                self._blacklist = frozenset(fingerprints)
+            self._loaded = True
+        logger.info("Черный список карт загружен: %s карт", len(self._blacklist))
+
+    async def load_fingerprints(self):
+        """Заполняет cards:fingerprints из таблицы, если множество не загружено полностью"""
+        redis = get_redis_client()
+        if await redis.sismember(CARD_FINGERPRINTS_KEY, LOADED_MARKER):
+            return
+        # SADD дописывает к уже добавленным картам: карты, подтвержденные во время загрузки, не теряются
+        async with AsyncSessionLocal() as session:
+            rows = await session.stream_scalars(
+                select(Card.card_number_hashed).execution_options(yield_per=LOAD_BATCH_SIZE))
+            async for batch in rows.partitions(LOAD_BATCH_SIZE):
+                await redis.sadd(CARD_FINGERPRINTS_KEY, *batch)
+        await redis.sadd(CARD_FINGERPRINTS_KEY, LOADED_MARKER)
+        logger.info("Отпечатки карт загружены в Redis")
+
+    def start_load_fingerprints(self):
+        if self._load_task is None or self._load_task.done():
+            self._load_task = asyncio.create_task(self.load_fingerprints())
+            self._load_task.add_done_callback(self.log_load_failure)
+
+    @staticmethod
+    def log_load_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Не удалось загрузить отпечатки карт в Redis: {task.exception()}")
+
+    async def load(self):
+        await self.load_blacklist()
+        await self.load_fingerprints()
+
+    async def is_blacklisted(self, fingerprints: list[str]) -> bool:
+        if not self._loaded:
+            await self.load_blacklist()
+        return any(fingerprint in self._blacklist for fingerprint in fingerprints)
+
+    async def is_registered(self, fingerprints: list[str]) -> bool:
+        try:
+            loaded, *registered = await get_redis_client().smismember(CARD_FINGERPRINTS_KEY,
+                                                                      [LOADED_MARKER, *fingerprints])
+            if loaded and not any(registered):
+                return False
+            if not loaded:
+                logger.error("Отпечатки карт в Redis не загружены, проверка по таблице")
+                self.start_load_fingerprints()
+        except Exception as e:
+            logger.error(f"Ошибка при проверке отпечатка карты в Redis: {e}")
+        async with AsyncSessionLocal() as session:
+            return await session.scalar(
+                select(Card.id).where(Card.card_number_hashed.in_(fingerprints)).limit(1)) is not None
+
+    async def add(self, fingerprint: str):
+        try:
+            await get_redis_client().sadd(CARD_FINGERPRINTS_KEY, fingerprint)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении отпечатка карты в Redis: {e}")
+
+    async def remove(self, fingerprint: str):
+        try:
+            await get_redis_client().srem(CARD_FINGERPRINTS_KEY, fingerprint)
+        except Exception as e:
+            logger.error(f"Ошибка при удалении отпечатка карты из Redis: {e}")
+
+    async def refresh_blacklist(self):
+        """Перечитывает черный список в текущем воркере и оповещает остальные"""
+        await self.load_blacklist()
+        try:
+            await get_redis_client().publish(BLACKLIST_CHANNEL, self.instance_id)
+        except Exception as e:
+            logger.error("Не удалось оповестить воркеры об изменении черного списка карт: %s", e)
+
+    async def on_message(self, sender: str):
+        if sender != self.instance_id:
+            logger.info("Получено уведомление об изменении черного списка карт")
+            await self.load_blacklist()
+
+    async def listen(self):
+        """Фоновая задача: перечитывает черный список по сообщениям других воркеров"""
+        await listen_channel(BLACKLIST_CHANNEL, self.on_message, self.load_blacklist)
+
+
+card_registry = CardRegistry()
@@ -0,0 +1,83 @@
+import asyncio
+import importlib.util
+import random
+
+import httpx
+
+from fastapi import HTTPException, status
+
+from config.circuit_breaker import Bulkhead, CircuitBreaker, ProviderUnavailableError
+from config.settings import get_settings
+from logs.logger import logger
+
+settings = get_settings()
+
+# HTTP/2 в httpx требует пакет h2, без него клиент работает по HTTP/1.1 с keep-alive
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class RequestNotSentError(HTTPException):
+    """503: запрос не отправлен в UPAY (предохранитель разомкнут или изолятор переполнен), повтор безопасен"""
+
+
+class UpayClient:
+    """
+    HTTP-клиент SOAP-шлюза UPAY с общим пулом keep-alive соединений на процесс.
+    Повторяет только идемпотентные запросы (получение данных карт):
+    регистрация, подтверждение карты и оплата при повторе могут выполниться дважды.
+    Когда шлюз отвечает ошибками или не отвечает, предохранитель отклоняет запросы сразу с 503.
+    """
+
+    def __init__(self, url: str = None, max_connections: int = None):
+        self.url = url or settings.UPAY_URL
+        self.max_connections = max_connections or settings.UPAY_MAX_CONNECTIONS
+        self.client: httpx.AsyncClient | None = None
+        # Ограничение одновременных запросов к UPAY на процесс
+        self.bulkhead = Bulkhead("upay", self.max_connections)
+        self.breaker = CircuitBreaker("upay", is_failure=lambda response: response.status_code >= 500)
+
+    async def start(self):
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections,
+                                    keepalive_expiry=30),
+                timeout=httpx.Timeout(settings.UPAY_READ_TIMEOUT, connect=settings.UPAY_CONNECT_TIMEOUT),
+                headers={"Content-Type": "text/xml"},
+            )
+            logger.info("HTTP-клиент UPAY запущен (http2=%s)", HTTP2_AVAILABLE)
+
+    async def close(self):
+        if self.client is not None and not self.client.is_closed:
+            await self.client.aclose()
+            logger.info("HTTP-клиент UPAY остановлен")
+        self.client = None
+
+    async def send(self, body: str | bytes) -> httpx.Response:
+        async with self.bulkhead:
+            return await self.client.post(self.url, content=body)
+
+    async def post(self, body: str | bytes, idempotent: bool = False) -> httpx.Response:
+        await self.start()
+        attempts = settings.UPAY_MAX_RETRIES + 1 if idempotent else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                response = await self.breaker.call(self.send, body)
+                if response.status_code < 500 or attempt == attempts:
+                    return response
+                logger.error("UPAY ответил %s, повтор %s из %s", response.status_code, attempt, attempts - 1)
+            except ProviderUnavailableError as e:
+                logger.error("Запрос к UPAY отклонен: %s", e)
+                raise RequestNotSentError(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                          detail="Payment provider is temporarily unavailable",
+                                          headers={"Retry-After": str(max(1, round(e.retry_after)))})
+            except httpx.TransportError as e:
+                if attempt == attempts:
+                    raise
+                logger.error("Ошибка соединения с UPAY: %s, повтор %s из %s", e, attempt, attempts - 1)
+            # Full jitter: случайная задержка до 0.2, 0.4, 0.8 ... сек, чтобы повторы не шли волной
+            await asyncio.sleep(random.uniform(0, 0.2 * 2 ** (attempt - 1)))
+
+
+upay_client = UpayClient()
@@ -0,0 +1,55 @@
+from xml.sax.saxutils import escape
+
+ENVELOPE_HEAD = ('<?xml version="1.0" encoding="UTF-8"?>'
+                 '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+                 'xmlns:st="http://st.apus.com/"><soapenv:Header/><soapenv:Body>')
+ENVELOPE_TAIL = '</soapenv:Body></soapenv:Envelope>'
+
+# Поля с постоянным значением во всех запросах партнера
+STATIC_FIELDS = {"Version": "1", "Lang": "ru"}
+
+
+def needs_escape(text: str) -> bool:
+    return "&" in text or "<" in text or ">" in text
+
+
+class EnvelopeTemplate:
+    """
+    SOAP-конверт операции UPAY, собранный один раз при импорте.
+    Статическая разметка (без отступов) и постоянные поля уже в шаблоне,
+    build только подставляет значения, экранируя спецсимволы XML, и возвращает байты для HTTP-клиента.
+    """
+
+    def __init__(self, operation: str, fields: tuple[str, ...], static: dict = None):
+        self.operation = operation
+        static = {**STATIC_FIELDS, **(static or {})}
+        self.fields = tuple(name for name in fields if name not in static)
+
+        parts = [ENVELOPE_HEAD, f"<st:{operation}><{operation}Request>"]
+        for name in (*fields, *(name for name in STATIC_FIELDS if name not in fields)):
+            value = escape(static[name]).replace("%", "%%") if name in static else "%s"
+            parts.append(f"<{name}>{value}</{name}>")
+        parts += [f"</{operation}Request></st:{operation}>", ENVELOPE_TAIL]
+        self.template = "".join(parts)
+
+    def build(self, *values) -> bytes:
+        """Значения передаются в порядке self.fields"""
+        if len(values) != len(self.fields):
+            raise ValueError(f"{self.operation} expects fields {self.fields}")
+        values = tuple(["" if value is None else str(value) for value in values])
+        # Номера карт, токены и суммы почти никогда не содержат спецсимволов, проверяем все значения разом
+        if needs_escape("".join(values)):
+            values = tuple([escape(value) for value in values])
+        return (self.template % values).encode()
+
+
+REGISTER_CARD = EnvelopeTemplate("partnerRegisterCard",
+                                 ("StPimsApiPartnerKey", "AccessToken", "CardNumber", "ExDate"))
+CONFIRM_CARD = EnvelopeTemplate("partnerConfirmCard",
+                                ("StPimsApiPartnerKey", "AccessToken", "ConfirmId", "VerifyCode"))
+CARD_LIST = EnvelopeTemplate("partnerCardList",
+                             ("StPimsApiPartnerKey", "AccessToken", "CardList"))
+PAYMENT = EnvelopeTemplate("partnerPayment",
+                           ("StPimsApiPartnerKey", "AccessToken", "CardPhone", "UzcardId", "ServiceId",
+                            "PaymentType", "PersonalAccount", "AmountInTiyin", "RegionId", "SubRegionId"),
+                           static={"PaymentType": "", "RegionId": "", "SubRegionId": ""})
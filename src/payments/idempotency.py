@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import json
+import time
+
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException, status
+
+from config.database import get_redis_client
+from config.settings import get_settings
+from logs.logger import logger
+
+settings = get_settings()
+
+IDEMPOTENCY_POLL_INTERVAL = 0.1  # сек между проверками результата запроса другого воркера
+
+# Захват ключа идемпотентности за один round-trip:
+# ключа нет - создаем его в состоянии in_flight и возвращаем пустой список,
+# ключ есть - возвращаем его поля (state, fingerprint, status_code, body)
+BEGIN_SCRIPT = """
+local current = redis.call('HGETALL', KEYS[1])
+if #current == 0 then
+    redis.call('HSET', KEYS[1], 'state', 'in_flight', 'fingerprint', ARGV[1])
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+end
+return current
+"""
+
+begin_script = None
+
+# Запросы с тем же ключом внутри процесса ждут одного исполнителя, а не опрашивают Redis
+local_requests: dict[str, tuple[str, asyncio.Future]] = {}
+
+
+class ResultUnknownError(HTTPException):
+    """Результат запроса еще не окончательный: ответ не сохраняется, ключ освобождается для повтора"""
+
+
+def idempotency_key(scope: str, key: str) -> str:
+    return f"idempotency:{scope}:{key}"
+
+
+def request_fingerprint(params: dict) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def check_fingerprint(stored: str | None, fingerprint: str):
+    if stored is not None and stored != fingerprint:
+        logger.error("Ключ идемпотентности повторно использован с другими параметрами")
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Idempotency-Key was already used with different parameters")
+
+
+def replay(result: tuple[int, dict | str]) -> dict:
+    status_code, body = result
+    if status_code >= 400:
+        raise HTTPException(status_code=status_code, detail=body)
+    return body
+
+
+async def begin(redis_key: str, fingerprint: str) -> dict:
+    global begin_script
+    redis = get_redis_client()
+    if begin_script is None:
+        begin_script = redis.register_script(BEGIN_SCRIPT)
+    current = await begin_script(keys=[redis_key], args=[fingerprint, settings.IDEMPOTENCY_LOCK_TTL], client=redis)
+    return dict(zip(current[::2], current[1::2]))
+
+
+async def wait_or_acquire(redis_key: str, fingerprint: str) -> tuple[int, dict | str] | None:
+    """Возвращает сохраненный результат или None, если запрос должен выполнить этот воркер"""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        try:
+            current = await begin(redis_key, fingerprint)
+        except Exception as e:
+            # Повторное списание без Redis предотвращает уникальный индекс таблицы транзакций
+            logger.error(f"Ошибка при захвате ключа идемпотентности в Redis: {e}")
+            return None
+        if not current:
+            return None
+
+        check_fingerprint(current.get("fingerprint"), fingerprint)
+        if current.get("state") == "done":
+            logger.info("Повторный запрос %s, возвращаем сохраненный результат", redis_key)
+            return int(current["status_code"]), json.loads(current["body"])
+        if time.monotonic() >= deadline:
+            logger.error("Запрос %s все еще выполняется другим воркером", redis_key)
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail="A request with this Idempotency-Key is still in progress")
+        await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+
+async def save_result(redis_key: str, result: tuple[int, dict | str]):
+    try:
+        redis = get_redis_client()
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(redis_key, mapping={"state": "done", "status_code": result[0], "body": json.dumps(result[1])})
+            pipe.expire(redis_key, settings.IDEMPOTENCY_RESULT_TTL)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении результата идемпотентного запроса в Redis: {e}")
+
+
+async def release(redis_key: str):
+    try:
+        await get_redis_client().delete(redis_key)
+    except Exception as e:
+        logger.error(f"Ошибка при освобождении ключа идемпотентности в Redis: {e}")
+
+
+async def execute(redis_key: str, func: Callable[[], Awaitable[dict]]) -> tuple[int, dict | str]:
+    try:
+        result = status.HTTP_200_OK, await func()
+    except ResultUnknownError:
+        # Исход еще неизвестен (например, платеж в статусе pending): повтор должен спросить заново
+        await release(redis_key)
+        raise
+    except HTTPException as e:
+        if e.status_code >= 500:
+            # Запрос не выполнен, повтор с тем же ключом должен выполнить его заново
+            await release(redis_key)
+            raise
+        # Ответ провайдера об ошибке (например, недостаточно средств) повторяется как есть
+        result = e.status_code, e.detail
+    except BaseException:
+        await release(redis_key)
+        raise
+    await save_result(redis_key, result)
+    return result
+
+
+async def run_idempotent(scope: str, key: str, params: dict, func: Callable[[], Awaitable[dict]]) -> dict:
+    """
+    Выполняет func не больше одного раза на ключ идемпотентности.
+    Одновременные дубликаты ждут результата первого запроса, повторы после завершения
+    получают сохраненный ответ (IDEMPOTENCY_RESULT_TTL). Тот же ключ с другими params - 422.
+    """
+    redis_key = idempotency_key(scope, key)
+    fingerprint = request_fingerprint(params)
+
+    while redis_key in local_requests:
+        local_fingerprint, future = local_requests[redis_key]
+        check_fingerprint(local_fingerprint, fingerprint)
+        result = await asyncio.shield(future)
+        if result is not None:
+            return replay(result)
+        # Исполнитель завершился без результата: запрос выполняет следующий
+
+    future = asyncio.get_running_loop().create_future()
+    local_requests[redis_key] = (fingerprint, future)
+    result = None
+    try:
+        result = await wait_or_acquire(redis_key, fingerprint)
+        if result is None:
+            result = await execute(redis_key, func)
+        return replay(result)
+    finally:
+        local_requests.pop(redis_key, None)
+        future.set_result(result)
@@ -1,154 +1,136 @@
+import json
+import time
+
 from uuid import UUID
 
-from config.database import get_redis_connection, close_redis_connection
+from config.database import get_redis_client
+from config.settings import get_settings
 from logs.logger import logger
 
-
-async def save_confirm_id(user_uuid: UUID, confirm_id: int):
-    try:
-        redis = await get_redis_connection()
-        await redis.set(f"confirm_id:{user_uuid}", confirm_id)
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении confirmed_id в Redis: {e}")
-        print(f"Error when saving confirm_id in Redis: {e}")
-
-    finally:
-        await close_redis_connection()
-
-
-async def get_confirm_id(user_uuid: UUID):
-    try:
-        redis = await get_redis_connection()
-        # Получаем confirm_id по ключу, который включает user_uuid
-        confirm_id = await redis.get(f"confirm_id:{user_uuid}")
-        return confirm_id
-    except Exception as e:
-        logger.error(f"Ошибка при получении confirmed_id из Redis: {e}")
-        print(f"Error when retrieving confirm_id from Redis: {e}")
-    finally:
-        await close_redis_connection()
-
-
-async def save_card(user_uuid: UUID, card_number: str, expiry_date: str):
-    try:
-        redis = await get_redis_connection()
-        await redis.set(f"card_number:{user_uuid}", card_number, ex=60)
-        await redis.set(f"expiry_date:{user_uuid}", expiry_date, ex=60)
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении данных карты в Redis: {e}")
-        print(f"Error when saving card data in Redis: {e}")
-    finally:
-        await close_redis_connection()
-
-
-async def get_card(user_uuid: UUID):
-    try:
-        redis = await get_redis_connection()
-        card_number = await redis.get(f"card_number:{user_uuid}")
-        expiry_date = await redis.get(f"expiry_date:{user_uuid}")
-        return card_number, expiry_date
-    except Exception as e:
-        logger.error(f'Ошибка при извлечении данных карты в Redis: {e}')
-        print(f"Error when retrieving card data in Redis: {e}")
-        return None, None
-    finally:
-        await close_redis_connection()
-
-
-async def save_uzcard_id(user_uuid: UUID, uzcard_id: int):
-    try:
-        redis = await get_redis_connection()
-        uzcard_id = await redis.set(f"uzcard_id:{user_uuid}", uzcard_id)
-        return uzcard_id
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении данных карты в Redis: {e}")
-        print(f"Error when saving card data in Redis: {e}")
-    finally:
-        await close_redis_connection()
-
-
-async def get_uzcard_id(user_uuid: UUID):
-    try:
-        redis = await get_redis_connection()
-        # Получаем uzcard_id по ключу, который включает user_uuid
-        confirm_id = await redis.get(f"uzcard_id:{user_uuid}")
-        return confirm_id
-    except Exception as e:
-        logger.error(f"Ошибка при получении confirmed_id из Redis: {e}")
-        print(f"Error when retrieving confirm_id from Redis: {e}")
-    finally:
-        await close_redis_connection()
-
-
-async def save_card_phone(user_uuid: UUID, card_phone: str):
-    try:
-        redis = await get_redis_connection()
-        card_phone = await redis.set(f"card_phone:{user_uuid}", card_phone)
-        return card_phone
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении данных карты в Redis: {e}")
-        print(f"Error when saving card data in Redis: {e}")
-    finally:
-        await close_redis_connection()
-
-
-async def get_card_phone(user_uuid: UUID):
-    try:
-        redis = await get_redis_connection()
-        # Получаем card_phone по ключу, который включает user_uuid
-        card_phone = await redis.get(f"card_phone:{user_uuid}")
-        return card_phone
-    except Exception as e:
-        logger.error(f"Ошибка при получении confirmed_id из Redis: {e}")
-        print(f"Error when retrieving confirm_id from Redis: {e}")
-    finally:
-        await close_redis_connection()
-
-
-async def save_transaction_id(user_uuid: UUID, transaction_id: int):
-    try:
-        redis = await get_redis_connection()
-        transaction = await redis.set(f"transaction:{user_uuid}", transaction_id)
-        return transaction
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении данных карты в Redis: {e}")
-        print(f"Error when saving card data in Redis: {e}")
-    finally:
-        await close_redis_connection()
-
-
-async def get_transaction_id(user_uuid: UUID):
-    try:
-        redis = await get_redis_connection()
-        # Получаем transition_id по ключу, который включает user_uuid
-        transaction = await redis.get(f"transaction:{user_uuid}")
-        return transaction
-    except Exception as e:
-        logger.error(f"Ошибка при извлечении транзакции из Redis: {e}")
-        print(f"Error when retrieving transaction from Redis: {e}")
-    finally:
-        await close_redis_connection()
-
-
-async def save_balance(user_uuid: UUID, balance_id: int):
-    try:
-        redis = await get_redis_connection()
-        balance = await redis.set(f"balance:{user_uuid}", balance_id)
-        return balance
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении баланса в Redis: {e}")
-        print(f"Error when saving balance in Redis: {e}")
-    finally:
-        await close_redis_connection()
-
-
-async def get_balance(user_uuid: UUID):
-    try:
-        redis = await get_redis_connection()
-        balance = await redis.get(f"balance:{user_uuid}")
-        return balance
-    except Exception as e:
-        logger.error(f"Ошибка при получении баланса из Redis: {e}")
-        print(f"Error when retrieving balance from Redis: {e}")
-    finally:
-        await close_redis_connection()
+settings = get_settings()
+
+# Состояние карты пользователя хранится в двух хешах вместо ключа на каждое поле:
+# payment:{uuid}:pending - незавершенная регистрация (confirm_id, номер и срок карты),
+#   живет PAYMENT_PENDING_TTL: после этого SMS-код UPAY уже недействителен,
+#   а данные карты не должны оставаться в Redis дольше необходимого;
+# payment:{uuid} - привязанная карта (uzcard_id, card_phone, balance, transaction_id), без срока,
+#   и кеш списка карт UPAY (cards в JSON, refreshed_at - время обновления), который обновляет BalanceRefresher.
+# Каждый шаг обработчика читает или пишет хеш одним round-trip.
+PENDING_FIELDS = ("confirm_id", "card_number", "expiry_date")
+CARD_FIELDS = ("uzcard_id", "card_phone", "balance", "transaction_id")
+# Пользователи, открывавшие карты, с временем последнего обращения: их балансы обновляются в фоне
+ACTIVE_CARDS_KEY = "payment:active"
+
+
+def payment_key(user_uuid: UUID) -> str:
+    return f"payment:{user_uuid}"
+
+
+def pending_key(user_uuid: UUID) -> str:
+    return f"payment:{user_uuid}:pending"
+
+
+class PaymentSession:
+    def __init__(self, user_uuid: UUID):
+        self.user_uuid = user_uuid
+
+    async def start_registration(self, confirm_id: str, card_number: str, expiry_date: str):
+        """Сохраняет данные регистрации карты, повторная регистрация заменяет предыдущую"""
+        try:
+            redis = get_redis_client()
+            key = pending_key(self.user_uuid)
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.hset(key, mapping={"confirm_id": confirm_id, "card_number": card_number,
+                                        "expiry_date": expiry_date})
+                pipe.expire(key, settings.PAYMENT_PENDING_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении данных регистрации карты в Redis: {e}")
+
+    async def get_registration(self) -> tuple[str | None, str | None, str | None]:
+        """Возвращает (confirm_id, card_number, expiry_date) незавершенной регистрации"""
+        try:
+            redis = get_redis_client()
+            return tuple(await redis.hmget(pending_key(self.user_uuid), PENDING_FIELDS))
+        except Exception as e:
+            logger.error(f"Ошибка при получении данных регистрации карты из Redis: {e}")
+            return None, None, None
+
+    async def complete_registration(self, uzcard_id: str, card_phone: str, balance: str):
+        """Сохраняет привязанную карту и удаляет данные регистрации одной транзакцией"""
+        try:
+            redis = get_redis_client()
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hset(payment_key(self.user_uuid), mapping={"uzcard_id": uzcard_id, "card_phone": card_phone,
+                                                                "balance": balance})
+                # Кеш списка карт относится к прежней карте
+                pipe.hdel(payment_key(self.user_uuid), "transaction_id", "cards", "refreshed_at")
+                pipe.delete(pending_key(self.user_uuid))
+                pipe.zadd(ACTIVE_CARDS_KEY, {str(self.user_uuid): time.time()})
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении данных карты в Redis: {e}")
+
+    async def get_card(self) -> dict:
+        """Возвращает поля привязанной карты, отсутствующие поля - None"""
+        try:
+            redis = get_redis_client()
+            return dict(zip(CARD_FIELDS, await redis.hmget(payment_key(self.user_uuid), CARD_FIELDS)))
+        except Exception as e:
+            logger.error(f"Ошибка при получении данных карты из Redis: {e}")
+            return dict.fromkeys(CARD_FIELDS)
+
+    async def save_transaction(self, transaction_id: str):
+        try:
+            redis = get_redis_client()
+            await redis.hset(payment_key(self.user_uuid), "transaction_id", transaction_id)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении транзакции в Redis: {e}")
+
+    async def get_cached_cards(self) -> tuple[str | None, dict | None, float | None]:
+        """
+        Возвращает (uzcard_id, кешированный список карт, время его обновления)
+        и отмечает пользователя активным для фонового обновления балансов
+        """
+        try:
+            redis = get_redis_client()
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.hmget(payment_key(self.user_uuid), ("uzcard_id", "cards", "refreshed_at"))
+                pipe.zadd(ACTIVE_CARDS_KEY, {str(self.user_uuid): time.time()})
+                (uzcard_id, cards, refreshed_at), _ = await pipe.execute()
+            if cards is None or refreshed_at is None:
+                return uzcard_id, None, None
+            return uzcard_id, json.loads(cards), float(refreshed_at)
+        except Exception as e:
+            logger.error(f"Ошибка при получении кеша карт из Redis: {e}")
+            return None, None, None
+
+    async def save_cards(self, cards: dict, balance: str | None) -> float:
+        return (await PaymentSession.save_cards_many([(self.user_uuid, cards, balance)]))[0]
+
+    @staticmethod
+    async def save_cards_many(items: list[tuple[UUID, dict, str | None]]) -> list[float]:
+        """Сохраняет списки карт и балансы нескольких пользователей одним pipeline"""
+        refreshed_at = time.time()
+        try:
+            redis = get_redis_client()
+            async with redis.pipeline(transaction=False) as pipe:
+                for user_uuid, cards, balance in items:
+                    mapping = {"cards": json.dumps(cards), "refreshed_at": refreshed_at}
+                    if balance is not None:
+                        mapping["balance"] = balance
+                    pipe.hset(payment_key(user_uuid), mapping=mapping)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении кеша карт в Redis: {e}")
+        return [refreshed_at] * len(items)
+
+    @staticmethod
+    async def get_many(user_uuids: list[UUID], fields: tuple[str, ...] = CARD_FIELDS) -> list[dict]:
+        """Поля привязанных карт нескольких пользователей за один round-trip"""
+        redis = get_redis_client()
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_uuid in user_uuids:
+                pipe.hmget(payment_key(user_uuid), fields)
+            return [dict(zip(fields, values)) for values in await pipe.execute()]
@@ -1,40 +1,21 @@
-from httpx import AsyncClient
 from fastapi import HTTPException
 
 from logs.logger import logger
+from src.payments.client import upay_client
+from src.payments.envelopes import REGISTER_CARD, CONFIRM_CARD, CARD_LIST, PAYMENT
 from src.payments.utils import generate_access_token, generate_confirm_token, generate_payment_token, \
     generate_uzcard_id_token
 
 
 async def card_response(partner_key, card_number, expiry_date, login, password):
     """ Отправляет запрос регистрации карты на сервер платежной системы. """
-    url = "https://api.upay.uz/STAPI/STWS?wsdl"
     access_token = generate_access_token(login, card_number, expiry_date, password)
 
-    request_body = f"""<?xml version="1.0" encoding="UTF-8"?>
-    <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
-                  xmlns:st="http://st.apus.com/"> 
-   <soapenv:Header/>
-   <soapenv:Body>
-      <st:partnerRegisterCard>
-        <partnerRegisterCardRequest>  
-            <StPimsApiPartnerKey>{partner_key}</StPimsApiPartnerKey>
-            <AccessToken>{access_token}</AccessToken>
-            <CardNumber>{card_number}</CardNumber>
-            <ExDate>{expiry_date}</ExDate>
-            <Version>1</Version>
-            <Lang>ru</Lang>
-            </partnerRegisterCardRequest>
-        </st:partnerRegisterCard>
-    </soapenv:Body>
-</soapenv:Envelope>"""
-    headers = {'Content-Type': 'text/xml'}
-    async with AsyncClient() as client:
-        response = await client.post(url, data=request_body, headers=headers)
-
-        if response.status_code != 200:
-            logger.error(f"Не удалось зарегистрировать карту {response.text}")
-            raise HTTPException(status_code=response.status_code, detail="Failed to register card")
+    request_body = REGISTER_CARD.build(partner_key, access_token, card_number, expiry_date)
+    response = await upay_client.post(request_body)
+    if response.status_code != 200:
+        logger.error(f"Не удалось зарегистрировать карту {response.text}")
+        raise HTTPException(status_code=response.status_code, detail="Failed to register card")
     logger.info('Карта успешно зарегистрирована')
     return response
 
@@ -70,104 +51,43 @@ async def card_response(partner_key, card_number, expiry_date, login, password):
 
 
 async def confirm_card(partner_key, confirm_id, verify_code, login, password):
-    url = "https://api.upay.uz/STAPI/STWS?wsdl"
     confirm_token = generate_confirm_token(login, confirm_id, verify_code, password)
 
-    request_body = f"""<?xml version="1.0" encoding="UTF-8"?>
-<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:st="http://st.apus.com/">
-    <soapenv:Header/>
-    <soapenv:Body>
-        <st:partnerConfirmCard>
-            <partnerConfirmCardRequest>
-                <StPimsApiPartnerKey>{partner_key}</StPimsApiPartnerKey>
-                <AccessToken>{confirm_token}</AccessToken>
-                <ConfirmId>{confirm_id}</ConfirmId>
-                <VerifyCode>{verify_code}</VerifyCode>
-                <Version>1</Version>
-                <Lang>ru</Lang>
-            </partnerConfirmCardRequest>
-        </st:partnerConfirmCard>
-    </soapenv:Body>
-</soapenv:Envelope>
-    """
-    headers = {'Content-Type': 'text/xml'}
+    request_body = CONFIRM_CARD.build(partner_key, confirm_token, confirm_id, verify_code)
 
-    async with AsyncClient() as client:
-        response = await client.post(url, data=request_body, headers=headers)
-        if response.status_code != 200:
-            logger.error(f"Не удалось подтвердить карту {response.text}")
-            raise HTTPException(status_code=response.status_code, detail=response.text)
+    response = await upay_client.post(request_body)
+    if response.status_code != 200:
+        logger.error(f"Не удалось подтвердить карту {response.text}")
+        raise HTTPException(status_code=response.status_code, detail=response.text)
     logger.success("Карта успешно подтверждения")
     return response
 
 
 async def get_all_cards(partner_key, uzcard_id, login, password):
-    url = "https://api.upay.uz/STAPI/STWS?wsdl"
     uzcard_token = generate_uzcard_id_token(login, uzcard_id, password)
 
-    request_body = f"""<?xml version="1.0" encoding="UTF-8"?>
-<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:st="http://st.apus.com/">
-    <soapenv:Header/>
-    <soapenv:Body>
-        <st:partnerCardList>
-            <partnerCardListRequest>
-                <StPimsApiPartnerKey>{partner_key}</StPimsApiPartnerKey>
-                <AccessToken>{uzcard_token}</AccessToken>
-                <CardList>{uzcard_id}</CardList>
-                <Version>1</Version>
-                <Lang>ru</Lang>
-            </partnerCardListRequest>
-        </st:partnerCardList>
-    </soapenv:Body>
-</soapenv:Envelope>
-    """
-    headers = {'Content-Type': 'text/xml'}
-
-    async with AsyncClient() as client:
-        response = await client.post(url, data=request_body, headers=headers)
+    request_body = CARD_LIST.build(partner_key, uzcard_token, uzcard_id)
 
-        if response.status_code != 200:
-            logger.error(f"Ошибка при получений данных {response.text}")
-            raise HTTPException(status_code=response.status_code, detail="Failed to register card")
+    # Получение списка карт только читает данные, поэтому запрос можно повторить
+    response = await upay_client.post(request_body, idempotent=True)
+    if response.status_code != 200:
+        logger.error(f"Ошибка при получений данных {response.text}")
+        raise HTTPException(status_code=response.status_code, detail="Failed to register card")
     logger.success("Данные успешно получены")
     return response
 
 
 async def create_payment(partner_key, uzcard_id, card_phone, service_id,
                          personal_account, amount_tiyin, login, password):
-    url = "https://api.upay.uz/STAPI/STWS?wsdl"
     payment_token = generate_payment_token(login, card_phone, uzcard_id, service_id, personal_account, amount_tiyin,
                                            password)
-    request_body = f"""<?xml version="1.0" encoding="UTF-8"?>
-    <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:st="http://st.apus.com/">
-    <soapenv:Header/>
-    <soapenv:Body>
-        <st:partnerPayment>
-            <partnerPaymentRequest>
-                <StPimsApiPartnerKey>{partner_key}</StPimsApiPartnerKey>
-                <AccessToken>{payment_token}</AccessToken>
-                <CardPhone>{card_phone}</CardPhone>
-                <UzcardId>{uzcard_id}</UzcardId>
-                <ServiceId>{service_id}</ServiceId>
-                <PaymentType></PaymentType>
-                <PersonalAccount>{personal_account}</PersonalAccount>
-                <AmountInTiyin>{amount_tiyin}</AmountInTiyin>
-                <RegionId></RegionId>
-                <SubRegionId></SubRegionId>
-                <Version>1</Version>
-                <Lang>ru</Lang>
-            </partnerPaymentRequest>
-        </st:partnerPayment>
-    </soapenv:Body>
-</soapenv:Envelope>
-    """
-    headers = {'Content-Type': 'text/xml'}
+    request_body = PAYMENT.build(partner_key, payment_token, card_phone, uzcard_id, service_id,
+                                 personal_account, amount_tiyin)
 
-    async with AsyncClient() as client:
-        response = await client.post(url, data=request_body, headers=headers)
-        if response.status_code != 200:
-            logger.error(f"Ошибка при выполнений транзакции {response.text}")
-            raise HTTPException(status_code=response.status_code, detail="Failed to register card")
+    response = await upay_client.post(request_body)
+    if response.status_code != 200:
+        logger.error(f"Ошибка при выполнений транзакции {response.text}")
+        raise HTTPException(status_code=response.status_code, detail="Failed to register card")
     logger.success("Средства успешно сняты")
     return response
 
@@ -1,120 +1,100 @@
+from dataclasses import dataclass, field
 from xml.etree import ElementTree
+
 from logs.logger import logger
 
+SOAP_BODY = "{http://schemas.xmlsoap.org/soap/envelope/}Body"
 
-def parse_confirm_id(xml_response):
-    """Находит ConfirmId из ответа card_response"""
-    try:
-        # Преобразуем строку XML в структуру данных
-        root = ElementTree.fromstring(xml_response)
-        # Используем правильный XPath с учетом namespace для envelope и body
-        ns = {'s': 'http://schemas.xmlsoap.org/soap/envelope/', 'ns2': 'http://st.apus.com/'}
-        # Находим элемент ConfirmId, который находится вне пространства имен ns2
-        confirm_id = root.find(".//s:Body/ns2:partnerRegisterCardResponse/return/ConfirmId", namespaces=ns)
 
-        if confirm_id is not None:
-            return confirm_id.text
+def element_to_dict(element: ElementTree.Element) -> dict | str | None:
+    """Преобразует элемент в словарь в формате xmltodict: повторяющиеся теги собираются в список"""
+    if len(element) == 0:
+        return element.text
+    data = {}
+    for child in element:
+        value = element_to_dict(child)
+        if child.tag in data:
+            if not isinstance(data[child.tag], list):
+                data[child.tag] = [data[child.tag]]
+            data[child.tag].append(value)
         else:
-            logger.error("ConfirmId не найден в ответе")
-            raise ValueError("ConfirmId not found in the response")
-    except ElementTree.ParseError:
-        logger.error("Ошибка при парсинге XML-ответа")
-        raise ValueError("Error parsing the XML response")
+            data[child.tag] = value
+    return data
 
 
-def parse_uzcard_id(xml_response):
-    """ Находит UzcardId из ответа card_confirm_response"""
-    try:
-        root = ElementTree.fromstring(xml_response)
-        namespaces = {'s': 'http://schemas.xmlsoap.org/soap/envelope/', 'ns2': 'http://st.apus.com/'}
-        uzcard_id = root.find(".//s:Body/ns2:partnerConfirmCardResponse/return/UzcardId", namespaces=namespaces)
-        if uzcard_id is not None:
-            return uzcard_id.text
-        else:
-            logger.error("UzcardId не найден в ответе")
-            raise ValueError("UzcardId not found in the response")
-    except ElementTree.ParseError as e:
-        logger.error(f"Ошибка при парсинге XML-ответа: {e}")
-        raise ValueError("Error parsing the XML response: " + str(e))
+@dataclass
+class UpayResponse:
+    """Ответ SOAP-шлюза UPAY, разобранный один раз"""
+    method: str
+    code: str | None = None
+    description: str | None = None
+    confirm_id: str | None = None
+    uzcard_id: str | None = None
+    card_phone: str | None = None
+    balance: str | None = None
+    transaction_id: str | None = None
+    confirmed: str | None = None
+    cards: list[dict] = field(default_factory=list)
+    result: ElementTree.Element | None = field(default=None, repr=False, compare=False)
 
+    @property
+    def ok(self) -> bool:
+        # Шлюз может не вернуть блок Result, как и раньше такой ответ считается успешным
+        return self.code is None or self.code == "OK"
 
-def parse_card_phone(xml_response):
-    """Находит Card_phone из ответа card_confirm_response"""
-    try:
-        root = ElementTree.fromstring(xml_response)
-        namespaces = {'s': 'http://schemas.xmlsoap.org/soap/envelope/', 'ns2': 'http://st.apus.com/'}
-        card_phone = root.find(".//s:Body/ns2:partnerConfirmCardResponse/return/CardPhone", namespaces=namespaces)
-        if card_phone is not None:
-            return card_phone.text
-        else:
-            logger.error("Телефон карты не найден в ответе")
-            raise ValueError("Card Phone not found in the response")
-    except ElementTree.ParseError as e:
-        logger.error(f"Ошибка при парсинге XML-ответа: {e}")
-        raise ValueError("Error parsing the XML response: " + str(e))
+    def require(self, name: str) -> str:
+        """Возвращает обязательное поле ответа или ValueError, если шлюз его не прислал"""
+        value = getattr(self, name)
+        if value is None:
+            logger.error(f"{name} не найден в ответе {self.method}")
+            raise ValueError(f"{name} not found in the response")
+        return value
 
+    def as_dict(self) -> dict:
+        """Содержимое return в том же виде, что отдавал xmltodict"""
+        if self.result is None:
+            return {}
+        return element_to_dict(self.result) or {}
 
-def parse_transaction_id(xml_response):
-    """Находит TransactionId из ответа payment_response"""
-    try:
-        root = ElementTree.fromstring(xml_response)
-        namespaces = {'s': 'http://schemas.xmlsoap.org/soap/envelope/', 'ns2': 'http://st.apus.com/'}
-        transaction = root.find(".//s:Body/ns2:partnerPaymentResponse/return/TransactionId", namespaces=namespaces)
-        if transaction is not None:
-            return transaction.text
-        else:
-            logger.error("Телефон карты не найден в ответе")
-            raise ValueError("Card Phone not found in the response")
-    except ElementTree.ParseError as e:
-        logger.error(f"Ошибка при парсинге XML-ответа: {e}")
-        raise ValueError("Error parsing the XML response: " + str(e))
 
+FIELDS = {
+    "ConfirmId": "confirm_id",
+    "UzcardId": "uzcard_id",
+    "CardPhone": "card_phone",
+    "Balance": "balance",
+    "TransactionId": "transaction_id",
+    "Confirmed": "confirmed",
+}
 
-def parse_confirmation(xml_response):
-    """Находит confirmed из ответа payment_response"""
+
+def parse_upay_response(xml_response: str | bytes) -> UpayResponse:
+    """Разбирает конверт UPAY за один проход: Result, поля ответа и список карт"""
     try:
         root = ElementTree.fromstring(xml_response)
-        namespaces = {"s": "http://schemas.xmlsoap.org/soap/envelope/", "ns2": "http://st.apus.com/"}
-        confirmation = root.find(".//s:Body/ns2:partnerPaymentResponse/return/Confirmed", namespaces=namespaces)
-        if confirmation is not None:
-            return confirmation.text
-        else:
-            logger.error("Подтверждение в ответе не найдено")
-            raise ValueError("Confirmation not found in the response")
     except ElementTree.ParseError as e:
         logger.error(f"Ошибка при парсинге XML-ответа: {e}")
         raise ValueError("Error parsing the XML response: " + str(e))
 
+    body = root.find(SOAP_BODY)
+    if body is None or len(body) == 0 or body[0].find("return") is None:
+        logger.error("Ответ UPAY не содержит Body/return")
+        raise ValueError("Unexpected UPAY response structure")
 
-def parse_balance(xml_response):
-    """Находит balance из ответа card_list_response"""
-    try:
-        root = ElementTree.fromstring(xml_response)
-        namespaces = {"s": "http://schemas.xmlsoap.org/soap/envelope/", "ns2": "http://st.apus.com/"}
-        balance = root.find(".//s:Body/ns2:partnerCardListResponse/return/CardList/CardList/Balance",
-                            namespaces=namespaces)
-        if balance is not None:
-            return balance.text
-        else:
-            logger.error("Баланс не найден в ответе")
-            raise ValueError("Balance not found in the response")
-    except ElementTree.ParseError as e:
-        logger.error(f"Ошибка при парсинге XML-ответа: {e}")
-        raise ValueError("Error parsing the XML response: " + str(e))
+    # {http://st.apus.com/}partnerCardListResponse -> partnerCardList
+    method = body[0].tag.rpartition("}")[2].removesuffix("Response")
+    result = body[0].find("return")
+    response = UpayResponse(method=method, result=result)
 
+    for child in result:
+        if child.tag == "Result":
+            response.code = child.findtext("code")
+            response.description = child.findtext("Description")
+        elif child.tag == "CardList":
+            response.cards = [{item.tag: item.text for item in card} for card in child.iter("CardList")
+                              if card is not child]
+        elif child.tag in FIELDS:
+            setattr(response, FIELDS[child.tag], child.text)
 
-def parse_balance_from_confirm(xml_response):
-    """Находит balance из ответа card_list_response"""
-    try:
-        root = ElementTree.fromstring(xml_response)
-        namespaces = {"s": "http://schemas.xmlsoap.org/soap/envelope/", "ns2": "http://st.apus.com/"}
-        balance = root.find(".//s:Body/ns2:partnerConfirmCardResponse/return/Balance",
-                            namespaces=namespaces)
-        if balance is not None:
-            return balance.text
-        else:
-            logger.error("Баланс не найден в ответе")
-            raise ValueError("Balance not found in the response")
-    except ElementTree.ParseError as e:
-        logger.error(f"Ошибка при парсинге XML-ответа: {e}")
-        raise ValueError("Error parsing the XML response: " + str(e))
+    if response.balance is None and response.cards:
+        response.balance = response.cards[0].get("Balance")
+    return response
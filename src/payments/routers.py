@@ -1,10 +1,10 @@
-import xmltodict
+import time
 
-from uuid import UUID
-from xml.etree import ElementTree
+from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, Form, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Form, Header, Response, status
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
@@ -12,18 +12,21 @@ from sqlalchemy.orm import selectinload
 from config.settings import get_settings
 from logs.logger import logger
 from config.database import get_db
-from config.security import get_current_user, is_superuser
+from config.security import Principal, get_current_principal, get_current_user, is_superuser_principal
+from src.payments.card_registry import card_registry
+from src.payments.client import RequestNotSentError
+from src.payments.idempotency import ResultUnknownError, run_idempotent
 from src.payments.requests import card_response, confirm_card, get_all_cards, create_payment
-from src.payments.response_parser import parse_confirm_id, parse_uzcard_id, parse_card_phone, \
-    parse_balance_from_confirm, parse_transaction_id, parse_confirmation
-from src.payments.utils import convert_expiry_date
-from src.payments.redis import save_confirm_id, get_confirm_id, get_card, save_card, save_uzcard_id, get_uzcard_id, \
-    save_card_phone, save_balance, get_card_phone, save_transaction_id
-from src.users.models import Card, User
+from src.payments.response_parser import parse_upay_response
+from src.payments.utils import card_fingerprint, card_fingerprints, convert_expiry_date
+from src.payments.redis import PaymentSession
+from src.users.models import Card, Transaction, User
 
+settings = get_settings()
 STPimsApiPartnerKey = get_settings().STPimsApiPartnerKey
 LOGIN = get_settings().LOGIN
 PASSWORD = get_settings().PASSWORD
+SERVICE_ID = get_settings().SERVICE_ID
 
 router_payment = APIRouter(
     tags=["Payments"]
@@ -32,34 +35,35 @@ router_payment = APIRouter(
 
 @router_payment.get("/api/v1/cards/{user_uuid}/", status_code=status.HTTP_200_OK)
 async def get_cards(user_uuid: UUID,
-                    current_user: User = Depends(get_current_user)):
+                    fresh: bool = False,
+                    current_user: Principal = Depends(get_current_principal)):
     logger.info("Попытка получения кредитной карты пользователя с UUID: %s", user_uuid)
 
     try:
-        # Получение uzcard_id из Redis
-        uzcard_id = await get_uzcard_id(user_uuid)
+        # Получение uzcard_id и кеша списка карт из Redis
+        payment_session = PaymentSession(user_uuid)
+        uzcard_id, cached_cards, refreshed_at = await payment_session.get_cached_cards()
         if not uzcard_id:
             logger.error("Uzcard ID не найден или просрочен")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Uzcard ID not found or expired")
 
-        response = await get_all_cards(STPimsApiPartnerKey, uzcard_id, LOGIN, PASSWORD)
+        # Балансы обновляет BalanceRefresher, в UPAY идем только по ?fresh=true или если кеш устарел
+        if not fresh and cached_cards is not None and time.time() - refreshed_at <= settings.CARD_CACHE_MAX_AGE:
+            logger.success("Кредитная карта пользователя с UUID: %s получена из кеша", user_uuid)
+            return {"cards": cached_cards, "refreshed_at": refreshed_at, "cached": True}
 
-        # Парсинг ошибки
-        root = ElementTree.fromstring(response.text)
-        namespaces = {'s': 'http://schemas.xmlsoap.org/soap/envelope/', 'ns2': 'http://st.apus.com/'}
-        correct = root.find(".//s:Body/ns2:partnerCardListResponse/return/Result/code", namespaces=namespaces)
-        error = root.find(".//s:Body/ns2:partnerCardListResponse/return/Result/Description", namespaces=namespaces)
-        if correct is not None and correct.text != "OK":
-            logger.error(error.text)
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error.text)
+        response = await get_all_cards(STPimsApiPartnerKey, uzcard_id, LOGIN, PASSWORD)
 
-        xml_data = response.content
-        data_to_dict = xmltodict.parse(xml_data)
+        # Парсинг ответа и ошибки
+        result = parse_upay_response(response.content)
+        if not result.ok:
+            logger.error(result.description)
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result.description)
 
-        card_lst = data_to_dict.get("S:Envelope", {}).get("S:Body", {}).get("ns2:partnerCardListResponse", {}).get(
-            "return", {})
+        card_lst = result.as_dict()
+        refreshed_at = await payment_session.save_cards(card_lst, result.balance)
         logger.success("Кредитная карта пользователя с UUID: %s получена успешно", user_uuid)
-        return {"cards": card_lst}
+        return {"cards": card_lst, "refreshed_at": refreshed_at, "cached": False}
     except HTTPException as e:
         logger.error(str(e))
         raise HTTPException(status_code=e.status_code, detail=str(e))
@@ -69,15 +73,16 @@ async def get_cards(user_uuid: UUID,
 async def card_registration(
         card_number: str = Form(...),
         expiry_date: str = Form(..., description="Enter expiry date in format MM/YY"),
-        current_user: User = Depends(get_current_user),
-        db: AsyncSession = Depends(get_db)):
-    # Проверка наличия карты в базе данных
+        current_user: User = Depends(get_current_user)):
     logger.info("Попытка регистрации кредитной карты пользователь с UUID: %s", current_user.uuid)
 
-    # Проверка наличия карты в базе данных
-    card_number_hashed = hash_data(card_number)
-    existing_card = await db.scalar(select(Card).where(Card.card_number_hashed == card_number_hashed))
-    if existing_card:
+    # Проверка черного списка и наличия карты по отпечаткам всех версий ключа: новая карта - без запроса к таблице
+    fingerprints = card_fingerprints(card_number)
+    if await card_registry.is_blacklisted(fingerprints):
+        logger.error("Кредитная карта пользователя с UUID: %s находится в черном списке", current_user.uuid)
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Card is blacklisted")
+
+    if await card_registry.is_registered(fingerprints):
         logger.error("Кредитная карта пользователя с UUID: %s уже существует", current_user.uuid)
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Card already exist")
 
@@ -91,20 +96,15 @@ async def card_registration(
     # Отправка данных в платежный сервис
     response = await card_response(STPimsApiPartnerKey, card_number, formatted_expiry_date, LOGIN, PASSWORD)
 
-    # Парсинг ошибки
-    root = ElementTree.fromstring(response.text)
-    namespaces = {"s": "http://schemas.xmlsoap.org/soap/envelope/", "ns2": "http://st.apus.com/"}
-    correct = root.find(".//s:Body/ns2:partnerRegisterCardResponse/return/Result/code", namespaces=namespaces)
-    error = root.find(".//s:Body/ns2:partnerRegisterCardResponse/return/Result/Description", namespaces=namespaces)
-
-    if correct is not None and correct.text != "OK":
-        logger.error(error.text)
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error.text)
+    # Парсинг ответа и ошибки
+    result = parse_upay_response(response.content)
+    if not result.ok:
+        logger.error(result.description)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result.description)
 
     # Извлечение confirm_id из ответа
-    confirm_id = parse_confirm_id(response.text)
-    await save_confirm_id(current_user.id, confirm_id)
-    await save_card(current_user.id, card_number, formatted_expiry_date)
+    confirm_id = result.require("confirm_id")
+    await PaymentSession(current_user.uuid).start_registration(confirm_id, card_number, formatted_expiry_date)
     logger.success("СМС-код успешно отправлен пользователю с UUID: %s", current_user.uuid)
     return {"detail": "Sms code send successfully"}
 
@@ -137,44 +137,38 @@ async def card_confirmation(verify_code: int = Form(...),
                             current_user: User = Depends(get_current_user),
                             db: AsyncSession = Depends(get_db)):
     logger.info("Попытка подтверждения кредитной карты пользователем с UUID: %s", current_user.uuid)
-    # Получение confirm_id из Redis
-    confirm_id = await get_confirm_id(current_user.id)
+    # Получение confirm_id и данных карты из Redis одним запросом
+    payment_session = PaymentSession(current_user.uuid)
+    confirm_id, card_number, expiry_date = await payment_session.get_registration()
 
     if not confirm_id:
         logger.error("Confirmation ID не найдено")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Confirmation ID not found")
 
-    response = await confirm_card(STPimsApiPartnerKey, confirm_id, verify_code, LOGIN, PASSWORD)
-
-    # Парсинг ошибки
-    root = ElementTree.fromstring(response.text)
-    namespaces = {'s': 'http://schemas.xmlsoap.org/soap/envelope/', 'ns2': 'http://st.apus.com/'}
-    correct = root.find(".//s:Body/ns2:partnerConfirmCardResponse/return/Result/code", namespaces=namespaces)
-    error = root.find(".//s:Body/ns2:partnerConfirmCardResponse/return/Result/Description", namespaces=namespaces)
-    if correct is not None and correct.text != "OK":
-        logger.error(f"Ошибка при подтверждений кредитной карты: {error.text}")
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error.text)
-
-    # Получение хешированных данных карты из Redis
-    card_number, expiry_date = await get_card(current_user.id)
     if not card_number or not expiry_date:
         logger.error("Кредитная карта или срок действия карты не валиден")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Invalid card_number or expiry_date")
 
+    response = await confirm_card(STPimsApiPartnerKey, confirm_id, verify_code, LOGIN, PASSWORD)
+
+    # Парсинг ответа и ошибки
+    result = parse_upay_response(response.content)
+    if not result.ok:
+        logger.error(f"Ошибка при подтверждений кредитной карты: {result.description}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result.description)
+
     # Извлечение uzcard_id из ответа
-    uzcard_id = parse_uzcard_id(response.text)
-    card_phone = parse_card_phone(response.text)
-    balance = parse_balance_from_confirm(response.text)
-    await save_uzcard_id(current_user.id, uzcard_id)
-    await save_card_phone(current_user.id, card_phone)
-    await save_balance(current_user.id, balance)
+    uzcard_id = result.require("uzcard_id")
+    card_phone = result.require("card_phone")
+    balance = result.require("balance")
+    await payment_session.complete_registration(uzcard_id, card_phone, balance)
 
-    card_number_hashed = hash_data(card_number)
-    expiry_date_hashed = hash_data(expiry_date)
+    card_number_hashed = card_fingerprint(card_number)
+    expiry_date_hashed = card_fingerprint(expiry_date)
 
     try:
         new_card = Card(
-            user_id=current_user.id,
+            user_uuid=current_user.uuid,
             card_number_hashed=card_number_hashed,
             expiry_date_hashed=expiry_date_hashed,
             is_blacklisted=False
@@ -182,8 +176,14 @@ async def card_confirmation(verify_code: int = Form(...),
         db.add(new_card)
         await db.commit()
         await db.refresh(new_card)
+        await card_registry.add(card_number_hashed)
         logger.success("Кредитная карта пользователя: %s  добавлена успешно", current_user.uuid)
         return {"detail": "Card added successfully"}
+    except IntegrityError:
+        # Уникальный индекс отпечатка: карту успели добавить между регистрацией и подтверждением
+        logger.error("Кредитная карта пользователя с UUID: %s уже существует", current_user.uuid)
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Card already exist")
     except Exception as e:
         logger.error(f"Failed to save new card: {e}")
         await db.rollback()
@@ -210,55 +210,117 @@ async def card_confirmation(verify_code: int = Form(...),
 #         "detail": "Payment canceled",
 #     }
 
+async def replay_transaction(transaction: Transaction, amount: int) -> dict:
+    """Ответ на повтор платежа, уже записанного в таблицу транзакций"""
+    if transaction.amount != amount:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Idempotency-Key was already used with different parameters")
+    if transaction.status == "succeeded":
+        return {"detail": "Payment was successfully"}
+    if transaction.status in ("failed", "unconfirmed"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=transaction.error)
+    logger.error("Результат транзакции %s неизвестен", transaction.idempotency_key)
+    raise ResultUnknownError(status_code=status.HTTP_409_CONFLICT,
+                             detail="Payment with this Idempotency-Key is being processed")
+
+
+async def execute_payment(user_uuid: UUID, amount: int, idempotency_key: str,
+                          uzcard_id: str, card_phone: str, db: AsyncSession) -> dict:
+    # Транзакция записывается до запроса в UPAY: уникальный индекс не даст списать дважды,
+    # даже если ключ в Redis истек или Redis недоступен
+    transaction = Transaction(user_uuid=user_uuid, idempotency_key=idempotency_key, amount=amount, status="pending")
+    db.add(transaction)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        existing = await db.scalar(select(Transaction).where(Transaction.user_uuid == user_uuid,
+                                                             Transaction.idempotency_key == idempotency_key))
+        if existing is None:
+            # Конфликт не по ключу, а по внешнему ключу: пользователя нет (например, удален)
+            logger.error("Пользователь с UUID: %s не найден", user_uuid)
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        logger.info("Платеж с ключом %s уже записан", idempotency_key)
+        return await replay_transaction(existing, amount)
+
+    try:
+        response = await create_payment(STPimsApiPartnerKey, uzcard_id, card_phone, SERVICE_ID, user_uuid,
+                                        amount, LOGIN, PASSWORD)
+    except RequestNotSentError:
+        # Запрос не отправлен (предохранитель, изолятор): средства не списаны, ключ можно использовать снова
+        await db.delete(transaction)
+        await db.commit()
+        raise
+    except HTTPException as e:
+        # Ответ шлюза или прокси не 200 (в том числе 5xx и SOAP fault): запрос мог дойти до UPAY,
+        # транзакция остается pending до сверки, повтор с тем же ключом не спишет средства еще раз
+        transaction.error = f"UPAY HTTP {e.status_code}"
+        await db.commit()
+        raise ResultUnknownError(status_code=e.status_code, detail=e.detail)
+    # При других ошибках (таймаут после отправки) результат неизвестен, транзакция остается pending
+
+    # Парсинг ответа и ошибки
+    result = parse_upay_response(response.content)
+    if not result.ok:
+        logger.error("Ошибка при оплате по кредитной карте %s", result.description)
+        transaction.status, transaction.error = "failed", result.description
+        await db.commit()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result.description)
+
+    # Извлечение transaction_id из ответа
+    transaction.upay_transaction_id = result.require("transaction_id")
+    await PaymentSession(user_uuid).save_transaction(transaction.upay_transaction_id)
+
+    confirmed = result.require("confirmed")
+    if confirmed == "false":
+        logger.error("Ваша карта не привязана к вашему номеру телефона")
+        transaction.status, transaction.error = "unconfirmed", "Your card not connected to your phone_number"
+        await db.commit()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Your card not connected to your phone_number")
+
+    transaction.status = "succeeded"
+    await db.commit()
+    logger.success("С пользователя с UUID: %s успешно сняты средства", user_uuid)
+    return {"detail": "Payment was successfully"}
+
+
 @router_payment.post("/api/v1/cards/pay/{user_uuid}/", status_code=status.HTTP_200_OK)
 async def card_payment(user_uuid: UUID,
-                       amount: int):
+                       amount: int,
+                       idempotency_key: str | None = Header(None, alias="Idempotency-Key",
+                                                            min_length=1, max_length=64),
+                       db: AsyncSession = Depends(get_db)):
     logger.info("Попытка снятия средств с карты пользователя с UUID: %s", user_uuid)
 
-    uzcard_id = await get_uzcard_id(user_uuid)
+    card = await PaymentSession(user_uuid).get_card()
+    uzcard_id, card_phone = card["uzcard_id"], card["card_phone"]
     if not uzcard_id:
         logger.error("Uzcard ID не найден")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Uzcard ID not found")
 
-    card_phone = await get_card_phone(user_uuid)
     if not card_phone:
         logger.error("Номер телефона карты не найден")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Card phone number not found")
 
-    response = await create_payment(STPimsApiPartnerKey, uzcard_id, card_phone, SERVICE_ID, user_uuid,
-                                    amount, LOGIN, PASSWORD)
-
-    # Парсинг ошибки
-    root = ElementTree.fromstring(response.text)
-    namespaces = {'s': 'http://schemas.xmlsoap.org/soap/envelope/', 'ns2': 'http://st.apus.com/'}
-    correct = root.find(".//s:Body/ns2:partnerPaymentResponse/return/Result/code", namespaces=namespaces)
-    error = root.find(".//s:Body/ns2:partnerPaymentResponse/return/Result/Description", namespaces=namespaces)
-    if correct is not None and correct.text != "OK":
-        logger.error("Ошибка при оплате по кредитной карте %s", error.text)
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error.text)
-
-    # Извлечение uzcard_id из ответа
-    transaction = parse_transaction_id(response.text)
-    await save_transaction_id(user_uuid, transaction)
+    if idempotency_key is None:
+        # Клиенты без заголовка работают как раньше: каждый запрос - отдельный платеж без защиты от повтора
+        return await execute_payment(user_uuid, amount, uuid4().hex, uzcard_id, card_phone, db)
 
-    confirmed = parse_confirmation(response.text)
-    if confirmed == "false":
-        logger.error("Ваша карта не привязана к вашему номеру телефона")
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail="Your card not connected to your phone_number")
-
-    logger.success("С пользователя с UUID: %s успешно сняты средства", user_uuid)
-    return {"detail": "Payment was successfully"}
+    # Повтор с тем же Idempotency-Key (например, после таймаута у клиента) не списывает средства повторно
+    return await run_idempotent(f"payment:{user_uuid}", idempotency_key, {"amount": amount},
+                                lambda: execute_payment(user_uuid, amount, idempotency_key,
+                                                        uzcard_id, card_phone, db))
 
 
 @router_payment.delete("/api/v1/cards/delete/{card_id}/", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_card(card_id: int,
                       user_uuid: UUID,
-                      current_user: User = Depends(get_current_user),
+                      current_user: Principal = Depends(get_current_principal),
                       db: AsyncSession = Depends(get_db)):
     logger.info("Попытка удаления кредитной карты с ID: %s", card_id)
 
-    if "SUPERUSER" not in [role.name for role in current_user.roles] and user_uuid != current_user.uuid:
+    if not current_user.is_superuser and user_uuid != current_user.uuid:
         logger.error("Доступ запрещен: У вас недостаточно прав")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Access denied: You don't have enough privileges")
@@ -271,6 +333,9 @@ async def delete_card(card_id: int,
 
     await db.delete(card)
     await db.commit()
+    await card_registry.remove(card.card_number_hashed)
+    if card.is_blacklisted:
+        await card_registry.refresh_blacklist()
     logger.success("Карта с ID: %s успешно удалена", card_id)
     return Response(status.HTTP_204_NO_CONTENT)
 
@@ -278,7 +343,7 @@ async def delete_card(card_id: int,
 @router_payment.post("/api/v1/black-list/add/cards/{card_id}/", status_code=status.HTTP_200_OK)
 async def add_blacklist_card(card_id: int,
                              db: AsyncSession = Depends(get_db),
-                             current_user: User = Depends(is_superuser)):
+                             current_user: Principal = Depends(is_superuser_principal)):
     logger.info(f"Попытка добавить кредитную карту с ID: {card_id} в черный список")
 
     card = await db.scalar(select(Card).where(Card.id == card_id))
@@ -295,6 +360,7 @@ async def add_blacklist_card(card_id: int,
     db.add(card)
     await db.commit()
     await db.refresh(card)
+    await card_registry.refresh_blacklist()
 
     logger.success(f"Кредитная карта с ID: {card_id} добавлена в черный список успешно")
     return {"detail": f"Card with ID: {card_id} has been blacklisted successfully"}
@@ -303,7 +369,7 @@ async def add_blacklist_card(card_id: int,
 @router_payment.post("/api/v1/black-list/remove/cards/{card_id}/", status_code=status.HTTP_200_OK)
 async def remove_blacklist_card(card_id: int,
                                 db: AsyncSession = Depends(get_db),
-                                current_user: User = Depends(is_superuser)):
+                                current_user: Principal = Depends(is_superuser_principal)):
     logger.info(f"Попытка добавить кредитную карту с ID: {card_id} в черный список")
 
     card = await db.scalar(select(Card).where(Card.id == card_id))
@@ -318,6 +384,7 @@ async def remove_blacklist_card(card_id: int,
     db.add(card)
     await db.commit()
     await db.refresh(card)
+    await card_registry.refresh_blacklist()
 
     logger.success(f"Кредитная карта с ID: {card_id} удалена из черный список успешно")
     return {"detail": f"Card with ID: {card_id} has been removed from blacklist successfully"}
@@ -0,0 +1,94 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from src.payments.card_registry import CARD_FINGERPRINTS_KEY, LOADED_MARKER, CardRegistry
+
+# Отпечатки одной карты по текущему и старому ключу
+FINGERPRINTS = ["v2:current", "v1:old"]
+
+
+# Фикстура для мокированной сессии базы данных
+@pytest.fixture
+def mock_db_session():
+    """
+    Подменяет AsyncSessionLocal реестра карт.
+    scalar() - поиск карты по отпечатку (по умолчанию не найдена),
+    scalars() - отпечатки карт из черного списка.
+    """
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.scalar.return_value = None
+    mock_session.scalars.return_value = ["v1:old"]
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__.return_value = mock_session
+    with patch("src.payments.card_registry.AsyncSessionLocal", session_factory):
+        yield mock_session
+
+
+# Фикстура для мокированного клиента Redis
+@pytest.fixture
+def mock_redis():
+    """Загруженное множество отпечатков без карт из FINGERPRINTS"""
+    redis = MagicMock()
+    redis.smismember = AsyncMock(return_value=[1, 0, 0])
+    with patch("src.payments.card_registry.get_redis_client", return_value=redis):
+        yield redis
+
+
+# Отсутствие отпечатка в загруженном множестве завершает проверку без запроса в базу данных
+@pytest.mark.asyncio
+async def test_unknown_card_skips_database(mock_db_session, mock_redis):
+    assert await CardRegistry().is_registered(FINGERPRINTS) is False
+
+    mock_redis.smismember.assert_awaited_once_with(CARD_FINGERPRINTS_KEY, [LOADED_MARKER, *FINGERPRINTS])
+    mock_db_session.scalar.assert_not_called()
+
+
+# Совпадение по старой версии ключа подтверждается запросом по уникальному индексу
+@pytest.mark.asyncio
+async def test_match_is_confirmed_by_database(mock_db_session, mock_redis):
+    mock_redis.smismember.return_value = [1, 0, 1]
+    mock_db_session.scalar.return_value = 42
+
+    assert await CardRegistry().is_registered(FINGERPRINTS) is True
+
+
+# Устаревший член множества (карта уже удалена) не блокирует регистрацию
+@pytest.mark.asyncio
+async def test_stale_match_does_not_block(mock_db_session, mock_redis):
+    mock_redis.smismember.return_value = [1, 1, 0]
+
+    assert await CardRegistry().is_registered(FINGERPRINTS) is False
+    mock_db_session.scalar.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_unloaded_set_falls_back_to_database(mock_db_session, mock_redis):
+    mock_redis.smismember.return_value = [0, 0, 0]
+    registry = CardRegistry()
+
+    with patch.object(registry, "start_load_fingerprints") as start_load:
+        assert await registry.is_registered(FINGERPRINTS) is False
+
+    start_load.assert_called_once()
+    mock_db_session.scalar.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_redis_error_falls_back_to_database(mock_db_session, mock_redis):
+    mock_redis.smismember.side_effect = ConnectionError("Redis is down")
+
+    assert await CardRegistry().is_registered(FINGERPRINTS) is False
+    mock_db_session.scalar.assert_awaited_once()
+
+
+# Карта из черного списка находится и после смены ключа
+@pytest.mark.asyncio
+async def test_blacklisted_card_is_found_by_old_key(mock_db_session):
+    registry = CardRegistry()
+
+    assert await registry.is_blacklisted(FINGERPRINTS) is True
+    assert await registry.is_blacklisted(["v2:other"]) is False
+    mock_db_session.scalars.assert_awaited_once()
@@ -0,0 +1,50 @@
+from xml.etree import ElementTree
+
+import pytest
+
+from src.payments.envelopes import CARD_LIST, PAYMENT, REGISTER_CARD
+
+NAMESPACES = {"soapenv": "http://schemas.xmlsoap.org/soap/envelope/", "st": "http://st.apus.com/"}
+
+
+def request_fields(envelope: bytes, operation: str) -> dict:
+    """Разбирает конверт и возвращает поля {operation}Request"""
+    root = ElementTree.fromstring(envelope)
+    request = root.find(f"soapenv:Body/st:{operation}/{operation}Request", NAMESPACES)
+    return {child.tag: child.text or "" for child in request}
+
+
+def test_fields_and_static_values_are_filled():
+    envelope = REGISTER_CARD.build("partner-key", "token", "8600123412341234", "2712")
+
+    assert request_fields(envelope, "partnerRegisterCard") == {
+        "StPimsApiPartnerKey": "partner-key", "AccessToken": "token", "CardNumber": "8600123412341234",
+        "ExDate": "2712", "Version": "1", "Lang": "ru"}
+
+
+# Спецсимволы XML экранируются и не меняют структуру конверта
+@pytest.mark.parametrize("value", ["a&b", "<b>", "1 > 0", "</AccessToken><CardList>1</CardList>", "100%", "%s"])
+def test_special_characters_are_escaped(value):
+    envelope = CARD_LIST.build("partner-key", value, "1")
+
+    assert request_fields(envelope, "partnerCardList")["AccessToken"] == value
+    assert request_fields(envelope, "partnerCardList")["CardList"] == "1"
+
+
+def test_static_fields_are_not_passed_by_caller():
+    envelope = PAYMENT.build("partner-key", "token", "998901234567", "uzcard-id", "1", "user-uuid", 50000)
+    fields = request_fields(envelope, "partnerPayment")
+
+    assert fields["AmountInTiyin"] == "50000"
+    assert (fields["PaymentType"], fields["RegionId"], fields["SubRegionId"]) == ("", "", "")
+
+
+def test_none_becomes_empty_field():
+    envelope = CARD_LIST.build("partner-key", None, "1")
+
+    assert request_fields(envelope, "partnerCardList")["AccessToken"] == ""
+
+
+def test_wrong_number_of_values_is_rejected():
+    with pytest.raises(ValueError):
+        REGISTER_CARD.build("partner-key", "token", "8600123412341234")
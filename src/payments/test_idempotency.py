@@ -0,0 +1,168 @@
+import asyncio
+import uuid
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from src.payments.idempotency import ResultUnknownError, idempotency_key, request_fingerprint, run_idempotent
+from src.payments.routers import execute_payment
+from src.users.models import Transaction
+
+USER_UUID = uuid.UUID("efdb6be5-1d62-4925-9f32-b0705b6eb9a3")
+SCOPE = f"payment:{USER_UUID}"
+PARAMS = {"amount": 50000}
+
+
+# Фикстура для мокированного Redis
+@pytest.fixture
+def mock_redis():
+    """
+    Захват ключа (Lua-скрипт begin) подменяется целиком: по умолчанию ключ свободен.
+    Результат сохраняется через pipeline, ключ освобождается через delete.
+    """
+    redis = MagicMock()
+    redis.delete = AsyncMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    redis.pipeline.return_value.__aenter__.return_value = pipe
+    with patch("src.payments.idempotency.get_redis_client", return_value=redis), \
+            patch("src.payments.idempotency.begin", AsyncMock(return_value={})) as begin:
+        yield redis, begin
+
+
+def saved_result(redis: MagicMock) -> dict | None:
+    pipe = redis.pipeline.return_value.__aenter__.return_value
+    return pipe.hset.call_args.kwargs["mapping"] if pipe.hset.called else None
+
+
+@pytest.mark.asyncio
+async def test_first_request_is_executed_and_saved(mock_redis):
+    redis, begin = mock_redis
+    func = AsyncMock(return_value={"detail": "Payment was successfully"})
+
+    assert await run_idempotent(SCOPE, "key-1", PARAMS, func) == {"detail": "Payment was successfully"}
+    func.assert_awaited_once()
+    assert saved_result(redis) == {"state": "done", "status_code": 200,
+                                   "body": '{"detail": "Payment was successfully"}'}
+    begin.assert_awaited_once_with(idempotency_key(SCOPE, "key-1"), request_fingerprint(PARAMS))
+
+
+# Повтор после завершения получает сохраненный ответ, средства не списываются повторно
+@pytest.mark.asyncio
+async def test_completed_request_is_replayed(mock_redis):
+    _, begin = mock_redis
+    begin.return_value = {"state": "done", "fingerprint": request_fingerprint(PARAMS),
+                          "status_code": "200", "body": '{"detail": "Payment was successfully"}'}
+    func = AsyncMock()
+
+    assert await run_idempotent(SCOPE, "key-1", PARAMS, func) == {"detail": "Payment was successfully"}
+    func.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_saved_provider_error_is_replayed(mock_redis):
+    _, begin = mock_redis
+    begin.return_value = {"state": "done", "fingerprint": request_fingerprint(PARAMS),
+                          "status_code": "400", "body": '"Insufficient funds"'}
+
+    with pytest.raises(HTTPException) as error:
+        await run_idempotent(SCOPE, "key-1", PARAMS, AsyncMock())
+
+    assert (error.value.status_code, error.value.detail) == (400, "Insufficient funds")
+
+
+@pytest.mark.asyncio
+async def test_same_key_with_other_params_is_rejected(mock_redis):
+    _, begin = mock_redis
+    begin.return_value = {"state": "in_flight", "fingerprint": request_fingerprint({"amount": 1})}
+
+    with pytest.raises(HTTPException) as error:
+        await run_idempotent(SCOPE, "key-1", PARAMS, AsyncMock())
+
+    assert error.value.status_code == 422
+
+
+# Дубликаты внутри процесса ждут первого запроса, а не выполняют его повторно
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_execute_once(mock_redis):
+    async def pay():
+        await asyncio.sleep(0.01)
+        return {"detail": "Payment was successfully"}
+
+    func = AsyncMock(side_effect=pay)
+
+    results = await asyncio.gather(*(run_idempotent(SCOPE, "key-1", PARAMS, func) for _ in range(5)))
+
+    assert results == [{"detail": "Payment was successfully"}] * 5
+    func.assert_awaited_once()
+
+
+# Неизвестный исход и ошибки 5xx не сохраняются: ключ освобождается для повтора
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [ResultUnknownError(status_code=409, detail="pending"),
+                                   HTTPException(status_code=502, detail="Bad Gateway")])
+async def test_unfinished_request_releases_key(mock_redis, error):
+    redis, _ = mock_redis
+
+    with pytest.raises(HTTPException):
+        await run_idempotent(SCOPE, "key-1", PARAMS, AsyncMock(side_effect=error))
+
+    redis.delete.assert_awaited_once_with(idempotency_key(SCOPE, "key-1"))
+    assert saved_result(redis) is None
+
+
+# Без Redis запрос выполняется: повторное списание предотвращает уникальный индекс таблицы транзакций
+@pytest.mark.asyncio
+async def test_redis_failure_still_executes(mock_redis):
+    _, begin = mock_redis
+    begin.side_effect = ConnectionError("Redis is down")
+    func = AsyncMock(return_value={"detail": "Payment was successfully"})
+
+    assert await run_idempotent(SCOPE, "key-1", PARAMS, func) == {"detail": "Payment was successfully"}
+    func.assert_awaited_once()
+
+
+def mock_db_session(existing: Transaction | None) -> AsyncMock:
+    """Сессия, в которой вставка транзакции нарушает ограничение, а select возвращает existing"""
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.add = MagicMock()
+    mock_session.commit.side_effect = IntegrityError("INSERT INTO transactions", {}, Exception())
+    mock_session.scalar.return_value = existing
+    return mock_session
+
+
+# Ключ уже записан в таблицу транзакций (например, Redis потерял результат): ответ по сохраненному статусу
+@pytest.mark.asyncio
+async def test_recorded_transaction_is_replayed():
+    existing = Transaction(user_uuid=USER_UUID, idempotency_key="key-1", amount=50000, status="succeeded")
+
+    with patch("src.payments.routers.create_payment") as create_payment:
+        result = await execute_payment(USER_UUID, 50000, "key-1", "uzcard-id", "998901234567",
+                                       mock_db_session(existing))
+
+    assert result == {"detail": "Payment was successfully"}
+    create_payment.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_pending_transaction_is_not_final():
+    existing = Transaction(user_uuid=USER_UUID, idempotency_key="key-1", amount=50000, status="pending")
+
+    with pytest.raises(ResultUnknownError) as error:
+        await execute_payment(USER_UUID, 50000, "key-1", "uzcard-id", "998901234567", mock_db_session(existing))
+
+    assert error.value.status_code == 409
+
+
+# Нарушено ограничение внешнего ключа: пользователя нет, повторять нечего
+@pytest.mark.asyncio
+async def test_missing_user_is_not_found():
+    with pytest.raises(HTTPException) as error:
+        await execute_payment(USER_UUID, 50000, "key-1", "uzcard-id", "998901234567", mock_db_session(None))
+
+    assert error.value.status_code == 404
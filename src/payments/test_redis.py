@@ -0,0 +1,104 @@
+import json
+import uuid
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from config.settings import get_settings
+from src.payments.redis import ACTIVE_CARDS_KEY, CARD_FIELDS, PENDING_FIELDS, PaymentSession, payment_key, pending_key
+
+settings = get_settings()
+
+USER_UUID = uuid.UUID("efdb6be5-1d62-4925-9f32-b0705b6eb9a3")
+
+
+# Фикстура для мокированного клиента Redis
+@pytest.fixture
+def mock_redis():
+    """
+    Подменяет общий клиент Redis моком.
+    Команды pipeline ставятся в очередь синхронно, execute() ожидается один раз на шаг.
+    """
+    redis = MagicMock()
+    redis.hmget = AsyncMock(return_value=[None] * len(CARD_FIELDS))
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    redis.pipeline.return_value.__aenter__.return_value = pipe
+    with patch("src.payments.redis.get_redis_client", return_value=redis):
+        yield redis
+
+
+def pipeline_of(redis: MagicMock) -> MagicMock:
+    return redis.pipeline.return_value.__aenter__.return_value
+
+
+# Повторная регистрация заменяет предыдущую, данные карты живут PAYMENT_PENDING_TTL
+@pytest.mark.asyncio
+async def test_registration_is_started_in_one_transaction(mock_redis):
+    await PaymentSession(USER_UUID).start_registration("confirm-id", "8600123412341234", "2712")
+
+    pipe = pipeline_of(mock_redis)
+    mock_redis.pipeline.assert_called_once_with(transaction=True)
+    pipe.delete.assert_called_once_with(pending_key(USER_UUID))
+    pipe.hset.assert_called_once_with(pending_key(USER_UUID), mapping={
+        "confirm_id": "confirm-id", "card_number": "8600123412341234", "expiry_date": "2712"})
+    pipe.expire.assert_called_once_with(pending_key(USER_UUID), settings.PAYMENT_PENDING_TTL)
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_registration_is_read_in_one_command(mock_redis):
+    mock_redis.hmget.return_value = ["confirm-id", "8600123412341234", "2712"]
+
+    assert await PaymentSession(USER_UUID).get_registration() == ("confirm-id", "8600123412341234", "2712")
+    mock_redis.hmget.assert_awaited_once_with(pending_key(USER_UUID), PENDING_FIELDS)
+
+
+# Привязка карты, сброс кеша прежней карты и удаление данных регистрации - одна транзакция
+@pytest.mark.asyncio
+async def test_registration_is_completed_in_one_transaction(mock_redis):
+    await PaymentSession(USER_UUID).complete_registration("uzcard-id", "998901234567", "1000")
+
+    pipe = pipeline_of(mock_redis)
+    mock_redis.pipeline.assert_called_once_with(transaction=True)
+    pipe.hset.assert_called_once_with(payment_key(USER_UUID), mapping={
+        "uzcard_id": "uzcard-id", "card_phone": "998901234567", "balance": "1000"})
+    pipe.hdel.assert_called_once_with(payment_key(USER_UUID), "transaction_id", "cards", "refreshed_at")
+    pipe.delete.assert_called_once_with(pending_key(USER_UUID))
+    assert pipe.zadd.call_args.args[0] == ACTIVE_CARDS_KEY
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_missing_card_fields_are_none(mock_redis):
+    mock_redis.hmget.return_value = ["uzcard-id", None, None, None]
+
+    assert await PaymentSession(USER_UUID).get_card() == {
+        "uzcard_id": "uzcard-id", "card_phone": None, "balance": None, "transaction_id": None}
+
+
+# Недоступный Redis не ломает обработчик: поля считаются отсутствующими
+@pytest.mark.asyncio
+async def test_redis_error_reads_as_empty_state(mock_redis):
+    mock_redis.hmget.side_effect = ConnectionError("Redis is down")
+    session = PaymentSession(USER_UUID)
+
+    assert await session.get_registration() == (None, None, None)
+    assert await session.get_card() == dict.fromkeys(CARD_FIELDS)
+
+
+@pytest.mark.asyncio
+async def test_cached_cards_are_decoded(mock_redis):
+    cards = {"cards": [{"uzcard_id": "uzcard-id", "balance": "1000"}]}
+    pipeline_of(mock_redis).execute.return_value = [["uzcard-id", json.dumps(cards), "1728043281.5"], 1]
+
+    assert await PaymentSession(USER_UUID).get_cached_cards() == ("uzcard-id", cards, 1728043281.5)
+
+
+@pytest.mark.asyncio
+async def test_cached_cards_miss_keeps_uzcard_id(mock_redis):
+    pipeline_of(mock_redis).execute.return_value = [["uzcard-id", None, None], 1]
+
+    assert await PaymentSession(USER_UUID).get_cached_cards() == ("uzcard-id", None, None)
@@ -0,0 +1,60 @@
+import pytest
+
+from src.payments.utils import card_fingerprint, card_fingerprints, card_hash_keys
+
+CARD_NUMBER = "8600 1234 1234 1234"
+
+
+# Фикстура для ключей HMAC отпечатков карт
+@pytest.fixture
+def hash_keys(monkeypatch):
+    """
+    Возвращает функцию, которая задает переменную окружения CARD_HASH_KEYS.
+    Ключи кешируются при первом обращении, поэтому кеш сбрасывается при каждой смене и после теста.
+    """
+    def configure(value: str | None):
+        if value is None:
+            monkeypatch.delenv("CARD_HASH_KEYS", raising=False)
+        else:
+            monkeypatch.setenv("CARD_HASH_KEYS", value)
+        card_hash_keys.cache_clear()
+
+    yield configure
+    card_hash_keys.cache_clear()
+
+
+def test_fingerprint_uses_current_key(hash_keys):
+    hash_keys("v2:new-secret, v1:old-secret")
+
+    fingerprint = card_fingerprint(CARD_NUMBER)
+
+    assert fingerprint.startswith("v2:") and len(fingerprint) == len("v2:") + 64
+    # Пробелы в номере карты не меняют отпечаток
+    assert fingerprint == card_fingerprint(CARD_NUMBER.replace(" ", ""))
+
+
+# Карта, добавленная до смены ключа, находится по отпечатку старой версии
+def test_card_added_before_rotation_is_found(hash_keys):
+    hash_keys("v1:old-secret")
+    stored = card_fingerprint(CARD_NUMBER)
+
+    hash_keys("v2:new-secret,v1:old-secret")
+
+    assert card_fingerprint(CARD_NUMBER) != stored
+    assert card_fingerprints(CARD_NUMBER) == [card_fingerprint(CARD_NUMBER), stored]
+
+
+def test_fingerprint_depends_on_key(hash_keys):
+    hash_keys("v1:first-secret")
+    first = card_fingerprint(CARD_NUMBER)
+    hash_keys("v1:second-secret")
+
+    assert card_fingerprint(CARD_NUMBER) != first
+
+
+@pytest.mark.parametrize("value", [None, "", "v1", ":secret", " , "])
+def test_missing_keys_are_a_configuration_error(hash_keys, value):
+    hash_keys(value)
+
+    with pytest.raises(RuntimeError):
+        card_hash_keys()
@@ -1,7 +1,10 @@
 import hashlib
+import hmac
 
-from logs.logger import logger
+from functools import lru_cache
 
+from config.settings import get_settings
+from logs.logger import logger
 
 
 def generate_access_token(login, card_number, expiry_date, password):
@@ -72,3 +75,27 @@ def generate_cancel_transaction_token(login, transaction_id, password):
     return md5_hash
 
 
+@lru_cache(maxsize=1)
+def card_hash_keys() -> tuple[tuple[str, bytes], ...]:
+    """Ключи HMAC из CARD_HASH_KEYS ("версия:ключ" через запятую), первый - текущий"""
+    keys = []
+    for item in (get_settings().CARD_HASH_KEYS or "").split(","):
+        version, _, key = item.strip().partition(":")
+        if version and key:
+            keys.append((version, key.encode()))
+    if not keys:
+        raise RuntimeError("CARD_HASH_KEYS is not configured")
+    return tuple(keys)
+
+
+def card_fingerprint(value: str, version: str = None) -> str:
+    """Отпечаток данных карты: HMAC-SHA256 с версией ключа, {версия}:{hex}"""
+    keys = dict(card_hash_keys())
+    version = version or card_hash_keys()[0][0]
+    digest = hmac.new(keys[version], value.replace(" ", "").encode(), hashlib.sha256).hexdigest()
+    return f"{version}:{digest}"
+
+
+def card_fingerprints(value: str) -> list[str]:
+    """Отпечатки по всем ключам: карты, добавленные до смены ключа, находятся по старой версии"""
+    return [card_fingerprint(value, version) for version, _ in card_hash_keys()]
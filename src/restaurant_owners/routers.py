@@ -1,22 +1,26 @@
 import jwt
 
+from typing import Union
 from uuid import UUID
 
 from fastapi import APIRouter, Form, Depends, HTTPException, Response, Request, status
-from fastapi_pagination import Page, paginate
-from sqlalchemy import asc
+from fastapi_pagination import Page
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from config.settings import get_settings
-from config.security import create_access_token, create_refresh_token, get_api_key, is_restaurant_owner, is_superuser
+from config.security import create_access_token, create_refresh_token, get_api_key, Principal, \
+    get_current_principal, is_superuser_principal, get_db_read
 from config.database import get_db
 from languages.routers import load_translations, default_language, get_language_user
 from logs.logger import logger
 from src.superusers.utils import validate_password, validate_username
 from src.restaurant_owners.schemas import RestaurantOwnerSchemas, RestaurantOwnerDetailSchemas, RestaurantOwnerUpdate
-from src.users.models import User, Role
+from src.users.models import User
+from src.users.pagination import CursorPage, PaginationParams, paginate_users
+from src.users.redis import get_cached_profile, cache_profile, invalidate_profile
+from src.users.roles import role_registry
 
 settings = get_settings()
 
@@ -33,7 +37,7 @@ async def sign_up(username: str = Form(...),
                   db: AsyncSession = Depends(get_db)):
     logger.info("Попытка создать владельца ресторана с именем пользователя: %s", username)
 
-    role = await db.scalar(select(Role).where(Role.title == "restaurant_owner"))
+    role = await role_registry.get("restaurant_owner")
 
     if role is None:
         logger.error("Роль: restaurant_owner не найдена")
@@ -49,7 +53,7 @@ async def sign_up(username: str = Form(...),
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Username already exist")
 
     new_restaurant_owner = User(username=validate_username(username), role_id=role.id)
-    new_restaurant_owner.set_password(validate_password(password))
+    await new_restaurant_owner.set_password(validate_password(password))
 
     db.add(new_restaurant_owner)
     await db.commit()
@@ -75,11 +79,17 @@ async def sign_in(
         .where(User.roles.has(title="restaurant_owner"), User.username == username)
     )
 
-    if restaurant_owner is None or not restaurant_owner.verify_password(password):
+    if restaurant_owner is None or not await restaurant_owner.verify_password(password):
         logger.error("Не верное имя пользователя или пароль")
         error_msg = translations.get("re_error")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error_msg)
 
+    if restaurant_owner.password_needs_rehash():
+        # cost factor изменился, пароль известен только в момент входа
+        await restaurant_owner.set_password(password)
+        await db.commit()
+        logger.info("Хеш пароля владельца ресторана %s обновлен", username)
+
     access_token = create_access_token(
         data={"user_uuid": restaurant_owner.uuid, "role": restaurant_owner.roles.title})
     refresh_token = create_refresh_token(
@@ -97,8 +107,7 @@ async def sign_in(
 
 
 @router_restaurant_owner.post("/auth/restaurant-owners/token/refresh", status_code=status.HTTP_201_CREATED)
-async def refresh_token(refresh_token: str = Form(...),
-                        db: AsyncSession = Depends(get_db)):
+async def refresh_token(refresh_token: str = Form(...)):
     logger.info("Попытка создания refresh token")
 
     try:
@@ -115,7 +124,10 @@ async def refresh_token(refresh_token: str = Form(...),
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Token invalid")
 
-    restaurant_owner_role = await db.scalar(select(Role).where(Role.title == "restaurant_owner"))
+    restaurant_owner_role = await role_registry.get("restaurant_owner")
+    if restaurant_owner_role is None:
+        logger.error("Роль: restaurant_owner не найдена")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Role not found")
 
     access_token = create_access_token(data={"user_uuid": user_uuid, "role": restaurant_owner_role.title})
 
@@ -124,37 +136,44 @@ async def refresh_token(refresh_token: str = Form(...),
 
 
 # TODO: сделать поиск по username
-@router_restaurant_owner.get("/restaurant-owners/", response_model=Page[RestaurantOwnerSchemas],
+@router_restaurant_owner.get("/restaurant-owners/",
+                             response_model=Union[Page[RestaurantOwnerSchemas],
+                                                  CursorPage[RestaurantOwnerSchemas]],
                              status_code=status.HTTP_200_OK)
 async def get_restaurant_owners(
-        current_user: User = Depends(is_superuser),
-        db: AsyncSession = Depends(get_db)):
+        pagination: PaginationParams = Depends(),
+        current_user: Principal = Depends(is_superuser_principal),
+        db: AsyncSession = Depends(get_db_read)):
     logger.info("Попытка получения всех редакторов ресторана")
 
-    stmt = await db.scalars(
+    query = (
         select(User)
         .options(selectinload(User.roles))
         .where(User.roles.has(title="restaurant_owner"))
-        .order_by(asc(User.uuid))
     )
-    restaurant_owners = stmt.all()
+    restaurant_owners = await paginate_users(db, query, pagination, RestaurantOwnerSchemas)
 
     logger.success("Все редакторы получены успешно")
-    return paginate(restaurant_owners)
+    return restaurant_owners
 
 
 @router_restaurant_owner.get("/restaurant-owners/{user_uuid}", response_model=RestaurantOwnerDetailSchemas,
                              status_code=status.HTTP_200_OK)
 async def get_restaurant_owners_by_uuid(user_uuid: UUID,
-                                        current_user: User = Depends(is_restaurant_owner),
-                                        db: AsyncSession = Depends(get_db)):
+                                        current_user: Principal = Depends(get_current_principal),
+                                        db: AsyncSession = Depends(get_db_read)):
     logger.info("Попытка получить владельца ресторанов с UUID: %s", user_uuid)
 
-    if current_user != "superuser" and current_user.uuid != user_uuid:
+    if not current_user.is_superuser and current_user.uuid != user_uuid:
         logger.error("Доступ запрещен: У вас недостаточно прав")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Access denied: You don't have enough privileges")
 
+    cached_restaurant_owner = await get_cached_profile("restaurant_owner", user_uuid, RestaurantOwnerDetailSchemas)
+    if cached_restaurant_owner is not None:
+        logger.success("Владелец ресторана с UUID: %s получен из кеша", user_uuid)
+        return cached_restaurant_owner
+
     restaurant_owner = await db.scalar(
         select(User)
         .options(selectinload(User.media),
@@ -166,8 +185,11 @@ async def get_restaurant_owners_by_uuid(user_uuid: UUID,
         logger.error("Владелец ресторана c UUID: %s не найден", user_uuid)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Restaurant owner not found")
 
+    restaurant_owner_detail = RestaurantOwnerDetailSchemas.from_orm(restaurant_owner)
+    await cache_profile("restaurant_owner", user_uuid, restaurant_owner_detail)
+
     logger.success("Владелец ресторана с UUID: %s получен успешно", user_uuid)
-    return RestaurantOwnerDetailSchemas.from_orm(restaurant_owner)
+    return restaurant_owner_detail
 
 
 @router_restaurant_owner.put("/restaurant-owners/{user_uuid}",
@@ -175,11 +197,11 @@ async def get_restaurant_owners_by_uuid(user_uuid: UUID,
                              status_code=status.HTTP_200_OK)
 async def update_restaurant_owner(user_uuid: UUID,
                                   objects: RestaurantOwnerUpdate,
-                                  current_user: User = Depends(is_restaurant_owner),
+                                  current_user: Principal = Depends(get_current_principal),
                                   db: AsyncSession = Depends(get_db)):
     logger.info("Попытка обновить владельца ресторана с UUID: %s", user_uuid)
 
-    if current_user != "superuser" and current_user.uuid != user_uuid:
+    if not current_user.is_superuser and current_user.uuid != user_uuid:
         logger.error("Доступ запрещен: У вас недостаточно прав")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Access denied: You don't have enough privileges")
@@ -218,6 +240,7 @@ async def update_restaurant_owner(user_uuid: UUID,
     db.add(restaurant_owner)
     await db.commit()
     await db.refresh(restaurant_owner)
+    await invalidate_profile(user_uuid)
     logger.success(f"Владелец ресторана c UUID: {user_uuid} успешно обновлен")
     return RestaurantOwnerSchemas.from_orm(restaurant_owner)
 
@@ -225,11 +248,11 @@ async def update_restaurant_owner(user_uuid: UUID,
 @router_restaurant_owner.delete("/restaurant-owners/{user_uuid}",
                                 status_code=status.HTTP_204_NO_CONTENT)
 async def restaurant_owner_delete(user_uuid: UUID,
-                                  current_user: User = Depends(is_restaurant_owner),
+                                  current_user: Principal = Depends(get_current_principal),
                                   db: AsyncSession = Depends(get_db)):
     logger.info("Попытка удаления владельца ресторана с UUID: %s", user_uuid)
 
-    if current_user != "superuser" and current_user.uuid != user_uuid:
+    if not current_user.is_superuser and current_user.uuid != user_uuid:
         logger.error("Доступ запрещен: У вас недостаточно прав")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Access denied: You don't have enough privileges")
@@ -242,6 +265,7 @@ async def restaurant_owner_delete(user_uuid: UUID,
 
     await db.delete(restaurant_owner)
     await db.commit()
+    await invalidate_profile(user_uuid)
 
     logger.success("Владелец ресторана c UUID: %s успешно удален", user_uuid)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,9 +1,9 @@
 import jwt
-from typing import List
+from typing import List, Union
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Form, Response, status
-from fastapi_pagination import Page, paginate
+from fastapi_pagination import Page
 
 from sqlalchemy import asc
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -11,13 +11,17 @@ from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
 from config.settings import get_settings
-from config.security import get_api_key, create_access_token, create_refresh_token, is_superuser
+from config.security import get_api_key, create_access_token, create_refresh_token, Principal, \
+    is_superuser_principal, get_db_read
 from logs.logger import logger
 from config.database import get_db
 from src.superusers.schemas import SuperUserSchemas, SuperUserDetailSchemas, SuperUserUpdate, RolesSchemas
 from src.superusers.utils import validate_password, validate_username
 from src.authorization.utils import check_phone
 from src.users.models import User, Role
+from src.users.pagination import CursorPage, PaginationParams, paginate_users
+from src.users.redis import get_cached_profile, cache_profile, invalidate_profile, invalidate_profiles
+from src.users.roles import role_registry
 
 settings = get_settings()
 
@@ -33,7 +37,7 @@ async def sign_up(username: str = Form(...),
                   db: AsyncSession = Depends(get_db)):
     logger.info("Попытка создания администратора с именем пользователя: %s", username)
 
-    role = await db.scalar(select(Role).where(Role.title == "superuser"))
+    role = await role_registry.get("superuser")
     if role is None:
         logger.error("Роль с названием: superuser не найдена")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Role not found")
@@ -49,7 +53,7 @@ async def sign_up(username: str = Form(...),
                             detail="Superuser with this username already exist")
 
     new_superuser = User(username=validate_username(username), role_id=role.id)
-    new_superuser.set_password(validate_password(password))
+    await new_superuser.set_password(validate_password(password))
 
     db.add(new_superuser)
     await db.commit()
@@ -73,10 +77,16 @@ async def sign_in(username: str = Form(...),
             User.username == username)
     )
 
-    if superuser is None or not superuser.verify_password(password):
+    if superuser is None or not await superuser.verify_password(password):
         logger.error("Не верное имя пользователя или пароль для администратора: %s", username)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect username or password")
 
+    if superuser.password_needs_rehash():
+        # cost factor изменился, пароль известен только в момент входа
+        await superuser.set_password(password)
+        await db.commit()
+        logger.info("Хеш пароля администратора %s обновлен", username)
+
     access_token = create_access_token(
         data={"user_uuid": superuser.uuid, "role": superuser.roles.title})
     refresh_token = create_refresh_token(
@@ -91,8 +101,7 @@ async def sign_in(username: str = Form(...),
 
 
 @router_admin.post("/auth/superusers/token/refresh", status_code=status.HTTP_201_CREATED)
-async def refresh_token(refresh_token: str = Form(...),
-                        db: AsyncSession = Depends(get_db)):
+async def refresh_token(refresh_token: str = Form(...)):
     logger.info("Попытка создания refresh token")
 
     try:
@@ -111,7 +120,10 @@ async def refresh_token(refresh_token: str = Form(...),
     except Exception:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Token invalid")
 
-    role = await db.scalar(select(Role).where(Role.title == "superuser"))
+    role = await role_registry.get("superuser")
+    if role is None:
+        logger.error("Роль: superuser не найдена")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Role not found")
     access_token = create_access_token(data={"user_uuid": superuser_uuid, "role": role.title})
 
     logger.success("Токен успешно обновлён для администратора с UUID: %s", superuser_uuid)
@@ -119,30 +131,31 @@ async def refresh_token(refresh_token: str = Form(...),
 
 
 # TODO: Сделать поиск по имя пользователя администратора
-@router_admin.get("/superusers/", response_model=Page[SuperUserSchemas],
+@router_admin.get("/superusers/",
+                  response_model=Union[Page[SuperUserSchemas], CursorPage[SuperUserSchemas]],
                   status_code=status.HTTP_200_OK)
 async def get_superusers(
-        current_user: User = Depends(is_superuser),
-        db: AsyncSession = Depends(get_db)):
+        pagination: PaginationParams = Depends(),
+        current_user: Principal = Depends(is_superuser_principal),
+        db: AsyncSession = Depends(get_db_read)):
     logger.info("Попытка получения всех администраторов")
 
-    stmt = await db.scalars(
+    query = (
         select(User)
         .options(selectinload(User.roles))
         .where(User.roles.has(title="superuser"))
-        .order_by(asc(User.uuid))
     )
-    superusers = stmt.all()
+    superusers = await paginate_users(db, query, pagination, SuperUserSchemas)
 
     logger.success("Все администраторы получены успешно")
-    return paginate(superusers)
+    return superusers
 
 
 @router_admin.get("/superusers/{superuser_uuid}", response_model=SuperUserDetailSchemas,
                   status_code=status.HTTP_200_OK)
 async def get_superuser_by_uuid(superuser_uuid: UUID,
-                                current_user: User = Depends(is_superuser),
-                                db: AsyncSession = Depends(get_db)):
+                                current_user: Principal = Depends(is_superuser_principal),
+                                db: AsyncSession = Depends(get_db_read)):
     logger.info("Попытка получения администратора с UUID: %s", superuser_uuid)
 
     if superuser_uuid != current_user.uuid:
@@ -150,6 +163,11 @@ async def get_superuser_by_uuid(superuser_uuid: UUID,
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Access denied: You don't have enough privileges")
 
+    cached_superuser = await get_cached_profile("superuser", superuser_uuid, SuperUserDetailSchemas)
+    if cached_superuser is not None:
+        logger.success("Администратор с UUID: %s получен из кеша", superuser_uuid)
+        return cached_superuser
+
     superuser = await db.scalar(
         select(User)
         .options(selectinload(User.media),
@@ -161,15 +179,18 @@ async def get_superuser_by_uuid(superuser_uuid: UUID,
         logger.error("Администратор с UUID: %s не найден", superuser_uuid)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Superuser not found")
 
+    superuser_detail = SuperUserDetailSchemas.from_orm(superuser)
+    await cache_profile("superuser", superuser_uuid, superuser_detail)
+
     logger.success("Администратор с UUID: %s успешно получен", superuser_uuid)
-    return SuperUserDetailSchemas.from_orm(superuser)
+    return superuser_detail
 
 
 @router_admin.put("/superusers/{superuser_uuid}", response_model=SuperUserSchemas,
                   status_code=status.HTTP_200_OK)
 async def update_superuser(superuser_uuid: UUID,
                            objects: SuperUserUpdate,
-                           current_user: User = Depends(is_superuser),
+                           current_user: Principal = Depends(is_superuser_principal),
                            db: AsyncSession = Depends(get_db)):
     logger.info("Попытка обновления администратора с UUID: %s", superuser_uuid)
 
@@ -210,6 +231,7 @@ async def update_superuser(superuser_uuid: UUID,
     db.add(superuser)
     await db.commit()
     await db.refresh(superuser)
+    await invalidate_profile(superuser_uuid)
 
     logger.success("Администратор с UUID: %s успешно обновлен", superuser_uuid)
     return SuperUserSchemas.from_orm(superuser)
@@ -217,7 +239,7 @@ async def update_superuser(superuser_uuid: UUID,
 
 @router_admin.delete("/superusers/{superuser_uuid}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_superuser(superuser_uuid: UUID,
-                           current_user: User = Depends(is_superuser),
+                           current_user: Principal = Depends(is_superuser_principal),
                            db: AsyncSession = Depends(get_db)):
     logger.info("Попытка удаления администратора с UUID: %s", superuser_uuid)
 
@@ -238,6 +260,7 @@ async def delete_superuser(superuser_uuid: UUID,
 
     await db.delete(superuser)
     await db.commit()
+    await invalidate_profile(superuser_uuid)
 
     logger.success("Администратор: c UUID: %s успешно удален", superuser_uuid)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -247,8 +270,8 @@ async def delete_superuser(superuser_uuid: UUID,
 @router_admin.get("/roles/", response_model=List[RolesSchemas],
                   status_code=status.HTTP_200_OK)
 async def get_roles(
-        current_user: User = Depends(is_superuser),
-        db: AsyncSession = Depends(get_db)):
+        current_user: Principal = Depends(is_superuser_principal),
+        db: AsyncSession = Depends(get_db_read)):
     logger.info("Попытка получения всех ролей")
 
     stmt = await db.scalars(
@@ -265,8 +288,8 @@ async def get_roles(
 @router_admin.get("/roles/{role_id}", response_model=RolesSchemas,
                   status_code=status.HTTP_200_OK)
 async def get_role_by_id(role_id: int,
-                         current_user: User = Depends(is_superuser),
-                         db: AsyncSession = Depends(get_db)):
+                         current_user: Principal = Depends(is_superuser_principal),
+                         db: AsyncSession = Depends(get_db_read)):
     logger.info("Попытка получить роль с ID: %s", role_id)
 
     role = await db.scalar(select(Role).where(Role.id == role_id))
@@ -284,7 +307,7 @@ async def get_role_by_id(role_id: int,
 async def create_role(
         title: str = Form(...),
         description: str = Form(...),
-        current_user: User = Depends(is_superuser),
+        current_user: Principal = Depends(is_superuser_principal),
         db: AsyncSession = Depends(get_db)):
     logger.info("Попытка создания роли c названием: %s", title)
 
@@ -298,6 +321,7 @@ async def create_role(
     db.add(new_role)
     await db.commit()
     await db.refresh(new_role)
+    await role_registry.refresh()
 
     logger.success("Роль с названием: %s успешно создана", title)
     return RolesSchemas.from_orm(new_role)
@@ -308,7 +332,7 @@ async def create_role(
 async def update_role(role_id: int,
                       title: str = Form(...),
                       description: str = Form(...),
-                      current_user: User = Depends(is_superuser),
+                      current_user: Principal = Depends(is_superuser_principal),
                       db: AsyncSession = Depends(get_db)):
     logger.info("Попытка обновить роль с ID: %s", role_id)
 
@@ -328,6 +352,9 @@ async def update_role(role_id: int,
     role.description = description
     await db.commit()
     await db.refresh(role)
+    await role_registry.refresh()
+    # Роль входит в кешированные профили пользователей
+    await invalidate_profiles((await db.scalars(select(User.uuid).where(User.role_id == role_id))).all())
 
     logger.success("Роль с ID: %s обновлено успешно", title)
     return RolesSchemas.from_orm(role)
@@ -335,7 +362,7 @@ async def update_role(role_id: int,
 
 @router_admin.delete("/roles/{role_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_role(role_id: int,
-                      current_user: User = Depends(is_superuser),
+                      current_user: Principal = Depends(is_superuser_principal),
                       db: AsyncSession = Depends(get_db)):
     logger.info("Попытка удаления роли с ID: %s", role_id)
 
@@ -344,8 +371,11 @@ async def delete_role(role_id: int,
         logger.error("Роль с ID: %s не найдена", role_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Role not found")
 
+    user_uuids = (await db.scalars(select(User.uuid).where(User.role_id == role_id))).all()
     await db.delete(role)
     await db.commit()
+    await role_registry.refresh()
+    await invalidate_profiles(user_uuids)
 
     logger.success("Роль с ID: %s успешно удалена", role_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -354,7 +384,7 @@ async def delete_role(role_id: int,
 @router_admin.put("/roles/change-role/{role_id}", status_code=status.HTTP_200_OK)
 async def change_roles(
         role_id: int,
-        current_user: User = Depends(is_superuser),
+        current_user: Principal = Depends(is_superuser_principal),
         db: AsyncSession = Depends(get_db)):
     logger.info("Попытка изменить роль пользователя с UUID: %s", current_user.uuid)
 
@@ -380,6 +410,7 @@ async def change_roles(
     # Обновление ролей пользователя
     user.roles = [role]
     await db.commit()
+    await invalidate_profile(user.uuid)
 
     access_token = create_access_token(
         data={"user_uuid": user.uuid, "role": role.title})
@@ -1,13 +1,13 @@
-import bcrypt
 import uuid
 
-from sqlalchemy import Integer, String, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Integer, String, DateTime, ForeignKey, Boolean, Text, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
 from config.database import Base
 from src.media.models import Media
+from src.users import passwords
 
 
 class Role(Base):
@@ -23,6 +23,10 @@ class Role(Base):
 
 class User(Base):
     __tablename__ = "user"
+    __table_args__ = (
+        # Составной индекс для keyset-пагинации списков пользователей
+        Index("ix_user_registered_at_uuid", "registered_at", "uuid"),
+    )
     uuid: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     username: Mapped[str] = mapped_column(String(100), unique=True, nullable=True)
     hash_password: Mapped[str] = mapped_column(String(128), nullable=True)
@@ -39,12 +43,16 @@ class User(Base):
     media = relationship(Media, back_populates="users")
     wallet = relationship("Wallet", back_populates="users")
     work_schedule = relationship("WorkSchedule", back_populates="users")
+    transactions = relationship("Transaction", back_populates="users")
 
-    def set_password(self, password: str):
-        self.hash_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode('utf-8')
+    async def set_password(self, password: str):
+        self.hash_password = await passwords.hash_password(password)
 
-    def verify_password(self, password: str) -> bool:
-        return bcrypt.checkpw(password.encode(), self.hash_password.encode())
+    async def verify_password(self, password: str) -> bool:
+        return await passwords.verify_password(password, self.hash_password)
+
+    def password_needs_rehash(self) -> bool:
+        return passwords.needs_rehash(self.hash_password)
 
     def __str__(self):
         return self.phone_number
@@ -54,7 +62,8 @@ class Card(Base):
     __tablename__ = "cards"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_uuid: Mapped[UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('user.uuid'))
-    card_number_hashed: Mapped[str] = mapped_column(String(225), unique=True)
+    # HMAC-отпечаток номера карты (src.payments.utils.card_fingerprint), уникальный индекс - проверка дубликатов
+    card_number_hashed: Mapped[str] = mapped_column(String(225), unique=True, index=True)
     expiry_date_hashed: Mapped[str] = mapped_column(String(225))
     is_blacklisted: Mapped[bool] = mapped_column(Boolean, default=False)
     updated_at: Mapped[DateTime | None] = mapped_column(DateTime, onupdate=func.now(), nullable=True)
@@ -66,6 +75,29 @@ class Card(Base):
         return
 
 
+class Transaction(Base):
+    __tablename__ = "transactions"
+    __table_args__ = (
+        # Один платеж на ключ идемпотентности пользователя, даже если Redis недоступен
+        UniqueConstraint("user_uuid", "idempotency_key", name="uq_transactions_user_uuid_idempotency_key"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_uuid: Mapped[UUID] = mapped_column(UUID(as_uuid=True), ForeignKey('user.uuid'), index=True)
+    idempotency_key: Mapped[str] = mapped_column(String(64), nullable=False)
+    amount: Mapped[int] = mapped_column(Integer, nullable=False)  # в тийинах
+    # pending - отправлен в UPAY или результат неизвестен, succeeded, unconfirmed, failed
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending")
+    upay_transaction_id: Mapped[str] = mapped_column(String(64), nullable=True)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[DateTime | None] = mapped_column(DateTime, onupdate=func.now(), nullable=True)
+    created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+
+    users = relationship("User", back_populates="transactions")
+
+    def __repr__(self):
+        return f"Transaction: {self.idempotency_key} | {self.status}"
+
+
 class Wallet(Base):
     __tablename__ = "wallet"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -0,0 +1,125 @@
+import base64
+import json
+
+from datetime import datetime
+from enum import Enum
+from typing import Generic, List, Optional, Type, TypeVar
+from uuid import UUID
+
+from fastapi import HTTPException, Query, status
+from fastapi_pagination import Page, Params, set_page
+from fastapi_pagination.ext.sqlalchemy import paginate
+from pydantic import BaseModel
+from sqlalchemy import asc, desc, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from logs.logger import logger
+from src.users.models import User
+
+T = TypeVar("T")
+
+
+class PaginationMode(str, Enum):
+    offset = "offset"
+    cursor = "cursor"
+
+
+class PaginationParams:
+    """
+    Параметры пагинации списков пользователей.
+    По умолчанию используется постраничный режим (page/size),
+    режим cursor включается явно через ?mode=cursor.
+    """
+
+    def __init__(self,
+                 mode: PaginationMode = Query(PaginationMode.offset, description="Pagination mode"),
+                 page: int = Query(1, ge=1, description="Page number (offset mode)"),
+                 size: int = Query(50, ge=1, le=100, description="Page size"),
+                 cursor: Optional[str] = Query(None, description="Opaque cursor (cursor mode)")):
+        self.mode = mode
+        self.page = page
+        self.size = size
+        self.cursor = cursor
+
+
+class CursorPage(BaseModel, Generic[T]):
+    items: List[T]
+    size: int
+    next_page: Optional[str] = None
+    previous_page: Optional[str] = None
+
+
+def encode_cursor(user: User, direction: str) -> str:
+    """Кодирует позицию (registered_at, uuid) последней записи в непрозрачную строку"""
+    payload = json.dumps({"r": user.registered_at.isoformat(), "u": str(user.uuid), "d": direction})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload["d"]
+        if direction not in ("next", "prev"):
+            raise ValueError("Unknown cursor direction")
+        return datetime.fromisoformat(payload["r"]), UUID(payload["u"]), direction
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error("Невалидный курсор пагинации: %s", e)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+async def paginate_by_cursor(db: AsyncSession, query: Select, cursor: Optional[str], size: int,
+                             schema: Type[BaseModel]) -> CursorPage:
+    """
+    Keyset-пагинация по (registered_at, uuid).
+    Стоимость запроса не зависит от глубины страницы,
+    так как позиция ищется по составному индексу ix_user_registered_at_uuid.
+    """
+    key = tuple_(User.registered_at, User.uuid)
+    direction = "next"
+
+    if cursor:
+        registered_at, user_uuid, direction = decode_cursor(cursor)
+        position = tuple_(registered_at, user_uuid)
+        query = query.where(key > position if direction == "next" else key < position)
+
+    if direction == "next":
+        query = query.order_by(asc(User.registered_at), asc(User.uuid))
+    else:
+        query = query.order_by(desc(User.registered_at), desc(User.uuid))
+
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+    rows = (await db.scalars(query.limit(size + 1))).all()
+    has_more = len(rows) > size
+    items = list(rows[:size])
+
+    if direction == "prev":
+        items.reverse()
+
+    next_page = previous_page = None
+    if items:
+        if direction == "next":
+            next_page = encode_cursor(items[-1], "next") if has_more else None
+            previous_page = encode_cursor(items[0], "prev") if cursor else None
+        else:
+            previous_page = encode_cursor(items[0], "prev") if has_more else None
+            next_page = encode_cursor(items[-1], "next")
+
+    return CursorPage[schema].model_validate(
+        {"items": items, "size": size, "next_page": next_page, "previous_page": previous_page},
+        from_attributes=True)
+
+
+async def paginate_users(db: AsyncSession, query: Select, pagination: PaginationParams, schema: Type[BaseModel]):
+    """
+    Пагинация выборки пользователей в режиме offset или cursor.
+    Страница сразу собирается в Page[schema] или CursorPage[schema],
+    чтобы ответ однозначно соответствовал одной из схем response_model.
+    """
+    if pagination.mode == PaginationMode.cursor:
+        return await paginate_by_cursor(db, query, pagination.cursor, pagination.size, schema)
+
+    query = query.order_by(asc(User.registered_at), asc(User.uuid))
+    with set_page(Page[schema]):
+        return await paginate(db, query, Params(page=pagination.page, size=pagination.size))
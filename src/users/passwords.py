@@ -0,0 +1,56 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+from config.settings import get_settings
+from logs.logger import logger
+
+settings = get_settings()
+
+# bcrypt занимает ядро на сотни миллисекунд, поэтому выполняется вне event loop.
+# Размер пула ограничивает число одновременных хешей, остальные ждут в очереди пула.
+password_executor = ThreadPoolExecutor(max_workers=settings.BCRYPT_THREADS, thread_name_prefix="bcrypt")
+
+
+def hash_password_sync(password: str, rounds: Optional[int] = None) -> str:
+    salt = bcrypt.gensalt(rounds=rounds or settings.BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode(), salt).decode("utf-8")
+
+
+def verify_password_sync(password: str, hashed_password: Optional[str]) -> bool:
+    if not hashed_password:
+        return False
+    return bcrypt.checkpw(password.encode(), hashed_password.encode())
+
+
+def get_hash_rounds(hashed_password: str) -> int:
+    # Формат хеша: $2b$<cost>$<salt+hash>
+    return int(hashed_password.split("$")[2])
+
+
+def needs_rehash(hashed_password: Optional[str]) -> bool:
+    """Хеш создан с другим cost factor, чем указан в BCRYPT_ROUNDS"""
+    if not hashed_password:
+        return False
+    try:
+        return get_hash_rounds(hashed_password) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        logger.error("Неизвестный формат хеша пароля")
+        return True
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, hash_password_sync, password)
+
+
+async def verify_password(password: str, hashed_password: Optional[str]) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, verify_password_sync, password, hashed_password)
+
+
+def shutdown_password_executor():
+    password_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,81 @@
+from typing import Optional, Type, TypeVar
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from config.database import get_redis_client
+from config.settings import get_settings
+from logs.logger import logger
+
+settings = get_settings()
+
+SchemaT = TypeVar("SchemaT", bound=BaseModel)
+
+# Профили кешируются отдельно для каждой роли, так как у ролей разные схемы ответа
+PROFILE_KINDS = ("user", "courier", "superuser", "restaurant_owner")
+PROFILE_INVALIDATE_BATCH = 500  # пользователей на одну команду DEL
+
+# Счетчики текущего процесса, отдаются на /metrics/cache
+profile_cache_stats = {"hits": 0, "misses": 0, "errors": 0}
+
+
+def profile_cache_key(kind: str, user_uuid: UUID) -> str:
+    return f"profile:{kind}:{user_uuid}"
+
+
+async def get_cached_profile(kind: str, user_uuid: UUID, schema: Type[SchemaT]) -> Optional[SchemaT]:
+    """Возвращает сериализованный профиль из Redis или None при промахе"""
+    try:
+        data = await get_redis_client().get(profile_cache_key(kind, user_uuid))
+    except Exception as e:
+        profile_cache_stats["errors"] += 1
+        logger.error(f"Ошибка при получении профиля {user_uuid} из Redis: {e}")
+        return None
+
+    if data is None:
+        profile_cache_stats["misses"] += 1
+        return None
+
+    profile_cache_stats["hits"] += 1
+    return schema.model_validate_json(data)
+
+
+async def cache_profile(kind: str, user_uuid: UUID, profile: BaseModel):
+    try:
+        await get_redis_client().set(profile_cache_key(kind, user_uuid), profile.model_dump_json(),
+                                     ex=settings.PROFILE_CACHE_TTL)
+    except Exception as e:
+        profile_cache_stats["errors"] += 1
+        logger.error(f"Ошибка при сохранении профиля {user_uuid} в Redis: {e}")
+
+
+async def invalidate_profile(user_uuid: UUID):
+    """Удаляет профиль пользователя из кеша для всех ролей (роль могла смениться)"""
+    try:
+        await get_redis_client().delete(*(profile_cache_key(kind, user_uuid) for kind in PROFILE_KINDS))
+        logger.info(f"Кеш профиля {user_uuid} сброшен")
+    except Exception as e:
+        profile_cache_stats["errors"] += 1
+        logger.error(f"Ошибка при сбросе кеша профиля {user_uuid}: {e}")
+
+
+async def invalidate_profiles(user_uuids: list[UUID]):
+    """Сбрасывает кеш профилей нескольких пользователей (например, всех с измененной ролью) одним pipeline"""
+    if not user_uuids:
+        return
+    try:
+        async with get_redis_client().pipeline(transaction=False) as pipe:
+            for start in range(0, len(user_uuids), PROFILE_INVALIDATE_BATCH):
+                pipe.delete(*(profile_cache_key(kind, user_uuid) for user_uuid in
+                              user_uuids[start:start + PROFILE_INVALIDATE_BATCH] for kind in PROFILE_KINDS))
+            await pipe.execute()
+        logger.info(f"Кеш профилей сброшен: {len(user_uuids)} пользователей")
+    except Exception as e:
+        profile_cache_stats["errors"] += 1
+        logger.error(f"Ошибка при сбросе кеша профилей: {e}")
+
+
+def get_profile_cache_stats() -> dict:
+    lookups = profile_cache_stats["hits"] + profile_cache_stats["misses"]
+    hit_ratio = profile_cache_stats["hits"] / lookups if lookups else 0.0
+    return {**profile_cache_stats, "hit_ratio": round(hit_ratio, 4), "ttl": settings.PROFILE_CACHE_TTL}
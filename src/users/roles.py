@@ -0,0 +1,70 @@
+import asyncio
+import uuid
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlalchemy.future import select
+
+from config.database import AsyncSessionLocal, get_redis_client, listen_channel
+from logs.logger import logger
+from src.users.models import Role
+
+# Канал Redis, через который воркеры сообщают друг другу об изменении ролей
+ROLES_CHANNEL = "roles:changed"
+
+
+@dataclass(frozen=True)
+class RoleEntry:
+    id: int
+    title: str
+
+
+class RoleRegistry:
+    """
+    Справочник ролей в памяти процесса.
+    Загружается при старте приложения и перечитывается после create/update/delete роли.
+    Остальные воркеры узнают об изменении через Redis pub/sub,
+    поэтому регистрация и обновление токенов не обращаются к таблице roles.
+    """
+
+    def __init__(self):
+        self._roles: Dict[str, RoleEntry] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        # Идентификатор воркера, чтобы не перечитывать роли по собственному сообщению
+        self.instance_id = uuid.uuid4().hex
+
+    async def load(self):
+        async with self._lock:
+            async with AsyncSessionLocal() as session:
+                roles = (await session.scalars(select(Role))).all()
+            # Словарь подменяется целиком, читатели никогда не видят частично заполненный справочник
+            self._roles = {role.title: RoleEntry(id=role.id, title=role.title) for role in roles}
+            self._loaded = True
+        logger.info("Справочник ролей загружен: %s", ", ".join(sorted(self._roles)))
+
+    async def get(self, title: str) -> Optional[RoleEntry]:
+        if not self._loaded:
+            await self.load()
+        return self._roles.get(title)
+
+    async def refresh(self):
+        """Перечитывает роли в текущем воркере и оповещает остальные"""
+        await self.load()
+        try:
+            await get_redis_client().publish(ROLES_CHANNEL, self.instance_id)
+        except Exception as e:
+            logger.error("Не удалось оповестить воркеры об изменении ролей: %s", e)
+
+    async def on_message(self, sender: str):
+        if sender != self.instance_id:
+            logger.info("Получено уведомление об изменении ролей")
+            await self.load()
+
+    async def listen(self):
+        """Фоновая задача: перечитывает роли по сообщениям других воркеров"""
+        await listen_channel(ROLES_CHANNEL, self.on_message, self.load)
+
+
+role_registry = RoleRegistry()
@@ -1,8 +1,9 @@
+from typing import Union
 from uuid import UUID
 
 from fastapi import APIRouter, HTTPException, Depends, Response, status
 from fastapi_filter import FilterDepends
-from fastapi_pagination import Page, paginate
+from fastapi_pagination import Page
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -11,8 +12,10 @@ from sqlalchemy.orm import selectinload
 from logs.logger import logger
 from src.users.filters import UsersFilter
 from src.users.models import User
+from src.users.pagination import CursorPage, PaginationParams, paginate_users
+from src.users.redis import get_cached_profile, cache_profile, invalidate_profile
 from src.users.schemas import UserSchemas, UserDetailSchemas, UserUpdate
-from config.security import get_current_user, is_superuser
+from config.security import Principal, get_current_principal, is_superuser_principal, get_db_read
 from config.database import get_db
 
 router_users = APIRouter(
@@ -22,33 +25,43 @@ router_users = APIRouter(
 )
 
 
-@router_users.get("/", response_model=Page[UserSchemas],
+@router_users.get("/", response_model=Union[Page[UserSchemas], CursorPage[UserSchemas]],
                   status_code=status.HTTP_200_OK)
 async def get_users(
         filters: UsersFilter = FilterDepends(UsersFilter),
-        current_user: User = Depends(is_superuser),
-        db: AsyncSession = Depends(get_db)):
+        pagination: PaginationParams = Depends(),
+        current_user: Principal = Depends(is_superuser_principal),
+        db: AsyncSession = Depends(get_db_read)):
     logger.info("Попытка получения всех пользователей")
 
-    query = await db.scalars(
-        filters.filter(
-            select(User)
-            .where(User.roles.has(title="user"))  # has -> использоваться для связей один-к-одному или многие-к-одному
-        ))
+    query = filters.filter(
+        select(User)
+        .where(User.roles.has(title="user"))  # has -> использоваться для связей один-к-одному или многие-к-одному
+    )
 
-    users = query.all()
+    # LIMIT/OFFSET и COUNT (или keyset-условие) выполняются на стороне базы данных
+    users = await paginate_users(db, query, pagination, UserSchemas)
 
     logger.success("Пользователи успешно получены")
-    return paginate(users)
+    return users
 
 
 @router_users.get("/{user_uuid}", response_model=UserDetailSchemas,
                   status_code=status.HTTP_200_OK)
 async def get_user_by_uuid(user_uuid: UUID,
-                           current_user: User = Depends(get_current_user),
-                           db: AsyncSession = Depends(get_db)):
+                           current_user: Principal = Depends(get_current_principal),
+                           db: AsyncSession = Depends(get_db_read)):
     logger.info("Попытка получение пользователя с UUID: %s", user_uuid)
 
+    if not current_user.is_superuser and user_uuid != current_user.uuid:
+        logger.error("Доступ запрещен: У вас недостаточно прав")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="Access denied: You don't have enough privileges")
+
+    cached_user = await get_cached_profile("user", user_uuid, UserDetailSchemas)
+    if cached_user is not None:
+        return cached_user
+
     user = await db.scalar(
         select(User)
         .options(selectinload(User.media),
@@ -60,19 +73,16 @@ async def get_user_by_uuid(user_uuid: UUID,
         logger.error("Пользователь c UUID: %s не найден", user_uuid)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    if current_user.roles.title != "superuser" and user_uuid != current_user.uuid:
-        logger.error("Доступ запрещен: У вас недостаточно прав")
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail="Access denied: You don't have enough privileges")
-
-    return UserDetailSchemas.from_orm(user)
+    user_detail = UserDetailSchemas.from_orm(user)
+    await cache_profile("user", user_uuid, user_detail)
+    return user_detail
 
 
 @router_users.put("/{user_uuid}", response_model=UserSchemas,
                   status_code=status.HTTP_200_OK)
 async def update_user(user_uuid: UUID,
                       objects: UserUpdate,
-                      current_user: User = Depends(get_current_user),
+                      current_user: Principal = Depends(get_current_principal),
                       db: AsyncSession = Depends(get_db)):
     logger.info("Попытка изменения данных пользователя с UUID: %s", user_uuid)
 
@@ -82,7 +92,7 @@ async def update_user(user_uuid: UUID,
         .where(User.roles.has(title="user"), User.uuid == user_uuid)
     )
 
-    if current_user.roles.title != "superuser" and user_uuid != current_user.uuid:
+    if not current_user.is_superuser and user_uuid != current_user.uuid:
         logger.error("Доступ запрещен: У вас недостаточно прав")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Access denied: You don't have enough privileges")
@@ -101,7 +111,7 @@ async def update_user(user_uuid: UUID,
     if existing_user:
         if existing_user.email == objects.email:
             logger.error("Пользователь с email: %s уже существует", objects.email)
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"User with this email already exist")
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User with this email already exist")
         if existing_user.phone_number == objects.phone_number:
             logger.error("Пользователь с номером телефона: %s уже существует", objects.phone_number)
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
@@ -113,6 +123,7 @@ async def update_user(user_uuid: UUID,
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    await invalidate_profile(user_uuid)
 
     logger.success("Пользователь с UUID: %s успешно обновлен", user_uuid)
     return UserSchemas.from_orm(user)
@@ -120,7 +131,7 @@ async def update_user(user_uuid: UUID,
 
 @router_users.delete("/{user_uuid}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(user_uuid: UUID,
-                      current_user: User = Depends(get_current_user),
+                      current_user: Principal = Depends(get_current_principal),
                       db: AsyncSession = Depends(get_db)):
     logger.info("Попытка удаления пользователя с UUID: %s", user_uuid)
 
@@ -130,7 +141,7 @@ async def delete_user(user_uuid: UUID,
         .where(User.roles.has(title="user"), User.uuid == user_uuid)
     )
 
-    if current_user.roles.title != "superuser" and user_uuid != current_user.uuid:
+    if not current_user.is_superuser and user_uuid != current_user.uuid:
         logger.error("Доступ запрещен: У вас недостаточно прав")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Access denied: You don't have enough privileges")
@@ -140,6 +151,7 @@ async def delete_user(user_uuid: UUID,
 
     await db.delete(user)
     await db.commit()
+    await invalidate_profile(user_uuid)
 
     logger.success("Пользователь: c UUID: %s успешно удален", user_uuid)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,83 @@
+import uuid
+
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from src.users.models import User
+from src.users.pagination import decode_cursor, encode_cursor, paginate_by_cursor
+from src.users.schemas import UserSchemas
+
+
+# Фикстура для пользователей, отсортированных по (registered_at, uuid)
+@pytest.fixture
+def users():
+    """Пять пользователей, зарегистрированных с интервалом в минуту"""
+    started = datetime(2024, 10, 4, 12, 0, 0)
+    return [User(uuid=uuid.uuid4(), phone_number=f"90917077{i}", registered_at=started + timedelta(minutes=i))
+            for i in range(5)]
+
+
+def mock_db_session(rows: list) -> AsyncMock:
+    """Мокированная сессия, у которой scalars().all() возвращает rows"""
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_scalars = MagicMock()
+    mock_scalars.all.return_value = rows
+    mock_session.scalars.return_value = mock_scalars
+    return mock_session
+
+
+def test_cursor_round_trip(users):
+    registered_at, user_uuid, direction = decode_cursor(encode_cursor(users[2], "prev"))
+
+    assert (registered_at, user_uuid, direction) == (users[2].registered_at, users[2].uuid, "prev")
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "eyJyIjogIngifQ"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+
+    assert error.value.status_code == 400
+
+
+# Первая страница: запрашивается size + 1 строк, лишняя строка означает наличие следующей страницы
+@pytest.mark.asyncio
+async def test_first_page_has_next_cursor_only(users):
+    db = mock_db_session(users[:3])
+
+    page = await paginate_by_cursor(db, select(User), None, 2, UserSchemas)
+
+    assert [item.uuid for item in page.items] == [users[0].uuid, users[1].uuid]
+    assert page.previous_page is None
+    assert decode_cursor(page.next_page)[1:] == (users[1].uuid, "next")
+    assert "LIMIT" in str(db.scalars.call_args.args[0])
+
+
+@pytest.mark.asyncio
+async def test_last_page_has_no_next_cursor(users):
+    db = mock_db_session(users[4:])
+
+    page = await paginate_by_cursor(db, select(User), encode_cursor(users[3], "next"), 2, UserSchemas)
+
+    assert [item.uuid for item in page.items] == [users[4].uuid]
+    assert page.next_page is None
+    assert decode_cursor(page.previous_page)[1:] == (users[4].uuid, "prev")
+
+
+# Страница назад читается в обратном порядке и разворачивается перед ответом
+@pytest.mark.asyncio
+async def test_previous_page_is_returned_in_ascending_order(users):
+    db = mock_db_session([users[2], users[1], users[0]])
+
+    page = await paginate_by_cursor(db, select(User), encode_cursor(users[3], "prev"), 2, UserSchemas)
+
+    assert [item.uuid for item in page.items] == [users[1].uuid, users[2].uuid]
+    assert decode_cursor(page.previous_page)[1:] == (users[1].uuid, "prev")
+    assert decode_cursor(page.next_page)[1:] == (users[2].uuid, "next")
+    assert "DESC" in str(db.scalars.call_args.args[0])
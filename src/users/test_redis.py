@@ -0,0 +1,78 @@
+import uuid
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from src.users.redis import (PROFILE_INVALIDATE_BATCH, PROFILE_KINDS, get_cached_profile, invalidate_profile,
+                             invalidate_profiles, profile_cache_key, profile_cache_stats)
+from src.users.schemas import UserSchemas
+
+USER_UUID = uuid.UUID("efdb6be5-1d62-4925-9f32-b0705b6eb9a3")
+
+
+# Фикстура для мокированного клиента Redis
+@pytest.fixture
+def mock_redis():
+    """
+    Подменяет общий клиент Redis моком.
+    Pipeline возвращает pipe, в который команды ставятся синхронно, а execute() ожидается.
+    """
+    redis = MagicMock()
+    redis.get = AsyncMock(return_value=None)
+    redis.delete = AsyncMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    redis.pipeline.return_value.__aenter__.return_value = pipe
+    for name in profile_cache_stats:
+        profile_cache_stats[name] = 0
+    with patch("src.users.redis.get_redis_client", return_value=redis):
+        yield redis
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_returns_profile(mock_redis):
+    profile = UserSchemas(uuid=USER_UUID, phone_number="909170775", registered_at="2024-10-04T12:01:21")
+    mock_redis.get.return_value = profile.model_dump_json()
+
+    assert await get_cached_profile("user", USER_UUID, UserSchemas) == profile
+    mock_redis.get.assert_awaited_once_with(f"profile:user:{USER_UUID}")
+    assert profile_cache_stats["hits"] == 1
+
+
+# Недоступный Redis не ломает запрос: профиль читается из базы данных
+@pytest.mark.asyncio
+async def test_redis_error_is_a_cache_miss(mock_redis):
+    mock_redis.get.side_effect = ConnectionError("Redis is down")
+
+    assert await get_cached_profile("user", USER_UUID, UserSchemas) is None
+    assert profile_cache_stats["errors"] == 1
+
+
+# Роль пользователя могла смениться, поэтому сбрасываются профили всех ролей
+@pytest.mark.asyncio
+async def test_invalidate_profile_drops_every_role(mock_redis):
+    await invalidate_profile(USER_UUID)
+
+    mock_redis.delete.assert_awaited_once_with(*(profile_cache_key(kind, USER_UUID) for kind in PROFILE_KINDS))
+
+
+@pytest.mark.asyncio
+async def test_invalidate_profiles_is_batched_in_one_pipeline(mock_redis):
+    user_uuids = [uuid.uuid4() for _ in range(PROFILE_INVALIDATE_BATCH + 1)]
+
+    await invalidate_profiles(user_uuids)
+
+    pipe = mock_redis.pipeline.return_value.__aenter__.return_value
+    deleted = [call.args for call in pipe.delete.call_args_list]
+    assert [len(keys) for keys in deleted] == [PROFILE_INVALIDATE_BATCH * len(PROFILE_KINDS), len(PROFILE_KINDS)]
+    assert profile_cache_key("courier", user_uuids[-1]) in deleted[1]
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_invalidate_profiles_without_users_skips_redis(mock_redis):
+    await invalidate_profiles([])
+
+    mock_redis.pipeline.assert_not_called()
@@ -0,0 +1,80 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import logs.filter  # noqa: F401 - подставляет IP в формат логов вне запроса
+from src.users.models import Role
+from src.users.roles import ROLES_CHANNEL, RoleEntry, RoleRegistry
+
+
+# Фикстура для мокированной фабрики сессий базы данных
+@pytest.fixture
+def mock_db_session():
+    """
+    Подменяет AsyncSessionLocal в модуле ролей.
+    Возвращает мокированную сессию, в которой scalars().all() отдает две роли.
+    """
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_scalars = MagicMock()
+    mock_scalars.all.return_value = [Role(id=1, title="user"), Role(id=2, title="courier")]
+    mock_session.scalars.return_value = mock_scalars
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__.return_value = mock_session
+    with patch("src.users.roles.AsyncSessionLocal", session_factory):
+        yield mock_session
+
+
+# Фикстура для мокированного клиента Redis
+@pytest.fixture
+def mock_redis():
+    redis = MagicMock()
+    redis.publish = AsyncMock()
+    with patch("src.users.roles.get_redis_client", return_value=redis):
+        yield redis
+
+
+@pytest.mark.asyncio
+async def test_roles_are_loaded_once(mock_db_session):
+    registry = RoleRegistry()
+
+    assert await registry.get("courier") == RoleEntry(id=2, title="courier")
+    assert await registry.get("user") == RoleEntry(id=1, title="user")
+    assert await registry.get("superuser") is None
+    mock_db_session.scalars.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_refresh_reloads_and_notifies_other_workers(mock_db_session, mock_redis):
+    registry = RoleRegistry()
+    await registry.load()
+    mock_db_session.scalars.return_value.all.return_value = [Role(id=3, title="superuser")]
+
+    await registry.refresh()
+
+    assert await registry.get("superuser") == RoleEntry(id=3, title="superuser")
+    assert await registry.get("user") is None
+    mock_redis.publish.assert_awaited_once_with(ROLES_CHANNEL, registry.instance_id)
+
+
+# Ошибка Redis не отменяет уже сохраненное изменение роли
+@pytest.mark.asyncio
+async def test_refresh_survives_publish_failure(mock_db_session, mock_redis):
+    mock_redis.publish.side_effect = ConnectionError("Redis is down")
+    registry = RoleRegistry()
+
+    await registry.refresh()
+
+    assert await registry.get("courier") is not None
+
+
+@pytest.mark.asyncio
+async def test_only_other_workers_messages_trigger_reload(mock_db_session):
+    registry = RoleRegistry()
+    await registry.load()
+
+    await registry.on_message(registry.instance_id)
+    assert mock_db_session.scalars.await_count == 1
+
+    await registry.on_message(RoleRegistry().instance_id)
+    assert mock_db_session.scalars.await_count == 2